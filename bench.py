@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime as dt
+import json
+import random
+import sys
+import tempfile
+import time
+from os import path
+from aiohttp import ClientSession, web
+import githubClient
+import httpCache
+from commitBuckets import count_per_bucket, group_per_bucket, parse_dates
+from gitTokenHelper import GithubPersonalAccessTokenHelper, _token_key
+from githubClient import GithubClient, get_last_page
+
+'''
+Benchmarks of the data processing hot paths, run with:
+    python3 bench.py buckets [COMMIT_COUNT]
+    python3 bench.py http [REPO_COUNT]
+'''
+
+# Mock GitHub server of the http benchmark
+MOCK_PAGES_PER_REPO = 20
+MOCK_LATENCY_SECS = 0.02
+# Share of the responses failing with a 502
+MOCK_ERROR_RATE = 0.02
+
+
+def _make_commits(commit_count, end, days):
+    random.seed(0)
+    logins = ['dev%d' % i for i in range(max(commit_count // 50, 1))]
+    commits = []
+    for _ in range(commit_count):
+        date = end - dt.timedelta(seconds=random.randint(0, days * 24 * 60 * 60))
+        commits.append((date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        random.choice(logins)))
+    return commits
+
+
+# Weekly counts and monthly contributor sets the way dev.py and contr.py computed them
+# before commitBuckets: a strptime call and a scan over all the periods per commit
+def _legacy_buckets(commits, end, week_count, month_count):
+    weekly_commits = [0] * week_count
+    month_start_dates = [end]
+    for _ in range(month_count):
+        month_start_dates.append(month_start_dates[-1] - dt.timedelta(days=30))
+    month_start_dates.reverse()
+    monthly_contributors = [set() for _ in range(month_count)]
+    for date_string, login in commits:
+        date = dt.datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%SZ')
+        weeks_ago = (end - date).days // 7
+        if 0 <= weeks_ago < week_count:
+            weekly_commits[-1 - weeks_ago] += 1
+        for index, (start, month_end) in enumerate(zip(month_start_dates, month_start_dates[1:])):
+            if date >= start and date < month_end:
+                monthly_contributors[index].add(login)
+    return weekly_commits, monthly_contributors
+
+
+def _vectorized_buckets(commits, end, week_count, month_count):
+    dates = parse_dates([date_string for date_string, _ in commits])
+    logins = [login for _, login in commits]
+    weekly_commits = count_per_bucket(dates, end, 7, week_count)
+    monthly_contributors = group_per_bucket(dates, logins, end, 30, month_count)
+    return weekly_commits, monthly_contributors
+
+
+def bench_buckets(commit_count):
+    week_count = 51
+    month_count = 12
+    end = dt.datetime(2021, 1, 1)
+    commits = _make_commits(commit_count, end, 365)
+    print("Bucketing %d commits into %d weeks and %d months" %
+          (commit_count, week_count, month_count))
+
+    start = time.perf_counter()
+    legacy = _legacy_buckets(commits, end, week_count, month_count)
+    legacy_secs = time.perf_counter() - start
+    print("strptime + linear scan: %.3fs" % legacy_secs)
+
+    start = time.perf_counter()
+    vectorized = _vectorized_buckets(commits, end, week_count, month_count)
+    vectorized_secs = time.perf_counter() - start
+    print("commitBuckets (NumPy):  %.3fs (%.1fx faster)" %
+          (vectorized_secs, legacy_secs / vectorized_secs))
+
+    # Commits exactly on a month boundary are (start, end] in commitBuckets and [start, end) before
+    weeks_match = legacy[0] == vectorized[0]
+    months_match = legacy[1] == vectorized[1]
+    print("Weekly counts match:", weeks_match)
+    print("Monthly contributor counts match:", months_match)
+
+
+# Connections the mock server accepted
+_mock_connections = set()
+
+
+# Paginated commits of any repo, with a fixed latency per response and random 502s
+async def _mock_commits(request):
+    _mock_connections.add(request.transport)
+    await asyncio.sleep(MOCK_LATENCY_SECS)
+    if random.random() < MOCK_ERROR_RATE:
+        return web.Response(status=502, text='Bad Gateway')
+    page = int(request.query.get('page', 1))
+    headers = {
+        'X-RateLimit-Remaining': '4999',
+        'X-RateLimit-Limit': '5000',
+        'X-RateLimit-Reset': str(int(time.time()) + 3600),
+        'Link': '<%s?per_page=100&page=%d>; rel="last"' % (request.url.with_query(None), MOCK_PAGES_PER_REPO)
+    }
+    commits = [{"sha": "%d-%d" % (page, index)} for index in range(100)]
+    return web.Response(text=json.dumps(commits), content_type='application/json', headers=headers)
+
+
+# Pages of every repo the way contr.py fetched them before GithubClient: a ClientSession
+# per repo, all the pages after the first one at once, no retries
+async def _fetch_with_session_per_repo(api_url, repos):
+    request_count = 0
+    error_count = 0
+    for repo in repos:
+        url = '%s/repos/%s/commits?per_page=100' % (api_url, repo)
+        async with ClientSession() as session:
+            async def get_page(page):
+                async with session.get(url + '&page=%d' % page) as r:
+                    await r.read()
+                    return r
+
+            first_page = await get_page(1)
+            # A failed first page lost the whole repo
+            last_page = get_last_page(first_page.headers.get('Link')) or 1
+            pages = [first_page] + await asyncio.gather(*[get_page(page) for page in range(2, last_page + 1)])
+        request_count += len(pages)
+        error_count += sum(1 for page in pages if page.status != 200)
+    return request_count, error_count
+
+
+# Pages of every repo through one GithubClient, repos one after the other (contr.py) or all at once (repoDataFetcher.py)
+async def _fetch_with_client(api_url, repos, gh_pat_helper, concurrency, concurrent_repos):
+    async with GithubClient(gh_pat_helper, concurrency) as client:
+        async def fetch_repo(repo):
+            await client.get_pages('%s/repos/%s/commits?per_page=100' % (api_url, repo), lambda page: page.json())
+
+        if concurrent_repos:
+            await asyncio.gather(*[fetch_repo(repo) for repo in repos])
+        else:
+            for repo in repos:
+                await fetch_repo(repo)
+    return sum(client.request_counts.values()), client.retry_count
+
+
+async def _bench_http(repo_count):
+    app = web.Application()
+    app.router.add_get('/repos/{org}/{repo}/commits', _mock_commits)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, 'localhost', 0)
+    await site.start()
+    api_url = 'http://localhost:%d' % site._server.sockets[0].getsockname()[1]
+
+    tmp_dir = tempfile.mkdtemp()
+    # The mock serves no ETags, so nothing is cached but every request goes through the cache
+    httpCache._http_cache = httpCache.HttpCache(path.join(tmp_dir, 'http_cache'), 10 ** 8)
+    githubClient.RETRY_BASE_SECS = MOCK_LATENCY_SECS
+    # A token already known to the pool isn't probed against api.github.com
+    state_file_path = path.join(tmp_dir, 'pat_pool.json')
+    with open(state_file_path, 'w') as state_file:
+        json.dump({_token_key('bench'): {"valid": True, "checked_at": time.time(), "updated_at": time.time(),
+                                        "remaining": None, "limit": 5000, "reset": None}}, state_file)
+    gh_pat_helper = GithubPersonalAccessTokenHelper(['bench'], state_file_path)
+
+    repos = ['org/repo%d' % index for index in range(repo_count)]
+    print("Fetching %d pages of %d repos, %dms latency, %d%% of 502s" % (
+        MOCK_PAGES_PER_REPO, repo_count, MOCK_LATENCY_SECS * 1000, MOCK_ERROR_RATE * 100))
+    random.seed(0)
+    _mock_connections.clear()
+    start = time.perf_counter()
+    request_count, error_count = await _fetch_with_session_per_repo(api_url, repos)
+    secs = time.perf_counter() - start
+    print("ClientSession per repo, all pages of a repo at once: %.2fs, %.0f req/s, %d connections, %d failed pages" %
+          (secs, request_count / secs, len(_mock_connections), error_count))
+    for concurrency, concurrent_repos in [(8, False), (8, True), (32, True)]:
+        random.seed(0)
+        _mock_connections.clear()
+        start = time.perf_counter()
+        request_count, retry_count = await _fetch_with_client(
+            api_url, repos, gh_pat_helper, concurrency, concurrent_repos)
+        secs = time.perf_counter() - start
+        print("GithubClient, %2d in flight, %-21s %.2fs, %.0f req/s, %d connections, %d retried pages" % (
+            concurrency, 'all repos at once:' if concurrent_repos else 'repo by repo:',
+            secs, request_count / secs, len(_mock_connections), retry_count))
+    await runner.cleanup()
+
+
+def bench_http(repo_count):
+    asyncio.run(_bench_http(repo_count))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ['buckets', 'http']:
+        print('Usage: python3 bench.py buckets [COMMIT_COUNT]')
+        print('       python3 bench.py http [REPO_COUNT]')
+        sys.exit(1)
+    if sys.argv[1] == 'buckets':
+        bench_buckets(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    if sys.argv[1] == 'http':
+        bench_http(int(sys.argv[2]) if len(sys.argv) > 2 else 50)
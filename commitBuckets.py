@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+'''
+Bucketing of commit timestamps into fixed length periods (weeks, 30 day months) counted
+back from an end date, shared by the weekly series of dev.py and the monthly contributor
+sets of contr.py. Timestamps are parsed in bulk into NumPy datetime64 arrays and bucket
+indices come from datetime64 arithmetic, so the cost is O(commits) in vectorized code
+instead of a strptime call and a scan over all periods per commit.
+
+Buckets are ordered oldest first: with `bucket_count` buckets of `bucket_days` days,
+bucket `bucket_count - 1` holds the dates in (end - bucket_days, end].
+'''
+
+
+# Parse GitHub ISO 8601 UTC timestamps ('2020-01-31T12:00:00Z') or days ('2020-01-31')
+def parse_dates(date_strings):
+    if len(date_strings) == 0:
+        return np.array([], dtype='datetime64[s]')
+    # NumPy doesn't parse the 'Z' suffix, the dates are all UTC anyway
+    return np.char.rstrip(np.array(date_strings, dtype=str), 'Z').astype('datetime64[s]')
+
+
+def _to_datetime64(end):
+    return np.datetime64(end, 's')
+
+
+# Bucket index of every date, -1 for dates outside of the buckets
+def get_bucket_indices(dates, end, bucket_days: int, bucket_count: int):
+    periods_ago = (_to_datetime64(end) - dates) // np.timedelta64(bucket_days, 'D')
+    indices = bucket_count - 1 - periods_ago
+    indices[(periods_ago < 0) | (periods_ago >= bucket_count)] = -1
+    return indices
+
+
+# Number of dates in each bucket, as a list of ints
+def count_per_bucket(dates, end, bucket_days: int, bucket_count: int):
+    indices = get_bucket_indices(dates, end, bucket_days, bucket_count)
+    return np.bincount(indices[indices >= 0], minlength=bucket_count).tolist()
+
+
+# Set of the values (e.g. logins) dated in each bucket, as a list of sets
+def group_per_bucket(dates, values, end, bucket_days: int, bucket_count: int):
+    indices = get_bucket_indices(dates, end, bucket_days, bucket_count)
+    in_range = indices >= 0
+    indices = indices[in_range]
+    values = np.asarray(values, dtype=object)[in_range]
+    order = np.argsort(indices, kind='stable')
+    indices = indices[order]
+    values = values[order]
+    # Boundaries of the runs of equal indices in the sorted array
+    boundaries = np.searchsorted(indices, np.arange(bucket_count + 1))
+    return [set(values[boundaries[i]:boundaries[i + 1]]) for i in range(bucket_count)]
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+import time
+from os import makedirs, path
+
+dir_path = path.dirname(path.realpath(__file__))
+
+DEFAULT_DB_PATH = path.join(dir_path, 'output', 'commits.db')
+# `PRAGMA user_version` of the store, 1 since the repos are keyed in lower case
+SCHEMA_VERSION = 1
+
+'''
+Local warehouse of normalized commit records, shared by dev.py (weekly commits) and
+contr.py (monthly contributors) so that the commits of a repo are fetched once.
+
+FLOW (for every repo)
+get_fetch_since -> fetch the commits since that date from GitHub -> add_commits for every page
+    -> mark_synced once all pages are stored -> get_committer_dates / get_daily_author_logins
+
+`synced_repos` records, per repo, the oldest `since` fetched completely. Later syncs only
+fetch the commits since the newest stored one (the high-water mark), unless a longer
+window than the stored one is asked for. The mark only moves once a sync completes, so a
+crash in the middle of a sync is retried from the same point.
+Repos are keyed in lower case like GitHub matches them: dev.py passes the names of the org
+listing as they are and contr.py lower-cases them, and both share the same commits.
+'''
+
+
+def _get_key(repo: str):
+    return repo.lower()
+
+
+class CommitStore:
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        makedirs(path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=60, check_same_thread=False)
+        # Several dev.py/contr.py processes can share the store
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS commits (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                author_login TEXT,
+                author_date TEXT NOT NULL,
+                committer_date TEXT NOT NULL,
+                additions INTEGER,
+                deletions INTEGER,
+                PRIMARY KEY (repo, sha)
+            )''')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS commits_repo_author_date ON commits (repo, author_date)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS commits_repo_committer_date ON commits (repo, committer_date)')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS synced_repos (
+                repo TEXT PRIMARY KEY,
+                oldest_synced TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            )''')
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                # Repos were keyed as passed by the callers, the commits are kept and the repos
+                # synced with another case are synced again
+                self.connection.execute('''INSERT OR IGNORE INTO commits
+                    SELECT lower(repo), sha, author_login, author_date, committer_date, additions, deletions
+                    FROM commits WHERE repo != lower(repo)''')
+                self.connection.execute('DELETE FROM commits WHERE repo != lower(repo)')
+                self.connection.execute('DELETE FROM synced_repos WHERE repo != lower(repo)')
+                self.connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    # `since` to fetch the commits of `repo` with, for a window starting at `window_since`
+    def get_fetch_since(self, repo: str, window_since: str):
+        repo = _get_key(repo)
+        with self.lock:
+            synced = self.connection.execute(
+                'SELECT oldest_synced FROM synced_repos WHERE repo = ?', (repo,)).fetchone()
+            newest = self.connection.execute(
+                'SELECT MAX(committer_date) FROM commits WHERE repo = ?', (repo,)).fetchone()
+        if synced is None or synced[0] > window_since or newest[0] is None:
+            return window_since
+        # `since` is inclusive, the commit at the mark is fetched again and ignored
+        return newest[0]
+
+    # Store a page of commits as returned by the GitHub commits API
+    def add_commits(self, repo: str, commits: list):
+        repo = _get_key(repo)
+        rows = []
+        for item in commits:
+            stats = item.get('stats') or {}
+            rows.append((
+                repo,
+                item['sha'],
+                # Can be null (user not logged in)
+                item['author']['login'] if item['author'] else None,
+                item['commit']['author']['date'],
+                item['commit']['committer']['date'],
+                stats.get('additions'),
+                stats.get('deletions')
+            ))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    # All the commits of `repo` since `date_since` are stored
+    def mark_synced(self, repo: str, date_since: str):
+        repo = _get_key(repo)
+        with self.lock, self.connection:
+            self.connection.execute('''INSERT INTO synced_repos VALUES (?, ?, ?)
+                ON CONFLICT (repo) DO UPDATE SET
+                    oldest_synced = MIN(oldest_synced, excluded.oldest_synced),
+                    synced_at = excluded.synced_at''', (repo, date_since, time.time()))
+
+    def get_committer_dates(self, repo: str, date_since: str):
+        repo = _get_key(repo)
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT committer_date FROM commits WHERE repo = ? AND committer_date >= ?',
+                (repo, date_since)).fetchall()
+        return [row[0] for row in rows]
+
+    # {day: set(logins)} of the commits authored since `day_since` ('YYYY-MM-DD')
+    def get_daily_author_logins(self, repo: str, day_since: str):
+        repo = _get_key(repo)
+        with self.lock:
+            rows = self.connection.execute(
+                '''SELECT DISTINCT substr(author_date, 1, 10), author_login FROM commits
+                WHERE repo = ? AND author_date >= ? AND author_login IS NOT NULL''',
+                (repo, day_since)).fetchall()
+        daily_author_logins = {}
+        for day, login in rows:
+            daily_author_logins.setdefault(day, set()).add(login)
+        return daily_author_logins
+
+
+_commit_store = None
+_commit_store_lock = threading.Lock()
+
+
+# Store shared by all the callers of a process
+def get_commit_store():
+    global _commit_store
+    with _commit_store_lock:
+        if _commit_store is None:
+            _commit_store = CommitStore()
+    return _commit_store
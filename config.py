@@ -27,5 +27,49 @@ def remove_chain_from_config(chain):
     config['chains']['targets'] = ', '.join(chains_targets_arr)
 
 
+def get_http_cache_dir():
+    return config.get('http_cache', 'dir', fallback='output/http_cache')
+
+
+def get_http_cache_max_size_bytes():
+    return config.getint('http_cache', 'max_size_mb', fallback=1024) * 1024 * 1024
+
+
+def get_github_graphql_url():
+    return config.get('github', 'graphql_url', fallback='https://api.github.com/graphql')
+
+
+def get_graphql_repos_per_query():
+    return config.getint('github', 'graphql_repos_per_query', fallback=20)
+
+
+def get_git_mirror_dir():
+    return config.get('git', 'mirror_dir', fallback='output/git_mirrors')
+
+
+def get_git_clone_url():
+    return config.get('git', 'clone_url', fallback='https://github.com/{repo}.git')
+
+
+def get_git_processes():
+    return config.getint('git', 'processes', fallback=4)
+
+
+def get_repo_data_cache_ttl_secs():
+    return config.getfloat('repo_data_cache', 'ttl_hours', fallback=24) * 60 * 60
+
+
+def get_repo_data_cache_max_size_bytes():
+    return config.getint('repo_data_cache', 'max_size_mb', fallback=256) * 1024 * 1024
+
+
+def get_contributor_sketch_kind():
+    return config.get('contributors', 'sketch', fallback='exact')
+
+
+def get_hll_precision():
+    return config.getint('contributors', 'hll_precision', fallback=14)
+
+
 def get_pats():
     return os.getenv('GITHUB_PATS').split(" ")
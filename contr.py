@@ -3,227 +3,192 @@
 import asyncio
 import datetime as dt
 import json
-from os import path, remove
-import re
+import optparse
+from collections import Counter
+from os import fsync, path, remove
 from logger import sys
-from asyncio import get_event_loop, ensure_future
-import requests
-import toml
-from aiohttp import ClientSession
+from asyncio import get_event_loop
+from contextlib import asynccontextmanager
 from gitTokenHelper import GithubPersonalAccessTokenHelper
 from config import get_pats
+from githubClient import GITHUB_API_URL, GithubApiError, GithubClient
+from orgRepoLister import get_unforked_org_repos_async
+from repoDataFetcher import get_cacheable_date_since
+from commitBuckets import get_bucket_indices, parse_dates
+from commitStore import get_commit_store
+from contributorSketch import SKETCH_FILE_SUFFIX, ContributorSketch, save_monthly_sketches, sketches_from_json, sketches_to_json
+from gitRepoDataFetcher import GitRepoDataFetcher, GitRepoError
+from protocolIndex import get_protocol_index
 
 dir_path = path.dirname(path.realpath(__file__))
 
 
-async def get_commits(session, pat, org_then_slash_then_repo, page):
-    async with session.get(url='https://api.github.com/repos/' + org_then_slash_then_repo + '/commits?page='
-                               + str(page) + '&per_page=100',
-                           headers={'Authorization': 'Token ' + pat}) as r:
-        if r.status == 200:
-            data = await r.json()
-            rate_limit_remaining = int(r.headers['X-RateLimit-Remaining'])
-            total_pages = None
-            if "link" in r.headers:
-                pages_link = r.headers['link']
-                last_page_link = pages_link.split(",")[1]
-                re_match = re.search(
-                    'page=(.*)&per_page=100>; rel="last"', last_page_link)
-                if re_match:
-                    total_pages = int(re_match.group(1))
-            return {
-                "error": None,
-                "error_code": None,
-                "data": data,
-                "total_pages": total_pages,
-                "rate_limit_remaining": rate_limit_remaining
-            }
-        err_message = await r.text()
-        return {
-            "error": "{0} {1}".format(r.reason, err_message),
-            "error_code": r.status
-        }
+# Entries of an append-only json lines journal, a line truncated by a crash is ignored
+def read_journal(journal_file_path):
+    if not path.exists(journal_file_path):
+        return
+    with open(journal_file_path, 'r') as journal_file:
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print("Ignoring incomplete journal entry")
+
+
+def open_journal(journal_file_path):
+    # Don't glue the next entry onto a line truncated by a crash
+    needs_newline = False
+    if path.exists(journal_file_path) and path.getsize(journal_file_path) > 0:
+        with open(journal_file_path, 'rb') as journal_file:
+            journal_file.seek(-1, 2)
+            needs_newline = journal_file.read(1) != b'\n'
+    journal_file = open(journal_file_path, 'a')
+    if needs_newline:
+        journal_file.write('\n')
+    return journal_file
+
+
+# Append one entry as a single line write, synced to disk before the next repo is analysed
+def append_journal_entry(journal_file, entry):
+    journal_file.write(json.dumps(entry) + '\n')
+    journal_file.flush()
+    fsync(journal_file.fileno())
 
 
 # Python client only allows the first 100 contributors to be returned, so use vanilla HTTP to get contributors
 class Contributors:
 
-    def __init__(self, save_path: str):
+    # `gh_pat_helper` can be shared with other DevOracle/Contributors instances of the process
+    # `backend` 'api' reads the commits from the GitHub API, 'git' from local git mirrors
+    # `expand_sub_ecosystems` also crawls the orgs and explicit repos of the sub ecosystems, recursively
+    # `concurrency` is the max number of in-flight GitHub API requests
+    # `client` is a GithubClient shared with other callers of the same event loop
+    def __init__(self, save_path: str, gh_pat_helper=None, backend: str = 'api', expand_sub_ecosystems: bool = False,
+                 concurrency: int = 8, client: GithubClient = None):
         self.save_path = save_path
         # TODO: fix this to be an array
-        self.gh_pat_helper = GithubPersonalAccessTokenHelper(get_pats())
+        self.gh_pat_helper = gh_pat_helper or GithubPersonalAccessTokenHelper(
+            get_pats())
+        # `org/repo` -> number of GitHub API requests made for the repo
+        self.request_counts = Counter()
+        self.concurrency = concurrency
+        # Shared GithubClient, or the one of open_client, None outside of it
+        self.client = client
+        self.backend = backend
+        self.expand_sub_ecosystems = expand_sub_ecosystems
+        self.git_fetcher = None
+        # (`org/repo`, n_years) -> future of the daily authors being read by the git backend
+        self.daily_authors_futures = {}
 
     # list all the repos of a protocol from toml
     # Includes all the core github org/user repos and the repo urls listed in toml
     # Ensure protocol is same as name of toml file
     async def get_repos_for_protocol_from_toml(self, protocol):
-        pat = await self._get_access_token()
         repos = set()
-        toml_file_path = path.join(dir_path, 'protocols', protocol + '.toml')
-        if not path.exists(toml_file_path):
-            print(".toml file not found for %s in /protocols folder" % chain_name)
-            sys.exit(1)
-        try:
-            with open(toml_file_path, 'r') as f:
-                data = f.read()
-            github_orgs = toml.loads(data)['github_organizations']
-            repos_in_toml = toml.loads(data)['repo']
-        except:
-            print('Could not open toml file - check formatting!!')
-            sys.exit(1)
+        if self.expand_sub_ecosystems:
+            github_orgs = get_protocol_index().get_expanded_orgs(protocol)
+            repos.update(get_protocol_index().get_expanded_repos(protocol))
+        else:
+            github_orgs = get_protocol_index().get_orgs(protocol)
 
         for org in github_orgs:
             if not org.lower().startswith("https://github.com/"):
                 continue
             org_name = org.split('https://github.com/')[1]
-            try:
-                # Get all repos
-                all_org_repos = []
-                page = 1
-                url = f"https://api.github.com/orgs/{org_name}/repos?page={page}&per_page=100"
-                response = requests.get(
-                    url, headers={'Authorization': 'Token ' + pat})
-                while len(response.json()) > 0:
-                    for repo in response.json():
-                        all_org_repos.append(repo["full_name"])
-                    page += 1
-                    url = f"https://api.github.com/orgs/{org_name}/repos?page={page}&per_page=100"
-                    response = requests.get(
-                        url, headers={'Authorization': 'Token ' + pat})
-                # Get forked repos
-                forked_org_repos = []
-                page = 1
-                url = f"https://api.github.com/orgs/{org_name}/repos?type=forks&page={page}&per_page=100"
-                response = requests.get(
-                    url, headers={'Authorization': 'Token ' + pat})
-                while len(response.json()) > 0:
-                    for repo in response.json():
-                        forked_org_repos.append(repo["full_name"])
-                    page += 1
-                    url = f"https://api.github.com/orgs/{org_name}/repos?type=forks&page={page}&per_page=100"
-                    response = requests.get(
-                        url, headers={'Authorization': 'Token ' + pat})
-                # Find difference
-                unforked_repos = list(
-                    set(all_org_repos) - set(forked_org_repos))
-                for repo in unforked_repos:
-                    repos.add(repo.lower())
-            except:
-                # Core org is not org but a user
-                # Get repos of user
-                url = f"https://api.github.com/users/{org_name}/repos"
-                response = requests.get(
-                    url, headers={'Authorization': 'Token ' + pat})
-                for repo in response.json():
-                    repos.add(repo["full_name"].lower())
+            for repo in await get_unforked_org_repos_async(self.gh_pat_helper, org_name, self.client):
+                repos.add(repo.lower())
         return list(repos)
 
-    async def _get_access_token(self):
-        res = self.gh_pat_helper.get_access_token()
-        if "token" in res and res["token"] is not None:
-            return res["token"]
-        print('Going to sleep since no token exists with usable rate limit')
-        await asyncio.sleep(res["sleep_time_secs"])
-        return await self._get_access_token()
-
-    async def get_contributors_of_repo_in_last_n_years(self, org_then_slash_then_repo: str, n_years: int = 1):
-        # Commits are not chronological, so need to pull all and filter
-        commits = []
-
-        # get personal access token
-        pat = await self._get_access_token()
-
-        async with ClientSession() as session:
-            initial_request = await get_commits(session, pat, org_then_slash_then_repo, page=1)
-            # Repo doesn't exist
-            if initial_request["error"] or (type(initial_request["data"]) == dict and initial_request["data"].message == 'Not Found'):
-                return []
-            if isinstance(initial_request["data"], list) and len(initial_request["data"]) == 0:
-                return []
-            commits.extend(initial_request["data"])
-
-            rate_limit_remaining = initial_request["rate_limit_remaining"]
-            remaining_requests_to_be_made = 0
-            if initial_request["total_pages"]:
-                remaining_requests_to_be_made = initial_request["total_pages"] - 1
-
-            # starting page
-            batch_start = 2
-            while remaining_requests_to_be_made > 0:
-                if remaining_requests_to_be_made > min(rate_limit_remaining, 200):
-                    batch_end = batch_start + min(rate_limit_remaining, 200)
-                else:
-                    batch_end = batch_start + remaining_requests_to_be_made
-
-                print("Start", batch_start, "End", batch_end)
-
-                # get data for page from batch_start to batch_end
-                tasks = []
-                for page in range(batch_start, batch_end + 1):
-                    task = ensure_future(
-                        get_commits(
-                            session, pat, org_then_slash_then_repo, page)
-                    )
-                    tasks.append(task)
-
-                responses = await asyncio.gather(*tasks)
-                if len(responses) == 0:
-                    sys.exit(1)
-
-                successful_responses_count = 0
-                rate_limit_exceeded = False
-                for response in responses:
-                    if response["error"]:
-                        # Get 502 some times
-                        if response["error_code"] == 403 or response["error_code"] // 100 == 5:
-                            print("Rate limit trigger detected")
-                            rate_limit_exceeded = True
-                            break
-                        # Printing unhandled error and exiting
-                        print(response)
-                        sys.exit(1)
-
-                    if not isinstance(response["data"], list):
-                        print(response["error"])
-                        sys.exit(1)
-                    successful_responses_count += 1
-                    commits.extend(response["data"])
-
-                if rate_limit_exceeded:
-                    print("Hourly rate limit exceeded for current token")
-                    pat = await self._get_access_token()
-
-                print("Successful reqs: ", successful_responses_count)
-                remaining_requests_to_be_made -= successful_responses_count
-                rate_limit_remaining -= successful_responses_count
-                batch_start += successful_responses_count
-
-        days_count = 365 * n_years  # TODO: Adjust for leap years
-        # Remove older commits
-        year_ago_date = dt.datetime.now() - dt.timedelta(days=days_count)
-        contributors = []
-        for item in commits:
+    # Keep-alive GithubClient of the calls made inside the block, e.g. all the repos of a run.
+    # Calls made outside of such a block open a client of their own.
+    @asynccontextmanager
+    async def open_client(self):
+        if self.client is not None:
+            # Shared with other chains (generateReports.py) or opened by the caller already
+            yield self.client
+            return
+        async with GithubClient(self.gh_pat_helper, self.concurrency, self.request_counts) as client:
+            self.client = client
             try:
-                date_string = item['commit']['author']['date']
-                date = dt.datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%SZ')
-                if date > year_ago_date:
-                    if item['author']:  # Can be null (user not logged in)
-                        # GitHub username
-                        contributors.append(item['author']['login'])
+                yield client
+            finally:
+                self.client = None
+
+    # Walk all commits of a repo, or only those since the ISO 8601 `date_since`, and pass every
+    # page to `fold_page` as soon as it arrives, so no raw commit payload outlives its page.
+    # Raises GithubApiError if the first page fails, e.g. for repos which don't exist or are empty.
+    async def _fold_commits_of_repo(self, org_then_slash_then_repo: str, fold_page, date_since: str = None):
+        if self.client is None:
+            async with self.open_client():
+                return await self._fold_commits_of_repo(org_then_slash_then_repo, fold_page, date_since)
+        # Commits are not chronological, so pull all pages of the range and filter
+        url = f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/commits?per_page=100"
+        if date_since:
+            url += '&since=' + date_since
+        first_page = await self.client.get_pages(url, lambda page: fold_page(page.json()))
+        if first_page.status != 200:
+            raise GithubApiError(url, first_page.status, first_page.reason, first_page.text)
+
+    # Bring the commits of a repo in the commit store up to date and return the contributors
+    # of every day of the last n years as {date: set(logins)}. Only the commits since the
+    # newest stored one (the high-water mark) are fetched.
+    async def _get_daily_contributors_of_repo(self, org_then_slash_then_repo: str, n_years: int = 1):
+        if self.backend == 'git':
+            return await asyncio.wrap_future(self._submit_daily_authors(org_then_slash_then_repo, n_years))
+        # Months are 30 days, so 12 * n_years months fit in 365 * n_years days
+        window_start = dt.datetime.utcnow() - dt.timedelta(days=365 * n_years)
+        commit_store = get_commit_store()
+        # Only request the pages of the analysis window, `until` defaults to now
+        date_since = commit_store.get_fetch_since(
+            org_then_slash_then_repo, get_cacheable_date_since(window_start))
+        print("Fetching commits of %s since %s" %
+              (org_then_slash_then_repo, date_since))
+
+        def fold_page(commits):
+            try:
+                commit_store.add_commits(org_then_slash_then_repo, commits)
             except Exception as e:
+                print('Failed to get contributors for ' +
+                      org_then_slash_then_repo)
                 print(e)
                 sys.exit(1)
-        # De-duplicate commiters
-        deduplicated_contributors = list(set(contributors))
-        return deduplicated_contributors
 
-    async def get_monthly_contributors_of_repo_in_last_n_years(self, org_then_slash_then_repo: str, n_years: int = 1):
-        # Commits are not chronological, so need to pull all and filter
-        commits = []
+        # Raises before the repo is marked as synced if its commits couldn't be fetched
+        await self._fold_commits_of_repo(
+            org_then_slash_then_repo, fold_page, date_since=date_since)
+        commit_store.mark_synced(org_then_slash_then_repo, date_since)
+        return commit_store.get_daily_author_logins(org_then_slash_then_repo, window_start.strftime('%Y-%m-%d'))
+
+    # The git backend reads the logs of the repos in a process pool, so they are submitted
+    # ahead of time and read in parallel while the repos are analysed one by one
+    def _submit_daily_authors(self, org_then_slash_then_repo: str, n_years: int = 1):
+        if self.git_fetcher is None:
+            self.git_fetcher = GitRepoDataFetcher()
+        future = self.daily_authors_futures.pop((org_then_slash_then_repo, n_years), None)
+        if future is None:
+            future = self.git_fetcher.submit_daily_authors(
+                org_then_slash_then_repo, n_years)
+        return future
 
-        # get personal access token
-        pat = await self._get_access_token()
+    async def get_contributors_of_repo_in_last_n_years(self, org_then_slash_then_repo: str, n_years: int = 1):
+        daily_contributors = await self._get_daily_contributors_of_repo(org_then_slash_then_repo, n_years)
+
+        days_count = 365 * n_years  # TODO: Adjust for leap years
+        # Remove older commits, a single bucket of `days_count` days
+        today_end = dt.datetime.combine(
+            dt.datetime.utcnow().date() + dt.timedelta(days=1), dt.time())
+        days = list(daily_contributors.keys())
+        in_window = get_bucket_indices(
+            parse_dates(days), today_end, days_count, 1) >= 0
+        contributors = []
+        for day, is_in_window in zip(days, in_window):
+            if is_in_window:
+                # GitHub username
+                contributors.extend(daily_contributors[day])
+        # De-duplicate commiters, as login dictionary ids
+        return ContributorSketch('exact').update(contributors)
 
+    async def get_monthly_contributors_of_repo_in_last_n_years(self, org_then_slash_then_repo: str, n_years: int = 1):
         month_count_plus_one = 12 * n_years + 1
         # create empty 2D list of (12 * n_years) empty list elements)
         # explicity append rather than []*12 as this uses same memory ref, thus append to one element means append to all
@@ -231,102 +196,21 @@ class Contributors:
         for i in range(1, month_count_plus_one):
             contributors.append([])
 
-        async with ClientSession() as session:
-            initial_request = await get_commits(session, pat, org_then_slash_then_repo, page=1)
-            # Repo doesn't exist
-            if initial_request["error"] or (type(initial_request["data"]) == dict and initial_request["data"].message == 'Not Found'):
-                return contributors
-            if isinstance(initial_request["data"], list) and len(initial_request["data"]) == 0:
-                return contributors
-            commits.extend(initial_request["data"])
-
-            rate_limit_remaining = initial_request["rate_limit_remaining"]
-            remaining_requests_to_be_made = 0
-            if initial_request["total_pages"]:
-                remaining_requests_to_be_made = initial_request["total_pages"] - 1
-
-            # starting page
-            batch_start = 2
-            while remaining_requests_to_be_made > 0:
-                if remaining_requests_to_be_made > min(rate_limit_remaining, 200):
-                    batch_end = batch_start + min(rate_limit_remaining, 200)
-                else:
-                    batch_end = batch_start + remaining_requests_to_be_made
-
-                print("Start", batch_start, "End", batch_end)
-
-                # get data for page from batch_start to batch_end
-                tasks = []
-                for page in range(batch_start, batch_end + 1):
-                    task = ensure_future(
-                        get_commits(
-                            session, pat, org_then_slash_then_repo, page)
-                    )
-                    tasks.append(task)
-
-                responses = await asyncio.gather(*tasks)
-                if len(responses) == 0:
-                    sys.exit(1)
-
-                successful_responses_count = 0
-                rate_limit_exceeded = False
-                for response in responses:
-                    if response["error"]:
-                        # Get 502 some times
-                        if response["error_code"] == 403 or response["error_code"] // 100 == 5:
-                            print("Rate limit trigger detected")
-                            rate_limit_exceeded = True
-                            break
-                        # Printing unhandled error and exiting
-                        print(response)
-                        sys.exit(1)
-
-                    if not isinstance(response["data"], list):
-                        print(response["error"])
-                        sys.exit(1)
-                    successful_responses_count += 1
-                    commits.extend(response["data"])
-
-                if rate_limit_exceeded:
-                    print("Hourly rate limit exceeded for current token")
-                    pat = await self._get_access_token()
-
-                print("Successful reqs: ", successful_responses_count)
-                remaining_requests_to_be_made -= successful_responses_count
-                rate_limit_remaining -= successful_responses_count
-                batch_start += successful_responses_count
-
-        # If wanting to create a record of every repo's commits, uncomment this
-        # with open(org_then_slash_then_repo + '_commits.json', 'w+') as outfile:
-        #    json.dump(commits, outfile)
+        daily_contributors = await self._get_daily_contributors_of_repo(org_then_slash_then_repo, n_years)
+
         # Remove older commits
-        # Include final end date for later use
-        month_start_dates = [dt.datetime.now()]
-        # Generate (12 * n_years) months of start dates
-        for month in range(1, month_count_plus_one):
-            # 12 'months' is 360 days
-            month_start_dates.append(
-                month_start_dates[-1] - dt.timedelta(days=30))
-        month_start_dates.reverse()
-        for item in commits:
-            try:
-                date_string = item['commit']['author']['date']
-                date = dt.datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%SZ')
-                # FIXME find a more efficient way to do this
-                for index, (start, end) in enumerate(zip(month_start_dates, month_start_dates[1:])):
-                    # Can be null (user not logged in)
-                    if date >= start and date < end and item['author']:
-                        contributors[index].append(item['author']['login'])
-            except Exception as e:
-                print('Failed to get monthly contributors for ' +
-                      org_then_slash_then_repo)
-                print(e)
-                sys.exit(1)
-        # De-duplicate commiters
-        for index, month_of_contributors in enumerate(contributors):
-            deduplicated_contributors = list(set(month_of_contributors))
-            contributors[index] = deduplicated_contributors
-        return contributors
+        # Months end at the end of today (UTC), as the contributors are stored per day
+        month_end = dt.datetime.combine(
+            dt.datetime.utcnow().date() + dt.timedelta(days=1), dt.time())
+        days = list(daily_contributors.keys())
+        # 12 'months' is 360 days
+        month_indices = get_bucket_indices(
+            parse_dates(days), month_end, 30, len(contributors))
+        for day, month_index in zip(days, month_indices.tolist()):
+            if month_index >= 0:
+                contributors[month_index].extend(daily_contributors[day])
+        # De-duplicate commiters, as login dictionary ids
+        return [ContributorSketch('exact').update(month_of_contributors) for month_of_contributors in contributors]
 
     async def get_contr_from_toml(self, toml_file: str, monthly: bool = True, years_count: int = 1):
         toml_file_without_protocols = toml_file.split('protocols/')[1]
@@ -334,99 +218,94 @@ class Contributors:
         out_file_name = toml_file_without_protocols.replace(
             '.toml', '_contributors.json')
         out_file_name_with_path = self.save_path + '/' + out_file_name
-        # Useful if left running e.g. over weekend - if failed, re-run INCLUDING last repo listed
-        progress_file_name = toml_file.replace('.toml', '_repos_seen.txt')
-
-        month_count_plus_one = 12 * years_count + 1
-        # create empty 2D list of (12 * years_count) empty list elements)
-        # explicity append rather than []*12 as this uses same memory ref, thus append to one element means append to all
-        list_2d = []
-        for i in range(1, month_count_plus_one):
-            list_2d.append([])
-
-        stats = None
-        seen_repos = []
-        if path.exists(out_file_name_with_path):
-            with open(out_file_name_with_path, 'r') as stats_json:
-                stats = json.load(stats_json)
-            if not stats == list_2d:
-                if path.exists(progress_file_name):
-                    progress_file = open(progress_file_name, 'r')
-                    progress_repos_list = progress_file.readlines()
-                    for (_, repo_name_with_line_term) in enumerate(progress_repos_list):
-                        repo_name = repo_name_with_line_term.split("\n")[0]
-                        seen_repos.append(repo_name)
-            elif path.exists(progress_file_name):
-                remove(progress_file_name)
-
-        if stats:
-            core_array = stats
-        elif monthly:
-            # Explicity def, see above
-            # TODO: change this length to make it configurable
-            core_array = list_2d
-        else:
-            # yearly
-            core_array = []
+        # Useful if left running e.g. over weekend - if failed, re-run to resume after the last journaled repo
+        journal_file_name = self.save_path + '/' + \
+            toml_file_without_protocols.replace('.toml', '_contributors_journal.jsonl')
+
+        # Repos already analysed with the same parameters by a run that didn't finish
+        seen_repos = set()
+        for entry in read_journal(journal_file_name):
+            if entry["monthly"] == monthly and entry["years_count"] == years_count:
+                seen_repos.add(entry["repo"])
+
+        # One keep-alive client for all the repos of the run
+        async with self.open_client():
+            repos = await self.get_repos_for_protocol_from_toml(protocol_name)
+            unseen_repo = []
+            for repo in repos:
+                if repo in seen_repos:
+                    print("Ignoring seen repo: ", repo)
+                    continue
+                unseen_repo.append(repo)
+            if self.backend == 'git':
+                for repo in unseen_repo:
+                    self.daily_authors_futures[(repo, years_count)] = self._submit_daily_authors(
+                        repo, years_count)
+
+            # Don't thread this - API limit
+            with open_journal(journal_file_name) as journal_file:
+                for repo in unseen_repo:
+                    print("Analysing repo: ", repo)
+                    try:
+                        if monthly:
+                            contributors = await self.get_monthly_contributors_of_repo_in_last_n_years(repo, n_years=years_count)
+                        else:
+                            contributors = await self.get_contributors_of_repo_in_last_n_years(repo, n_years=years_count)
+                    except (GitRepoError, GithubApiError) as e:
+                        # e.g. deleted, renamed, private or empty since it was listed. Not journaled,
+                        # so the next run tries again
+                        print("Skipping %s: %s" % (repo, e))
+                        continue
+                    # Save progress in case of failure, one line per repo so the cost doesn't grow with the repo count
+                    append_journal_entry(journal_file, {
+                        "repo": repo,
+                        "monthly": monthly,
+                        "years_count": years_count,
+                        "contributors": sketches_to_json(contributors)
+                    })
+
+        repo_contributors = (sketches_from_json(entry["contributors"]) for entry in read_journal(journal_file_name)
+                             if entry["monthly"] == monthly and entry["years_count"] == years_count)
+        deduplicated_contributors = self._save_contributors(
+            out_file_name_with_path, repo_contributors, monthly, years_count)
+        # The run is complete, the next one starts from scratch
+        remove(journal_file_name)
+        return deduplicated_contributors
 
-        with open(out_file_name_with_path, 'w') as outfile:
-            json.dump(core_array, outfile)
+    # De-duplicate the contributors of all repos of a protocol in a single pass and write them
+    # `repo_contributors` yields the result of get_(monthly_)contributors_of_repo_in_last_n_years of every repo,
+    # the sketches of a month are merged with a bitwise OR of their login id bitmaps.
+    # The merged ContributorSketch of every month (a single one if yearly) is written next to the
+    # contributors, see contributorSketch.py. With hll sketches only the counts are written.
+    def _save_contributors(self, out_file_name_with_path: str, repo_contributors, monthly: bool = True, years_count: int = 1):
+        # explicity append rather than [ContributorSketch()]*12 as this uses same memory ref
+        monthly_sketches = []
+        for i in range(12 * years_count if monthly else 1):
+            monthly_sketches.append(ContributorSketch())
+        for contributors in repo_contributors:
+            if not monthly:
+                # yearly
+                contributors = [contributors]
+            for sketch, month_sketch in zip(monthly_sketches, contributors):
+                sketch.merge(month_sketch)
 
-        repos = await self.get_repos_for_protocol_from_toml(protocol_name)
-        unseen_repo = []
-        for repo in repos:
-            if repo in seen_repos:
-                print("Ignoring seen repo: ", repo)
-                continue
-            unseen_repo.append(repo)
-
-        # Don't thread this - API limit
-        for repo in unseen_repo:
-            print("Analysing repo: ", repo)
-            if monthly:
-                contributors = await self.get_monthly_contributors_of_repo_in_last_n_years(repo, n_years=years_count)
-            else:
-                contributors = await self.get_contributors_of_repo_in_last_n_years(repo, n_years=years_count)
-            # Save progress in case of failure
-            try:
-                with open(out_file_name_with_path) as json_file:
-                    data = json.load(json_file)
-                if monthly:
-                    # FIXME efficiency, note np.concatenate on axis 1 doesn't play well with our core array
-                    for index, item in enumerate(data):
-                        item.extend(contributors[index])
-                else:
-                    data.extend(contributors)
-                with open(progress_file_name, 'a') as progress_file:
-                    progress_file.write(repo + '\n')
-                with open(out_file_name_with_path, 'w') as outfile:
-                    json.dump(data, outfile)
-            except Exception as e:
-                print(
-                    'Failed to collate monthly contributors for all repos in toml file')
-                print(e)
-                sys.exit(1)
-        try:
-            with open(out_file_name_with_path) as json_file:
-                data = json.load(json_file)
-        except Exception as e:
-            print(e)
-            sys.exit(1)
         if monthly:
             print('Monthly active developers in the past year:')
-            for index, month_of_contributors in enumerate(data):
-                deduplicated_monthly_contributors = list(
-                    set(month_of_contributors))
-                data[index] = deduplicated_monthly_contributors
-                print('Month ' + str(index + 1) + ': ' +
-                      str(len(deduplicated_monthly_contributors)))
-            deduplicated_contributors = data
+            for index, sketch in enumerate(monthly_sketches):
+                print('Month ' + str(index + 1) + ': ' + str(sketch.count()))
         else:
-            deduplicated_contributors = list(set(data))
             print('Total active developers in the past year: ' +
-                  str(len(deduplicated_contributors)))
+                  str(monthly_sketches[0].count()))
+        if monthly_sketches[0].kind == 'exact':
+            deduplicated_contributors = [sketch.get_logins() for sketch in monthly_sketches]
+        else:
+            deduplicated_contributors = [sketch.count() for sketch in monthly_sketches]
+        if not monthly:
+            deduplicated_contributors = deduplicated_contributors[0]
         with open(out_file_name_with_path, 'w') as outfile:
             json.dump(deduplicated_contributors, outfile)
+        save_monthly_sketches(out_file_name_with_path.replace(
+            '_contributors.json', SKETCH_FILE_SUFFIX), monthly_sketches)
         return deduplicated_contributors
 
 
@@ -434,20 +313,31 @@ class Contributors:
 # Write to file every n repos + repos viewed to not lose progress
 
 if __name__ == '__main__':
-    if not (len(sys.argv) == 2 or len(sys.argv) == 3):
+    p = optparse.OptionParser(
+        usage='python3 contr.py [INPUTFILE.TOML] [YEARS_COUNT]')
+    p.add_option('--backend', type='choice', dest='backend',
+                 choices=['api', 'git'], default='api',
+                 help='Read commits from the GitHub API (api) or from local git mirrors (git)')
+    p.add_option('--expand-sub-ecosystems', action='store_true', dest='expand_sub_ecosystems', default=False,
+                 help='Also crawl the orgs and repos of the sub ecosystems of the protocol, recursively')
+    p.add_option('--concurrency', type='int', dest='concurrency', default=8,
+                 help='Max in-flight GitHub API requests')
+    options, arguments = p.parse_args()
+    if not (len(arguments) == 1 or len(arguments) == 2):
         print('Usage: python3 contr.py [INPUTFILE.TOML] [YEARS_COUNT]')
         sys.exit(1)
     loop = get_event_loop()
     try:
-        if len(sys.argv) == 3 and sys.argv[2] and int(sys.argv[2]) > 0 and int(sys.argv[2]) < 5:
-            years_count = int(sys.argv[2])
-        elif len(sys.argv) == 2:
+        if len(arguments) == 2 and arguments[1] and int(arguments[1]) > 0 and int(arguments[1]) < 5:
+            years_count = int(arguments[1])
+        elif len(arguments) == 1:
             years_count = 1
     except:
         years_count = 1
     try:
-        c = Contributors('./output')
+        c = Contributors('./output', backend=options.backend,
+                         expand_sub_ecosystems=options.expand_sub_ecosystems, concurrency=options.concurrency)
         loop.run_until_complete(c.get_contr_from_toml(
-            sys.argv[1], years_count=years_count))
+            arguments[0], years_count=years_count))
     finally:
         loop.close()
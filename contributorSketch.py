@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import json
+import math
+import zlib
+from os import path
+import numpy as np
+from logger import sys
+from config import get_contributor_sketch_kind, get_hll_precision
+from loginDictionary import get_login_dictionary
+
+dir_path = path.dirname(path.realpath(__file__))
+
+'''
+Distinct contributor counts which can be merged across repos, orgs and chains.
+
+A ContributorSketch is either
+- exact: the set of the ids of the logins in the login dictionary (loginDictionary.py), its
+  count is exact. Sparse sets, e.g. the contributors of a repo in a month, are sorted uint32
+  arrays, dense ones, e.g. the contributors of a chain in a month, are bitmaps of 1 bit per id
+- hll: a HyperLogLog of 2 ** precision registers, its count has a standard error of
+  1.04 / sqrt(2 ** precision) (0.8% for the default precision of 14) in a fixed 16KB
+
+Merging two sketches is a set union (exact: a bitwise OR of bitmaps) or a register wise max
+(hll), an exact sketch merged with a hll one is converted first. Exact sketches are written as
+their compressed delta encoded ids, and read back without touching the logins; the ids are
+those of the `output/logins.db` of the machine, so logins are exchanged between machines. The ecosystem wide count of several chains is
+then the count of the union of their sketches, without going back to the logins:
+    python3 contributorSketch.py [CHAIN_NAME ...]
+merges the `output/[CHAIN_NAME]_contributors_sketch.json` files written by contr.py.
+'''
+
+SKETCH_FILE_SUFFIX = '_contributors_sketch.json'
+
+
+# Number of 1 bits of every byte value
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64)
+# An exact set holding more than 1 id in 32 of its id range is a bitmap (1 bit per id)
+# rather than a sorted array (32 bits per id), whichever is smaller
+BITMAP_MIN_DENSITY = 1 / 32
+
+
+# base64 of the zlib compressed deltas of sorted ids
+def _encode_ids(login_ids):
+    deltas = np.diff(np.asarray(login_ids, dtype=np.int64), prepend=0).astype(np.uint32)
+    return base64.b64encode(zlib.compress(deltas.tobytes())).decode('ascii')
+
+
+def _decode_ids(encoded_ids):
+    deltas = np.frombuffer(zlib.decompress(base64.b64decode(encoded_ids)), dtype=np.uint32)
+    return np.cumsum(deltas, dtype=np.int64).astype(np.uint32)
+
+
+# 64 bit hash of a login, the same in every process
+def _hash_login(login):
+    return int.from_bytes(hashlib.blake2b(login.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ContributorSketch:
+
+    # `kind` 'exact' or 'hll', the [contributors] section of config.ini by default
+    def __init__(self, kind: str = None, precision: int = None):
+        self.kind = kind or get_contributor_sketch_kind()
+        self.precision = precision or get_hll_precision()
+        if self.kind == 'exact':
+            # Sorted ids, None when the set is a bitmap
+            self.login_ids = np.zeros(0, dtype=np.uint32)
+            # Bit i % 8 of byte i // 8 (little endian bit order) is set if id i is in the set
+            self.bitmap = None
+        else:
+            self.registers = np.zeros(2 ** self.precision, dtype=np.uint8)
+
+    def update(self, logins):
+        if self.kind == 'exact':
+            return self.update_ids(get_login_dictionary().get_ids(logins))
+        index_bits = 64 - self.precision
+        indices = []
+        ranks = []
+        for login in logins:
+            login_hash = _hash_login(login)
+            indices.append(login_hash >> index_bits)
+            # Position of the first 1 bit of the other bits of the hash
+            ranks.append(index_bits - (login_hash & ((1 << index_bits) - 1)).bit_length() + 1)
+        np.maximum.at(self.registers, np.array(indices, dtype=np.int64), np.array(ranks, dtype=np.uint8))
+        return self
+
+    def add(self, login):
+        return self.update([login])
+
+    # Add login dictionary ids to an exact sketch
+    def update_ids(self, login_ids):
+        login_ids = np.asarray(login_ids, dtype=np.uint32)
+        if self.bitmap is not None:
+            self._set_bits(login_ids)
+            return self
+        self.login_ids = np.union1d(self.login_ids, login_ids).astype(np.uint32)
+        if len(self.login_ids) and len(self.login_ids) >= (int(self.login_ids[-1]) + 1) * BITMAP_MIN_DENSITY:
+            self._to_bitmap()
+        return self
+
+    def _to_bitmap(self):
+        login_ids = self.login_ids
+        self.login_ids = None
+        self.bitmap = np.zeros(0, dtype=np.uint8)
+        self._set_bits(login_ids)
+
+    def _grow_bitmap(self, byte_count):
+        if byte_count > len(self.bitmap):
+            # New logins get the highest ids, double to keep the growth amortized
+            self.bitmap = np.concatenate([self.bitmap, np.zeros(
+                max(byte_count, 2 * len(self.bitmap)) - len(self.bitmap), dtype=np.uint8)])
+
+    def _set_bits(self, login_ids):
+        if len(login_ids) == 0:
+            return
+        self._grow_bitmap(int(login_ids.max()) // 8 + 1)
+        np.bitwise_or.at(self.bitmap, login_ids // 8, np.left_shift(1, login_ids % 8).astype(np.uint8))
+
+    # Sorted ids of an exact sketch
+    def get_ids(self):
+        if self.bitmap is None:
+            return self.login_ids
+        return np.flatnonzero(np.unpackbits(self.bitmap, bitorder='little')).astype(np.uint32)
+
+    # Same logins in a hll sketch
+    def to_hll(self, precision: int = None):
+        if self.kind == 'hll':
+            return self
+        return ContributorSketch('hll', precision or self.precision).update(self.get_logins())
+
+    # Union with `other`, in place
+    def merge(self, other):
+        if self.kind == 'exact' and other.kind == 'exact':
+            if other.bitmap is None:
+                return self.update_ids(other.login_ids)
+            if self.bitmap is None:
+                self._to_bitmap()
+            self._grow_bitmap(len(other.bitmap))
+            np.bitwise_or(self.bitmap[:len(other.bitmap)], other.bitmap, out=self.bitmap[:len(other.bitmap)])
+            return self
+        if self.kind == 'exact':
+            hll = self.to_hll(other.precision)
+            self.kind, self.precision, self.registers = 'hll', hll.precision, hll.registers
+            del self.login_ids, self.bitmap
+        other = other.to_hll(self.precision)
+        if other.precision != self.precision:
+            raise Exception("Can't merge HyperLogLog sketches of precisions %d and %d" %
+                            (self.precision, other.precision))
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        if self.kind == 'exact':
+            if self.bitmap is None:
+                return len(self.login_ids)
+            return int(POPCOUNT[self.bitmap].sum())
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zero_count = int(np.count_nonzero(self.registers == 0))
+        # Linear counting for small cardinalities
+        if estimate <= 2.5 * register_count and zero_count > 0:
+            estimate = register_count * math.log(register_count / zero_count)
+        return int(round(estimate))
+
+    # Logins of an exact sketch
+    def get_logins(self):
+        return get_login_dictionary().get_logins(self.get_ids())
+
+    def to_json(self):
+        if self.kind == 'exact':
+            return {"kind": "exact", "ids": _encode_ids(self.get_ids())}
+        return {
+            "kind": "hll",
+            "precision": self.precision,
+            "registers": base64.b64encode(zlib.compress(self.registers.tobytes())).decode('ascii')
+        }
+
+    @staticmethod
+    def from_json(data):
+        if data["kind"] == 'exact':
+            if "logins" in data:
+                # Written before the login dictionary
+                return ContributorSketch('exact').update(data["logins"])
+            return ContributorSketch('exact').update_ids(_decode_ids(data["ids"]))
+        sketch = ContributorSketch('hll', data["precision"])
+        sketch.registers = np.frombuffer(
+            zlib.decompress(base64.b64decode(data["registers"])), dtype=np.uint8).copy()
+        return sketch
+
+
+# Union of the sketches, a new sketch
+def merge_sketches(sketches, kind: str = None):
+    merged_sketch = ContributorSketch(kind)
+    for sketch in sketches:
+        merged_sketch.merge(sketch)
+    return merged_sketch
+
+
+# json form of a sketch or of a list of sketches, e.g. the monthly sketches of a repo
+def sketches_to_json(sketches):
+    if isinstance(sketches, ContributorSketch):
+        return sketches.to_json()
+    return [sketch.to_json() for sketch in sketches]
+
+
+def sketches_from_json(data):
+    if isinstance(data, dict):
+        return ContributorSketch.from_json(data)
+    return [ContributorSketch.from_json(sketch_data) for sketch_data in data]
+
+
+def save_monthly_sketches(file_path, monthly_sketches):
+    with open(file_path, 'w') as outfile:
+        json.dump(sketches_to_json(monthly_sketches), outfile)
+
+
+def load_monthly_sketches(file_path):
+    with open(file_path, 'r') as infile:
+        return sketches_from_json(json.load(infile))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python3 contributorSketch.py [CHAIN_NAME ...]')
+        sys.exit(1)
+    chains_monthly_sketches = [load_monthly_sketches(path.join(dir_path, 'output', chain_name + SKETCH_FILE_SUFFIX))
+                               for chain_name in sys.argv[1:]]
+    print('Monthly active developers of %s:' % ', '.join(sys.argv[1:]))
+    for index, month_sketches in enumerate(zip(*chains_monthly_sketches)):
+        print('Month ' + str(index + 1) + ': ' + str(merge_sketches(month_sketches).count()))
@@ -1,70 +1,36 @@
+import asyncio
 import json
 import multiprocessing
-import os
-import re
+import numpy as np
 from logger import sys
 import time
 from collections import Counter
-from itertools import zip_longest
+from contextlib import asynccontextmanager
 from os import path
 import optparse
-import toml
 from github import Github
 from joblib import Parallel, delayed
 from gitTokenHelper import GithubPersonalAccessTokenHelper
+from repoDataFetcher import RepoDataFetcher
+from gitRepoDataFetcher import GitRepoDataFetcher, GitRepoError
 from config import get_pats, remove_chain_from_config
-import requests
+from contributorSketch import ContributorSketch
+from githubClient import GITHUB_API_URL, GithubApiError, GithubClient
+from orgRepoLister import get_unforked_org_repos, get_unforked_org_repos_async
+from repoDataCache import get_repo_data_cache
+from protocolIndex import get_protocol_index
+from weeklySeries import get_epoch_week, make_weekly_series, sum_weekly_series
 import datetime
 
 dir_path = path.dirname(path.realpath(__file__))
 
 
-def element_wise_addition_lists(list1, list2):
-    return [sum(x) for x in zip_longest(list1, list2, fillvalue=0)]
-
-
-def get_single_repo_stats_json_file_path(org_then_slash_then_repo):
-    return os.path.abspath("./output/" + org_then_slash_then_repo.split("/")[1] + "_single_repo_stats.json")
-
-
-def get_commits(pat, org_then_slash_then_repo, page=1, year_count=1, date_since=None, date_until=None):
-    url = 'https://api.github.com/repos/' + org_then_slash_then_repo + \
-        '/commits?page=' + str(page) + '&per_page=100'
-    if date_since:
-        url += '&since=' + date_since
-    if date_until:
-        url += '&until=' + date_until
-    r = requests.get(url=url,
-                     headers={'Authorization': 'Token ' + pat})
-    if r.status_code == 200:
-        data = r.json()
-        rate_limit_remaining = int(r.headers['X-RateLimit-Remaining'])
-        total_pages = None
-        if "link" in r.headers:
-            pages_link = r.headers['link']
-            last_page_link = pages_link.split(",")[1]
-            re_match = re.search(
-                'page=(.*)&per_page=100>; rel="last"', last_page_link)
-            if re_match:
-                total_pages = int(re_match.group(1))
-        return {
-            "error": None,
-            "error_code": None,
-            "data": data,
-            "total_pages": total_pages,
-            "rate_limit_remaining": rate_limit_remaining
-        }
-    return {
-        "error": r.content,
-        "error_code": r.status_code
-    }
-
-
 '''
 FLOW
-__main__ -> get_and_save_full_stats -> _read_orgs_for_chain_from_toml -> for each org:
-    _get_repo_data_for_org -> _make_org_repo_list and for each repo of org:
+__main__ -> get_and_save_full_stats -> _get_github_orgs_for_chain -> for each org:
+    _get_repo_data_for_org -> _get_unforked_repos_for_org and for each repo of org:
         _get_single_repo_data
+-> _save_stats_and_history -> for repo data list of each org:
     _get_stats_for_org_from_repo_data -> for repo data of each repo of org:
         _analyse_repo_data_for_churn_and_commits_4w
     _get_historical_progress -> for repo data of each repo of org:
@@ -75,13 +41,53 @@ __main__ -> get_and_save_full_stats -> _read_orgs_for_chain_from_toml -> for eac
 
 class DevOracle:
 
-    def __init__(self, save_path: str, frequency):
+    # `gh_pat_helper` can be shared with other DevOracle/Contributors instances of the process
+    # `client` is a GithubClient running on the event loop of another thread, shared with other
+    # chains (generateReports.py), the requests are then sent on its loop
+    def __init__(self, save_path: str, frequency, weekly_commits_mode: str = 'range',
+                 engine: str = 'async', concurrency: int = 8, gh_pat_helper=None,
+                 metadata_source: str = 'rest', expand_sub_ecosystems: bool = False,
+                 client: GithubClient = None):
         self.save_path = save_path
-        self.gh_pat_helper = GithubPersonalAccessTokenHelper(get_pats())
+        self.gh_pat_helper = gh_pat_helper or GithubPersonalAccessTokenHelper(
+            get_pats())
         self.PAT = self._get_access_token()
         self.gh = Github(self.PAT)
         # churn, commit frequency
         self.frequency = frequency
+        # 'range' fetches commits once for the whole window, 'weekly' walks the API week by week
+        self.weekly_commits_mode = weekly_commits_mode
+        # 'async' fetches repos concurrently with aiohttp, 'sync' one at a time with PyGithub,
+        # 'git' analyses local clones (stars, forks and releases still come from the async API client)
+        self.engine = engine
+        # Source of the repo data of the engine in the repo data cache
+        self.repo_data_source = 'git' if engine == 'git' else 'api'
+        self.git_fetcher = None
+        # max number of in-flight GitHub API requests
+        self.concurrency = concurrency
+        # 'graphql' fetches stars, forks, releases and weekly commits of the async engine in batched GraphQL queries
+        self.metadata_source = metadata_source
+        # Also crawl the orgs and the explicit repos of the sub ecosystems of the toml files, recursively
+        self.expand_sub_ecosystems = expand_sub_ecosystems
+        # `org/repo` -> number of GitHub API requests made by the async engine for the repo
+        # (counted in the `request_counts` of the shared client instead if there is one)
+        self.request_counts = Counter()
+        self.client = client
+
+    # Result of `coroutine`, run on the loop of the shared client if any, else on a new loop
+    def _run_async(self, coroutine):
+        if self.client is None:
+            return asyncio.run(coroutine)
+        return self.client.run_threadsafe(coroutine)
+
+    # The shared client if any, else a new one for the duration of the block
+    @asynccontextmanager
+    async def _open_client(self):
+        if self.client is not None:
+            yield self.client
+            return
+        async with GithubClient(self.gh_pat_helper, self.concurrency, self.request_counts) as client:
+            yield client
 
     def _get_access_token(self):
         res = self.gh_pat_helper.get_access_token()
@@ -91,72 +97,110 @@ class DevOracle:
         time.sleep(res["sleep_time_secs"])
         return self._get_access_token()
 
-    def get_and_save_full_stats(self, chain_name: str, year_count):
-        github_orgs = self._read_orgs_for_chain_from_toml(chain_name)
+    # Feed the rate limit PyGithub read from its last response into the token pool
+    def _update_rate_limit_from_gh(self):
+        remaining, limit = self.gh.rate_limiting
+        self.gh_pat_helper.update_rate_limit(self.PAT, {
+            'X-RateLimit-Remaining': remaining,
+            'X-RateLimit-Limit': limit,
+            'X-RateLimit-Reset': self.gh.rate_limiting_resettime
+        })
 
-        stats_counter = Counter()
-        hist_data = None
+    def get_and_save_full_stats(self, chain_name: str, year_count):
+        if not self.save_full_stats(chain_name, year_count):
+            remove_chain_from_config(chain_name)
+            print('No data found for organisation in toml file')
+            sys.exit(1)
 
-        for org_url in github_orgs:
+    # Same as get_and_save_full_stats without touching the config, False if no data was found
+    def save_full_stats(self, chain_name: str, year_count):
+        org_repo_data_lists = []
+        for org in self._get_github_orgs_for_chain(chain_name):
+            print("Fetching repo data for", org)
+            org_repo_data_lists.append(
+                self._get_repo_data_for_org(org, year_count))
+        explicit_repos = self._get_explicit_repos_for_chain(chain_name)
+        if explicit_repos:
+            print("Fetching repo data for %d repos listed in toml files" %
+                  len(explicit_repos))
+            org_repo_data_lists.append(
+                self._get_repo_data_for_repos(explicit_repos, year_count))
+
+        return self._save_stats_and_history(chain_name, org_repo_data_lists)
+
+    # `org` names of the GitHub organizations/users listed in the toml file of a chain
+    def _get_github_orgs_for_chain(self, chain_name):
+        github_orgs = []
+        for org_url in self._read_orgs_for_chain_from_toml(chain_name):
             if not org_url.startswith("https://github.com/"):
                 # TODO: If Gitlab repo then use Gitlab APIs
                 print("%s is not a github repo...Skipping" % org_url)
                 continue
-            org = org_url.split("https://github.com/")[1]
-            print("Fetching repo data for", org)
-            org_repo_data_list = self._get_repo_data_for_org(org, year_count)
-            print("Fetching stats(stargazers, forks, releases, churn_4w) for", org_url)
+            github_orgs.append(org_url.split("https://github.com/")[1])
+        return github_orgs
+
+    # Write the `_stats.json` and `_history.json` of a chain from the repo data lists of its orgs
+    # Returns False if there is no data to write
+    def _save_stats_and_history(self, chain_name: str, org_repo_data_lists: list):
+        stats_counter = Counter()
+        hist_data = None
+        # Contributors of several orgs are counted once
+        contributor_sketch = ContributorSketch()
+
+        for org_repo_data_list in org_repo_data_lists:
             stats_counter += self._get_stats_for_org_from_repo_data(
                 org_repo_data_list)
+            contributor_sketch.merge(
+                self._get_contributor_sketch(org_repo_data_list))
             hist_data_for_org = self._get_historical_progress(
                 org_repo_data_list)
             print("Combining hist data ...")
             hist_data = self._combine_hist_data(hist_data, hist_data_for_org)
 
         if hist_data == None or stats_counter == {}:
-            remove_chain_from_config(chain_name)
-            print('No data found for organisation in toml file')
-            sys.exit(1)
+            return False
 
+        stats_counter['contributors'] = contributor_sketch.count()
         path_prefix = self.save_path + '/' + chain_name
         with open(path_prefix + '_stats.json', 'w') as outfile:
             outfile.write(json.dumps(dict(stats_counter)))
         with open(path_prefix + '_history.json', 'w') as outfile:
-            outfile.write(json.dumps(dict(hist_data)))
+            outfile.write(json.dumps(self._get_hist_data_json(hist_data)))
+        return True
+
+    # Lists of the weekly series of `hist_data`, oldest week first, and the number of weeks ago of each week
+    def _get_hist_data_json(self, hist_data):
+        weekly_churn = hist_data["weekly_churn"][1].tolist()
+        return {
+            'weekly_churn': weekly_churn,
+            'weekly_commits': hist_data["weekly_commits"][1].tolist(),
+            'weeks_ago': list(range(len(weekly_churn)))[::-1]
+        }
 
     # list all the repos of a github org/user
     # Ensure chain_name is same as name of toml file
     def _read_orgs_for_chain_from_toml(self, chain_name):
-        toml_file_path = path.join(dir_path, 'protocols', chain_name + '.toml')
-        if not path.exists(toml_file_path):
-            print(".toml file not found for %s in /protocols folder" % chain_name)
-            sys.exit(1)
-        try:
-            with open(toml_file_path, 'r') as f:
-                data = f.read()
-            print("Fetching organizations for %s from toml file ..." % chain_name)
-            github_orgs = toml.loads(data)['github_organizations']
-            return github_orgs
-        except:
-            print('Could not open toml file - check formatting.')
-            sys.exit(1)
+        print("Fetching organizations for %s from toml file ..." % chain_name)
+        if self.expand_sub_ecosystems:
+            return get_protocol_index().get_expanded_orgs(chain_name)
+        return get_protocol_index().get_orgs(chain_name)
+
+    # `org/repo` names of the repos listed one by one in the toml files of a chain and its
+    # sub ecosystems which aren't part of its orgs, only crawled with `expand_sub_ecosystems`
+    def _get_explicit_repos_for_chain(self, chain_name):
+        if not self.expand_sub_ecosystems:
+            return []
+        return get_protocol_index().get_expanded_repos(chain_name)
 
     # get the data for all the repos of a github organization
     def _get_repo_data_for_org(self, org_name: str, year_count=1):
-        org_repos = self._make_org_repo_list(org_name)
-        forked_repos = []
-        page = 1
-        url = f"https://api.github.com/orgs/{org_name}/repos?type=forks&page={page}&per_page=100"
-        response = requests.get(
-            url, headers={'Authorization': 'Token ' + self.PAT})
-        while len(response.json()) > 0:
-            for repo in response.json():
-                forked_repos.append(repo["full_name"])
-            page += 1
-            url = f"https://api.github.com/orgs/{org_name}/repos?type=forks&page={page}&per_page=100"
-            response = requests.get(
-                url, headers={'Authorization': 'Token ' + self.PAT})
-        unforked_repos = list(set(org_repos) - set(forked_repos))
+        unforked_repos = self._get_unforked_repos_for_org(org_name)
+        return self._get_repo_data_for_repos(unforked_repos, year_count)
+
+    def _get_repo_data_for_repos(self, unforked_repos: list, year_count=1):
+        if self.engine in ['async', 'git']:
+            print("Fetching single repo data concurrently ...")
+            return self._get_repo_data_list_async(unforked_repos, year_count)
         # GitHub API can hit spam limit
         # number_of_hyperthreads = multiprocessing.cpu_count()
         number_of_hyperthreads = 1
@@ -166,140 +210,197 @@ class DevOracle:
             self._get_single_repo_data)(repo, year_count) for repo in unforked_repos)
         return repo_data_list
 
-    # given the org_name, return list of organisation repos
-    def _make_org_repo_list(self, org_name: str):
-        org_repos = []
-        try:
-            entity = self.gh.get_organization(org_name)
-        except:
-            entity = self.gh.get_user(org_name)
-        for repo in entity.get_repos():
-            org_repos.append(repo.name)
-        org_repos = [org_name + '/{0}'.format(repo) for repo in org_repos]
-        return org_repos
+    # `org/repo` names of the repos of a github organization which aren't forks
+    def _get_unforked_repos_for_org(self, org_name: str):
+        if self.client is None:
+            return get_unforked_org_repos(self.gh_pat_helper, org_name)
+        return self._run_async(get_unforked_org_repos_async(self.gh_pat_helper, org_name, self.client))
 
     def _get_single_repo_data(self, org_then_slash_then_repo: str, year_count: int = 1):
         try:
-            out_file_name_with_path = get_single_repo_stats_json_file_path(
-                org_then_slash_then_repo)
-            if path.exists(out_file_name_with_path):
-                with open(out_file_name_with_path, 'r') as single_repo_data_json:
-                    return json.load(single_repo_data_json)
+            repo_data = get_repo_data_cache().get(org_then_slash_then_repo, year_count, self.repo_data_source)
+            if repo_data is not None:
+                return repo_data
 
             repo_data = self._get_single_repo_data_from_api(
                 org_then_slash_then_repo, year_count)
-            with open(out_file_name_with_path, 'w') as single_repo_data_json:
-                single_repo_data_json.write(json.dumps(dict(repo_data)))
+            get_repo_data_cache().put(org_then_slash_then_repo, year_count, repo_data, self.repo_data_source)
             return repo_data
         except Exception as e:
             print(f"Exception occured while fetching single repo data {e}")
             sys.exit(1)
 
+    # Same as calling _get_single_repo_data for every repo, but repos missing from
+    # the repo data cache are fetched concurrently by RepoDataFetcher. Repos which are gone or
+    # empty, or which the git engine couldn't read, are left out.
+    def _get_repo_data_list_async(self, org_then_slash_then_repos: list, year_count: int = 1):
+        repo_data_cache = get_repo_data_cache()
+        repo_data_by_name = {}
+        uncached_repos = []
+        for org_then_slash_then_repo in org_then_slash_then_repos:
+            repo_data = repo_data_cache.get(org_then_slash_then_repo, year_count, self.repo_data_source)
+            if repo_data is not None:
+                repo_data_by_name[org_then_slash_then_repo] = repo_data
+            else:
+                uncached_repos.append(org_then_slash_then_repo)
+
+        fetcher = RepoDataFetcher(
+            self.gh_pat_helper, self.concurrency, year_count, self.metadata_source, self.client)
+        try:
+            if self.engine == 'git':
+                fetched_repo_data_list = self._fetch_repo_data_list_git(
+                    fetcher, uncached_repos, year_count)
+            else:
+                fetched_repo_data_list = self._run_async(
+                    fetcher.fetch_repo_data_list(uncached_repos))
+        except Exception as e:
+            print(f"Exception occured while fetching single repo data {e}")
+            sys.exit(1)
+        self.request_counts += fetcher.request_counts
+
+        for repo_data in fetched_repo_data_list:
+            repo_data_cache.put(repo_data["name"], year_count, repo_data, self.repo_data_source)
+            repo_data_by_name[repo_data["name"]] = repo_data
+        return [repo_data_by_name[repo] for repo in org_then_slash_then_repos if repo in repo_data_by_name]
+
+    # Commits, churn and authors from local mirrors (in a process pool), stars, forks and
+    # releases from the API at the same time
+    def _fetch_repo_data_list_git(self, fetcher: RepoDataFetcher, org_then_slash_then_repos: list, year_count: int = 1):
+        if self.git_fetcher is None:
+            self.git_fetcher = GitRepoDataFetcher()
+        futures = [self.git_fetcher.submit_repo_data(repo, year_count)
+                   for repo in org_then_slash_then_repos]
+        metadata_list = self._run_async(
+            fetcher.fetch_repo_metadata_list(org_then_slash_then_repos))
+        repo_data_list = []
+        for org_then_slash_then_repo, future, metadata in zip(org_then_slash_then_repos, futures, metadata_list):
+            if metadata is None:
+                # Gone or empty, reported by the fetcher
+                continue
+            try:
+                git_repo_data = future.result()
+            except GitRepoError as e:
+                # e.g. deleted, renamed or private since it was listed, the other repos go on
+                print("Skipping %s: %s" % (org_then_slash_then_repo, e))
+                continue
+            repo_data_list.append({
+                "name": git_repo_data["name"],
+                "repo": metadata["repo"],
+                "weekly_add_del": git_repo_data["weekly_add_del"],
+                "weekly_commits": git_repo_data["weekly_commits"],
+                "contributors": git_repo_data["contributors"],
+                "releases": metadata["releases"],
+                "end_week": git_repo_data["end_week"]
+            })
+        return repo_data_list
+
     # get repo data using a repo URL in the form of `org/repo`
     def _get_single_repo_data_from_api(self, org_then_slash_then_repo: str, year_count: int = 1):
         print('Fetching repo data for ', org_then_slash_then_repo)
-        try:
-            repo = self.gh.get_repo(org_then_slash_then_repo)
-            weekly_add_del = repo.get_stats_code_frequency()
-            weekly_commits = self._get_weekly_commits(
-                self.PAT, org_then_slash_then_repo, year_count)
-            # TODO: Remove contributor specific code
-            weekly_add_del = [{"additions": code_freq_obj._rawData[1],
-                               "deletions": code_freq_obj._rawData[2]} for code_freq_obj in weekly_add_del]
-            contributors = [
-                contributor.author.login for contributor in repo.get_stats_contributors()]
-            return {
-                "name": org_then_slash_then_repo,
-                "repo": {
-                    "stargazers_count": repo.stargazers_count,
-                    "forks_count": repo.forks_count
-                },
-                "weekly_add_del": weekly_add_del,
-                "weekly_commits": weekly_commits,
-                "contributors": contributors,
-                "releases": repo.get_releases().totalCount
-            }
-        except Exception as e:
-            if e.status == 403:
+        weekly_commits = self._get_weekly_commits(
+            org_then_slash_then_repo, year_count)
+        while True:
+            try:
+                repo = self.gh.get_repo(org_then_slash_then_repo)
+                weekly_add_del = repo.get_stats_code_frequency()
+                # TODO: Remove contributor specific code
+                weekly_add_del = [{"additions": code_freq_obj._rawData[1],
+                                   "deletions": code_freq_obj._rawData[2]} for code_freq_obj in weekly_add_del]
+                contributors = [
+                    contributor.author.login for contributor in repo.get_stats_contributors()]
+                releases = repo.get_releases().totalCount
+                self._update_rate_limit_from_gh()
+                return {
+                    "name": org_then_slash_then_repo,
+                    "repo": {
+                        "stargazers_count": repo.stargazers_count,
+                        "forks_count": repo.forks_count
+                    },
+                    "weekly_add_del": weekly_add_del,
+                    "weekly_commits": weekly_commits,
+                    "contributors": contributors,
+                    "releases": releases,
+                    "end_week": get_epoch_week()
+                }
+            except Exception as e:
+                if getattr(e, 'status', None) != 403:
+                    raise e
                 print("Token rate limit reached, switching tokens")
-                PAT = self._get_access_token()
-                self.gh = Github(PAT)
-                return self._get_single_repo_data(org_then_slash_then_repo, year_count)
-            raise e
-
-    def _get_weekly_commits(self, pat, org_then_slash_then_repo, year_count):
-        weekly_commits = []
-        date_until = datetime.datetime.now()
+                self.gh_pat_helper.mark_rate_limited(
+                    self.PAT, getattr(e, 'headers', None))
+                self.PAT = self._get_access_token()
+                self.gh = Github(self.PAT)
+
+    def _get_weekly_commits(self, org_then_slash_then_repo, year_count):
+        if self.weekly_commits_mode == 'range':
+            return self._get_weekly_commits_in_range(org_then_slash_then_repo, year_count)
+        return self._run_async(self._get_weekly_commits_week_by_week(org_then_slash_then_repo, year_count))
+
+    # Count the commits of every week with one paginated walk of the API per week, the
+    # weeks being walked concurrently. Returns an oldest-week-first list.
+    async def _get_weekly_commits_week_by_week(self, org_then_slash_then_repo, year_count):
         WEEKS_PER_YEAR = 52
+        url = f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/commits?per_page=100"
 
-        for week in range(1, WEEKS_PER_YEAR * year_count):
-            curr_week_commits_count = 0
-            page = 1
-
-            # Set date since to one week from date until
-            date_since = date_until - datetime.timedelta(days=6)
+        async def count_commits_of_week(client, date_since, date_until):
+            commit_count = 0
 
-            date_since_formatted = date_since.strftime('%Y-%m-%dT%H:%M:%S%zZ')
-            date_until_formatted = date_until.strftime('%Y-%m-%dT%H:%M:%S%zZ')
-            while True:
-                resp = get_commits(
-                    pat,
-                    org_then_slash_then_repo,
-                    page,
-                    year_count,
-                    date_since_formatted,
-                    date_until_formatted
-                )
-                if resp["error_code"] == 403:
-                    print("Token rate limit reached, switching tokens")
-                    pat = self._get_access_token()
-                    continue
-                if resp["error_code"]:
-                    print("Error code: ", resp["error_code"])
-                    raise Exception(
-                        f"Error occured while fetching weekly commits for {org_then_slash_then_repo}")
-                count = len(resp["data"])
-
-                # No more commits for the curr. week range
-                if count == 0:
-                    break
-                curr_week_commits_count += count
-                page += 1
+            def count_page(page):
+                nonlocal commit_count
+                commit_count += len(page.json())
 
-            # Update the total weekly commits count
-            weekly_commits.insert(0, curr_week_commits_count)
+            week_url = url + '&since=' + date_since.strftime('%Y-%m-%dT%H:%M:%S%zZ') + \
+                '&until=' + date_until.strftime('%Y-%m-%dT%H:%M:%S%zZ')
+            first_page = await client.get_pages(week_url, count_page)
+            if first_page.status != 200:
+                raise GithubApiError(week_url, first_page.status, first_page.reason, first_page.text)
+            return commit_count
 
+        week_ranges = []
+        date_until = datetime.datetime.now()
+        for week in range(1, WEEKS_PER_YEAR * year_count):
+            # Set date since to one week from date until
+            date_since = date_until - datetime.timedelta(days=6)
+            week_ranges.insert(0, (date_since, date_until))
             # Set date_until to a day before the last computed week date
             date_until = date_until - datetime.timedelta(days=7)
 
-        return weekly_commits
+        async with self._open_client() as client:
+            return await asyncio.gather(*[count_commits_of_week(client, date_since, date_until)
+                                          for date_since, date_until in week_ranges])
+
+    # Fetch the commits of the whole `year_count` window in one paginated walk and bucket
+    # them into weeks locally, so the request count scales with the number of commits
+    # instead of the number of weeks. Returns the same oldest-week-first list as the weekly walk.
+    def _get_weekly_commits_in_range(self, org_then_slash_then_repo, year_count):
+        fetcher = RepoDataFetcher(self.gh_pat_helper, self.concurrency, year_count, client=self.client)
+        try:
+            return self._run_async(fetcher.fetch_weekly_commits(org_then_slash_then_repo))
+        finally:
+            self.request_counts += fetcher.request_counts
 
     # given a list of repo_data of org, analyze for churn_4w, commits_4w, stars, releases
     def _get_stats_for_org_from_repo_data(self, org_repo_data_list):
-        number_of_hyperthreads = multiprocessing.cpu_count()
-        n_jobs = 2 if number_of_hyperthreads > 2 else number_of_hyperthreads
-        repo_stats_list = Parallel(n_jobs=n_jobs)(
-            delayed(self._analyse_repo_data_for_churn_and_commits_4w)(repo_data) for repo_data in org_repo_data_list)
+        # In process: the DevOracle holds locks and clients, which can't be pickled for joblib workers
+        repo_stats_list = [self._analyse_repo_data_for_churn_and_commits_4w(repo_data)
+                           for repo_data in org_repo_data_list]
         stats_counter = Counter()
         for repo_stats in repo_stats_list:
             stats_counter += Counter(repo_stats)
         sc_dict = dict(stats_counter)
-        max_contributors = 0
-
-        sc_dict['num_releases'] = 0 if 'num_releases' not in sc_dict else sc_dict['num_releases']
-        # TODO: remove contributor specific data
-        # FIXME find an efficient way to count distinct devs. This is a good lower bound number.
-        for dictionary in repo_stats_list:
-            try:
-                this_contributors = dictionary['contributors']
-            except:
-                this_contributors = 0
-            max_contributors = this_contributors if this_contributors > max_contributors else max_contributors
-        # GitHub API only returns up to 100 contributors FIXME FIX THIS ====================================================================================================
-        sc_dict['contributors'] = max_contributors
+        # Distinct contributors of all the repos of the org
+        # GitHub API only returns up to 100 contributors per repo FIXME FIX THIS
+        sc_dict['contributors'] = self._get_contributor_sketch(org_repo_data_list).count()
         sc_dict['num_releases'] = 0 if 'num_releases' not in sc_dict else sc_dict['num_releases']
         return sc_dict
 
+    # Sketch of the contributors of all the repos of `repo_data_list`
+    def _get_contributor_sketch(self, repo_data_list):
+        sketch = ContributorSketch()
+        for repo_data in repo_data_list:
+            sketch.update(repo_data["contributors"] or [])
+        return sketch
+
     # analyse churn, commits from a git repo data for 'self.frequency' number of weeks
     # TODO: change 4w to make it more generic
     # analyses for latest 4w currently
@@ -338,86 +439,41 @@ class DevOracle:
     # given a list of repo_data for org, analyze for
     # weekly_commits and weekly_churn for all weeks till now;
     # Weekly commit, churn serve as indicators for historical progress
+    # Series are (start epoch week, int64 array), see weeklySeries.py
     def _get_historical_progress(self, org_repo_data_list: list):
-        # GitHub API can hit spam limit
-        number_of_hyperthreads = multiprocessing.cpu_count()
-        n_jobs = 2 if number_of_hyperthreads > 2 else number_of_hyperthreads
-        repo_count_list = Parallel(n_jobs=n_jobs)(
-            delayed(self._get_weekly_churn_and_commits_of_repo)(repo_data) for repo_data in org_repo_data_list)
-        churns = []
-        commits = []
-        for repo in repo_count_list:
-            this_churn = repo['weekly_churn']
-            this_commits = repo['weekly_commits']
-            # Reverse churn and commits array to show latest week data first
-            churns.append(this_churn[::-1])
-            commits.append(this_commits[::-1])
-        # Element wise addition of list of lists
-        # Re-reverse churn and commits array to show oldesr week data first
-        churns = [sum(x) for x in zip_longest(*churns, fillvalue=0)][::-1]
-        commits = [sum(x) for x in zip_longest(*commits, fillvalue=0)][::-1]
-        # churns = churns[-52:]
-        # TODO: figure out why this assert is failing
-        # assert len(churns) == len(commits)
-
-        # Reversed weeks_ago based on the length of churn/commit weeks
-        weeks_ago = list(range(len(churns)))[::-1]
-        sc_dict = {
-            'weekly_churn': churns,
-            'weekly_commits': commits,
-            'weeks_ago': weeks_ago
+        repo_series_list = [self._get_weekly_churn_and_commits_of_repo(repo_data)
+                            for repo_data in org_repo_data_list]
+        return {
+            'weekly_churn': sum_weekly_series([repo_series['weekly_churn'] for repo_series in repo_series_list]),
+            'weekly_commits': sum_weekly_series([repo_series['weekly_commits'] for repo_series in repo_series_list])
         }
-        return sc_dict
 
     def _get_weekly_churn_and_commits_of_repo(self, repo_data: dict):
         org_then_slash_then_repo = repo_data["name"]
-        weekly_commits = repo_data["weekly_commits"]
-        weekly_add_del = repo_data["weekly_add_del"]
-        try:
-            # For front-end app use, combining this github API call with that for single_repo_stats would be beneficial
-            weekly_churn = []
-            if weekly_add_del:
-                for i in range(len(weekly_add_del)):
-                    # Deletions is negative
-                    weekly_churn.append(
-                        weekly_add_del[i]["additions"] - weekly_add_del[i]["deletions"])
-            stats = {
-                'weekly_churn': weekly_churn,
-                'weekly_commits': weekly_commits,
-                'repo': org_then_slash_then_repo
-            }
-            return stats
-        except Exception as e:
-            print(e)
-            stats = {
-                'weekly_churn': [],
-                'weekly_commits': weekly_commits,
-                'repo': org_then_slash_then_repo
-            }
-            return stats
-
-    # Do element wise addition for `weekly_churn`, `weekly_commits`, `weeks_ago` lists
-    # to get the cumulative historical data for a given chain
+        weekly_add_del = repo_data["weekly_add_del"] or []
+        # Repo data cached before the week was recorded is taken as fetched this week
+        end_week = repo_data.get("end_week", get_epoch_week())
+        # For front-end app use, combining this github API call with that for the repo data would be beneficial
+        # Deletions is negative
+        weekly_churn = np.fromiter((week["additions"] - week["deletions"] for week in weekly_add_del),
+                                   dtype=np.int64, count=len(weekly_add_del))
+        return {
+            'weekly_churn': make_weekly_series(weekly_churn, end_week),
+            'weekly_commits': make_weekly_series(repo_data["weekly_commits"] or [], end_week),
+            'repo': org_then_slash_then_repo
+        }
+
+    # Element wise addition of the `weekly_churn` and `weekly_commits` series, aligned on
+    # their epoch weeks, to get the cumulative historical data for a given chain
     def _combine_hist_data(self, cumulative_hist_data, hist_data_for_org):
         if cumulative_hist_data is None:
-            cumulative_hist_data = hist_data_for_org
-        else:
-            cumulative_hist_data["weekly_churn"] = \
-                element_wise_addition_lists(
-                    cumulative_hist_data["weekly_churn"][::-1],
-                    hist_data_for_org["weekly_churn"][::-1]
-            )[::-1]
-            cumulative_hist_data["weekly_commits"] = \
-                element_wise_addition_lists(
-                    cumulative_hist_data["weekly_commits"][::-1],
-                    hist_data_for_org["weekly_commits"][::-1]
-            )[::-1]
-            cumulative_hist_data["weeks_ago"] = \
-                element_wise_addition_lists(
-                    cumulative_hist_data["weeks_ago"][::-1],
-                    hist_data_for_org["weeks_ago"][::-1]
-            )[::-1]
-        return cumulative_hist_data
+            return hist_data_for_org
+        return {
+            'weekly_churn': sum_weekly_series([cumulative_hist_data['weekly_churn'],
+                                               hist_data_for_org['weekly_churn']]),
+            'weekly_commits': sum_weekly_series([cumulative_hist_data['weekly_commits'],
+                                                 hist_data_for_org['weekly_commits']])
+        }
 
 
 if __name__ == '__main__':
@@ -425,11 +481,29 @@ if __name__ == '__main__':
     p.add_option('--frequency', type='int', dest='frequency',
                  help='Enter churn, commit frequency')
 
+    p.add_option('--weekly-commits-mode', type='choice', dest='weekly_commits_mode',
+                 choices=['range', 'weekly'], default='range',
+                 help='Fetch commits once for the whole range (range) or once per week (weekly)')
+    p.add_option('--engine', type='choice', dest='engine',
+                 choices=['async', 'sync', 'git'], default='async',
+                 help='Fetch repos concurrently with aiohttp (async), one at a time (sync) '
+                      'or analyse local git mirrors (git)')
+    p.add_option('--concurrency', type='int', dest='concurrency', default=8,
+                 help='Max in-flight GitHub API requests')
+    p.add_option('--metadata', type='choice', dest='metadata_source',
+                 choices=['rest', 'graphql'], default='rest',
+                 help='Fetch stars, forks, releases and weekly commits with REST requests per repo (rest) '
+                      'or batched GraphQL queries (graphql) in the async engine')
+    p.add_option('--expand-sub-ecosystems', action='store_true', dest='expand_sub_ecosystems', default=False,
+                 help='Also crawl the orgs and repos of the sub ecosystems of the chain, recursively')
+
     options, arguments = p.parse_args()
     if not options.frequency:
         options.frequency = 4
 
-    years_count = int(sys.argv[2]) if sys.argv[2] else 1
+    years_count = int(arguments[1]) if len(arguments) > 1 else 1
 
-    do = DevOracle('./output', options.frequency)
-    do.get_and_save_full_stats(sys.argv[1], years_count)
+    do = DevOracle('./output', options.frequency, options.weekly_commits_mode,
+                   options.engine, options.concurrency, metadata_source=options.metadata_source,
+                   expand_sub_ecosystems=options.expand_sub_ecosystems)
+    do.get_and_save_full_stats(arguments[0], years_count)
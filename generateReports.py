@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import optparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger import sys
+from config import get_chain_names, get_pats, remove_chain_from_config
+from contr import Contributors
+from dev import DevOracle
+from githubClient import GithubClient
+from gitTokenHelper import GithubPersonalAccessTokenHelper
+from httpCache import get_http_cache
+from stats import write_stats_csv
+from vis import Visualize
+
+'''
+FLOW
+__main__ -> ReportGenerator.run -> one event loop, one GithubClient -> for all the chains of
+config.ini, `chains_concurrency` at a time:
+    _run_chain -> DevOracle.save_full_stats in a thread -> Contributors.get_contr_from_toml
+    -> write_stats_csv -> Visualize.run -> _print_summary
+
+Single process replacement of the per chain dev.py/contr.py processes of generateReports.sh.
+The chains are tasks of a single event loop and share one PAT pool (so rate limits seen by
+one chain are seen by all), one GithubClient with its keep-alive connections, the HTTP
+cache and the commit store. contr.py runs on the loop itself, the sync code of dev.py runs
+in a thread per chain and sends its requests to the loop (GithubClient.run_threadsafe).
+Only the main thread changes the chains of the config.
+'''
+
+
+class ReportGenerator:
+
+    def __init__(self, save_path: str, year_count: int = 1, chains_concurrency: int = 2,
+                 concurrency: int = 8, frequency: int = 4, fast_vis: bool = False):
+        self.save_path = save_path
+        self.year_count = year_count
+        self.chains_concurrency = chains_concurrency
+        self.concurrency = concurrency
+        self.frequency = frequency
+        self.fast_vis = fast_vis
+        self.gh_pat_helper = GithubPersonalAccessTokenHelper(get_pats())
+        # chain -> {'dev': secs, 'contr': secs, 'status': 'ok' or the error}
+        self.chain_timings = {}
+        self.step_timings = {}
+
+    def run(self, chain_names: list):
+        start = time.perf_counter()
+        asyncio.run(self._run_chains(chain_names))
+
+        step_start = time.perf_counter()
+        print("Writing stats ...")
+        write_stats_csv()
+        self.step_timings['stats'] = time.perf_counter() - step_start
+
+        step_start = time.perf_counter()
+        print("Running visualizer ...")
+        Visualize(fast=self.fast_vis).run()
+        self.step_timings['vis'] = time.perf_counter() - step_start
+        self.step_timings['total'] = time.perf_counter() - start
+        self._print_summary()
+
+    async def _run_chains(self, chain_names: list):
+        chains_semaphore = asyncio.Semaphore(self.chains_concurrency)
+        # `concurrency` in-flight requests per chain, over the connections of a single session
+        async with GithubClient(self.gh_pat_helper, self.concurrency * self.chains_concurrency) as client:
+            with ThreadPoolExecutor(max_workers=self.chains_concurrency) as executor:
+                await asyncio.gather(*[self._run_chain(chain_name, client, chains_semaphore, executor)
+                                       for chain_name in chain_names])
+
+    # Never raises, the other chains go on if one fails
+    async def _run_chain(self, chain_name: str, client: GithubClient, chains_semaphore: asyncio.Semaphore,
+                         executor: ThreadPoolExecutor):
+        async with chains_semaphore:
+            timing = {'dev': None, 'contr': None, 'status': 'ok'}
+            self.chain_timings[chain_name] = timing
+            try:
+                start = time.perf_counter()
+                print("Running dev for", chain_name)
+                dev_oracle = DevOracle(self.save_path, self.frequency, engine='async',
+                                       concurrency=self.concurrency, gh_pat_helper=self.gh_pat_helper,
+                                       client=client)
+                found_data = await asyncio.get_running_loop().run_in_executor(
+                    executor, dev_oracle.save_full_stats, chain_name, self.year_count)
+                timing['dev'] = time.perf_counter() - start
+                if not found_data:
+                    # On the loop, i.e. the main thread, like everything that changes the config
+                    remove_chain_from_config(chain_name)
+                    timing['status'] = 'failed: no data found for the organisations of the toml file'
+                    print("Error while generating the report of", chain_name, timing['status'])
+                    return
+
+                start = time.perf_counter()
+                print("Running contr for", chain_name)
+                contributors = Contributors(self.save_path, self.gh_pat_helper, concurrency=self.concurrency,
+                                            client=client)
+                await contributors.get_contr_from_toml(
+                    'protocols/' + chain_name + '.toml', years_count=self.year_count)
+                timing['contr'] = time.perf_counter() - start
+            # dev.py and contr.py sys.exit on errors, that only ends this chain
+            except (Exception, SystemExit) as e:
+                timing['status'] = 'failed: %s' % (e.__class__.__name__ if isinstance(e, SystemExit) else e)
+                print("Error while generating the report of", chain_name, timing['status'])
+
+    def _print_summary(self):
+        def format_secs(secs):
+            return '-' if secs is None else '%.1fs' % secs
+
+        print("%-24s %10s %10s  %s" % ("Chain", "dev", "contr", "status"))
+        for chain_name, timing in self.chain_timings.items():
+            print("%-24s %10s %10s  %s" % (chain_name, format_secs(timing['dev']),
+                                           format_secs(timing['contr']), timing['status']))
+        print("stats: %s, vis: %s, total: %s" % (format_secs(self.step_timings['stats']),
+                                                 format_secs(self.step_timings['vis']),
+                                                 format_secs(self.step_timings['total'])))
+        http_cache = get_http_cache()
+        print("HTTP cache: %d hits, %d misses" % (http_cache.hits, http_cache.misses))
+
+
+if __name__ == '__main__':
+    p = optparse.OptionParser(
+        usage='python3 generateReports.py [YEARS_COUNT]')
+    p.add_option('--chains-concurrency', type='int', dest='chains_concurrency', default=2,
+                 help='Number of chains processed at the same time')
+    p.add_option('--concurrency', type='int', dest='concurrency', default=8,
+                 help='Max in-flight GitHub API requests per chain')
+    p.add_option('--frequency', type='int', dest='frequency', default=4,
+                 help='Enter churn, commit frequency')
+    p.add_option('--fast-vis', action='store_true', dest='fast_vis', default=False,
+                 help='Render the figures without confidence intervals, see vis.py --fast')
+
+    options, arguments = p.parse_args()
+    years_count = int(arguments[0]) if len(arguments) > 0 else 1
+
+    generator = ReportGenerator('./output', years_count, options.chains_concurrency,
+                                options.concurrency, options.frequency, options.fast_vis)
+    generator.run(get_chain_names().split())
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs, path
+import numpy as np
+from commitBuckets import count_per_bucket, get_bucket_indices
+from config import get_git_clone_url, get_git_mirror_dir, get_git_processes
+from weeklySeries import get_epoch_week
+
+dir_path = path.dirname(path.realpath(__file__))
+
+WEEKS_PER_YEAR = 52
+# Commit emails GitHub uses for users who keep theirs private, `[id+]login@users.noreply.github.com`
+NOREPLY_EMAIL_RE = re.compile(r'^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$')
+# Never prompt for credentials of private or deleted repos, fail instead
+GIT_ENV = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+
+'''
+Local git backend of DevOracle (--engine git) and Contributors (--backend git), free of API rate limits.
+
+FLOW (for every repo, in a process pool)
+update_mirror -> clone a blobless (--filter=blob:none) bare mirror once, `git fetch` it afterwards
+    -> _read_log streams `git log --numstat` of the default branch over the analysis window
+    -> get_git_repo_data: weekly commits, weekly churn and authors in the `repo_data` shape
+       get_daily_authors: {day: set(authors)} for the monthly contributors
+
+A repo which can't be cloned, fetched or read (deleted, renamed, private) raises GitRepoError,
+which DevOracle and Contributors log before skipping the repo.
+
+Blobs are only fetched for the commits of the window, by `--numstat`. Authors are GitHub
+logins when the commit email is a GitHub noreply one, lowercased emails otherwise, as git
+doesn't know about GitHub accounts.
+'''
+
+
+# A git clone, fetch or log of a repo failed
+class GitRepoError(Exception):
+    pass
+
+
+# Run the git `command` (clone, fetch) of `args` on the repo, GitRepoError if it fails
+def _run_git(command, args, org_then_slash_then_repo):
+    try:
+        subprocess.run(['git'] + args, check=True, env=GIT_ENV)
+    except (subprocess.CalledProcessError, OSError) as e:
+        raise GitRepoError("git %s of %s failed: %s" % (command, org_then_slash_then_repo, e))
+
+
+# Name of a commit author: GitHub login for noreply emails, lowercased email otherwise
+def get_author_identity(email):
+    email = email.strip().lower()
+    re_match = NOREPLY_EMAIL_RE.match(email)
+    if re_match:
+        return re_match.group(1)
+    return email
+
+
+# Bring the bare mirror of `org/repo` up to date and return its path
+def update_mirror(org_then_slash_then_repo, mirror_dir, clone_url):
+    mirror_path = path.join(mirror_dir, org_then_slash_then_repo + '.git')
+    if path.exists(path.join(mirror_path, 'HEAD')):
+        _run_git('fetch', ['--git-dir', mirror_path, 'fetch', '--quiet', '--prune', '--filter=blob:none',
+                           'origin', '+refs/heads/*:refs/heads/*'], org_then_slash_then_repo)
+        return mirror_path
+    # Cloned next to the mirror then renamed, an interrupted clone is never taken for a mirror
+    tmp_mirror_path = mirror_path + '.' + str(os.getpid()) + '.tmp'
+    makedirs(path.dirname(mirror_path), exist_ok=True)
+    shutil.rmtree(tmp_mirror_path, ignore_errors=True)
+    _run_git('clone', ['clone', '--quiet', '--bare', '--filter=blob:none',
+                       clone_url.format(repo=org_then_slash_then_repo), tmp_mirror_path], org_then_slash_then_repo)
+    os.replace(tmp_mirror_path, mirror_path)
+    return mirror_path
+
+
+def _has_commits(mirror_path):
+    return subprocess.run(['git', '--git-dir', mirror_path, 'rev-parse', '--verify', '--quiet', 'HEAD'],
+                          stdout=subprocess.DEVNULL, env=GIT_ENV).returncode == 0
+
+
+# Yield [committer timestamp, author timestamp, author email, additions, deletions] of the
+# commits of the default branch committed since `date_since`, streamed from `git log`
+def _read_log(mirror_path, date_since, numstat=True):
+    if not _has_commits(mirror_path):
+        return
+    args = ['git', '--git-dir', mirror_path, 'log', 'HEAD', '--no-renames',
+            '--since=' + date_since.strftime('%Y-%m-%d %H:%M:%S +0000'),
+            '--format=%x00%ct%x09%at%x09%aE']
+    if numstat:
+        args.append('--numstat')
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, env=GIT_ENV,
+                               universal_newlines=True, errors='replace')
+    commit = None
+    for line in process.stdout:
+        if line.startswith('\0'):
+            if commit is not None:
+                yield commit
+            committed_at, authored_at, email = line[1:].rstrip('\n').split('\t', 2)
+            commit = [int(committed_at), int(authored_at), email, 0, 0]
+        elif commit is not None and line.strip():
+            additions, deletions, _ = line.split('\t', 2)
+            # '-' for binary files
+            if additions != '-':
+                commit[3] += int(additions)
+                commit[4] += int(deletions)
+    if commit is not None:
+        yield commit
+    if process.wait() != 0:
+        raise GitRepoError('git log failed for ' + mirror_path)
+
+
+# `weekly_commits`, `weekly_add_del` and `contributors` of a repo_data dict, over the same
+# weeks as RepoDataFetcher._fetch_weekly_commits. Deletions are negative as in the GitHub stats.
+def get_git_repo_data(org_then_slash_then_repo, year_count, mirror_dir, clone_url):
+    print('Analysing git log of ', org_then_slash_then_repo)
+    mirror_path = update_mirror(org_then_slash_then_repo, mirror_dir, clone_url)
+    week_count = WEEKS_PER_YEAR * year_count - 1
+    date_until = datetime.datetime.utcnow()
+    window_start = date_until - datetime.timedelta(weeks=week_count)
+    commits = list(_read_log(mirror_path, window_start))
+
+    committed_at = np.array([commit[0] for commit in commits], dtype='datetime64[s]')
+    additions = np.array([commit[3] for commit in commits], dtype=np.int64)
+    deletions = np.array([commit[4] for commit in commits], dtype=np.int64)
+    indices = get_bucket_indices(committed_at, date_until, 7, week_count)
+    in_range = indices >= 0
+    weekly_additions = np.bincount(indices[in_range], weights=additions[in_range], minlength=week_count)
+    weekly_deletions = np.bincount(indices[in_range], weights=deletions[in_range], minlength=week_count)
+    return {
+        "name": org_then_slash_then_repo,
+        "weekly_add_del": [{"additions": int(week_additions), "deletions": -int(week_deletions)}
+                           for week_additions, week_deletions in zip(weekly_additions, weekly_deletions)],
+        "weekly_commits": count_per_bucket(committed_at, date_until, 7, week_count),
+        "contributors": sorted(set(get_author_identity(commit[2]) for commit in commits)),
+        "end_week": get_epoch_week(date_until)
+    }
+
+
+# Authors of every day ('YYYY-MM-DD', author date) of the last `n_years`, like CommitStore.get_daily_author_logins
+def get_daily_authors(org_then_slash_then_repo, n_years, mirror_dir, clone_url):
+    print('Analysing git log of ', org_then_slash_then_repo)
+    mirror_path = update_mirror(org_then_slash_then_repo, mirror_dir, clone_url)
+    window_start = datetime.datetime.utcnow() - datetime.timedelta(days=365 * n_years)
+    # Committed before the window but authored in it is rare enough, --since is on the committer date
+    daily_authors = {}
+    for commit in _read_log(mirror_path, window_start, numstat=False):
+        authored_at = datetime.datetime.utcfromtimestamp(commit[1])
+        if authored_at < window_start:
+            continue
+        daily_authors.setdefault(authored_at.strftime('%Y-%m-%d'), set()).add(
+            get_author_identity(commit[2]))
+    return daily_authors
+
+
+class GitRepoDataFetcher:
+
+    # `clone_url` is a format string of `repo` ('org/repo'), e.g. file:///fixtures/{repo} for local repos
+    def __init__(self, processes: int = None, mirror_dir: str = None, clone_url: str = None):
+        self.mirror_dir = mirror_dir or path.join(dir_path, get_git_mirror_dir())
+        self.clone_url = clone_url or get_git_clone_url()
+        self.executor = ProcessPoolExecutor(processes or get_git_processes())
+
+    # concurrent.futures.Future of get_git_repo_data
+    def submit_repo_data(self, org_then_slash_then_repo, year_count: int = 1):
+        return self.executor.submit(get_git_repo_data, org_then_slash_then_repo, year_count,
+                                    self.mirror_dir, self.clone_url)
+
+    # concurrent.futures.Future of get_daily_authors
+    def submit_daily_authors(self, org_then_slash_then_repo, n_years: int = 1):
+        return self.executor.submit(get_daily_authors, org_then_slash_then_repo, n_years,
+                                    self.mirror_dir, self.clone_url)
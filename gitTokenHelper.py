@@ -1,53 +1,224 @@
 # -*- coding: utf-8 -*-
-import datetime
+import atexit
+import calendar
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from os import path
 from github import Github, GithubException
 
+dir_path = path.dirname(path.realpath(__file__))
 
+DEFAULT_STATE_FILE_PATH = path.join(dir_path, 'output', 'pat_pool.json')
+# Core API quota of an authenticated user per hour
+DEFAULT_RATE_LIMIT = 5000
+# Tokens validated within this window are not probed again on start up
+VALIDATION_TTL_SECS = 24 * 60 * 60
+# Min interval between two writes of the pool state file
+SAVE_INTERVAL_SECS = 10
+# Sleep used when a token is rate limited without a reset time (secondary rate limits)
+DEFAULT_RETRY_AFTER_SECS = 60
+
+
+# Tokens are stored by hash so that the state file never contains a PAT
+def _token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+# Pool of GitHub PATs. The remaining quota and reset time of every token are tracked
+# from the `X-RateLimit-*` headers of responses the callers already received, so picking
+# a token costs no API call. The pool state is persisted in a small json file shared by
+# all dev.py/contr.py processes, which then only probe the tokens they know nothing about.
 class GithubPersonalAccessTokenHelper():
-    def __init__(self, pats):
+    def __init__(self, pats, state_file_path=DEFAULT_STATE_FILE_PATH):
         if not isinstance(pats, list):
             raise Exception("PATs must be an array")
         self.pats = []
+        self.state_file_path = state_file_path
+        # token key -> {"valid", "checked_at", "updated_at", "remaining", "limit", "reset"}
+        self.token_states = {}
+        # token -> number of requests currently in flight with the token
+        self.leases = Counter()
+        self.lock = threading.RLock()
+        self.last_saved_at = 0
+        self._load_state()
         self._initialize_pats(pats)
-        self.last_sent_token = 'fff'
+        atexit.register(self.save_state)
 
     def _initialize_pats(self, pats):
+        now = time.time()
         for (_, pat) in enumerate(pats):
+            state = self.token_states.get(_token_key(pat))
+            if state and now - state["checked_at"] < VALIDATION_TTL_SECS:
+                if state["valid"]:
+                    self.pats.append(pat)
+                continue
             try:
+                # /rate_limit does not count against the quota
                 gh = Github(pat)
                 rate_limit = gh.get_rate_limit()
-
+                self.token_states[_token_key(pat)] = {
+                    "valid": True,
+                    "checked_at": now,
+                    "updated_at": now,
+                    "remaining": rate_limit.core.remaining,
+                    "limit": rate_limit.core.limit,
+                    "reset": calendar.timegm(rate_limit.core.reset.utctimetuple())
+                }
                 self.pats.append(pat)
             except GithubException as e:
                 # Probably a bad access token
                 print("Error while querying for personal access token")
                 print(e)
+                self.token_states[_token_key(pat)] = {
+                    "valid": False,
+                    "checked_at": now,
+                    "updated_at": now,
+                    "remaining": 0,
+                    "limit": 0,
+                    "reset": None
+                }
                 continue
+        self.save_state(force=True)
         # Need atleast one valid personal access token
         assert len(self.pats) > 0
 
+    def _load_state(self):
+        if not path.exists(self.state_file_path):
+            return
+        try:
+            with open(self.state_file_path, 'r') as state_json:
+                self.token_states = json.load(state_json)
+        except Exception as e:
+            # A corrupt state file only costs a re-probe of the tokens
+            print("Ignoring unreadable token pool state file", e)
+            self.token_states = {}
+
+    # Merge the state written by other processes in and atomically rewrite the file
+    def save_state(self, force=False):
+        with self.lock:
+            now = time.time()
+            if not force and now - self.last_saved_at < SAVE_INTERVAL_SECS:
+                return
+            self.last_saved_at = now
+            token_states = dict(self.token_states)
+            if path.exists(self.state_file_path):
+                try:
+                    with open(self.state_file_path, 'r') as state_json:
+                        saved_token_states = json.load(state_json)
+                except Exception:
+                    saved_token_states = {}
+                # The most recently updated state of a token wins
+                for key, saved_state in saved_token_states.items():
+                    state = token_states.get(key)
+                    if state is None or saved_state.get("updated_at", 0) > state.get("updated_at", 0):
+                        token_states[key] = saved_state
+            self.token_states = token_states
+            tmp_file_path = self.state_file_path + '.' + str(os.getpid()) + '.tmp'
+            try:
+                with open(tmp_file_path, 'w') as state_json:
+                    json.dump(token_states, state_json)
+                os.replace(tmp_file_path, self.state_file_path)
+            except OSError as e:
+                print("Could not save token pool state", e)
+
+    def _get_or_create_state(self, token):
+        now = time.time()
+        return self.token_states.setdefault(_token_key(token), {
+            "valid": True,
+            "checked_at": now,
+            "updated_at": now,
+            "remaining": None,
+            "limit": DEFAULT_RATE_LIMIT,
+            "reset": None
+        })
+
+    # Record the `X-RateLimit-*` headers of a response made with `token`
+    def update_rate_limit(self, token, headers):
+        if headers is None or 'X-RateLimit-Remaining' not in headers:
+            return
+        with self.lock:
+            state = self._get_or_create_state(token)
+            state["updated_at"] = time.time()
+            state["remaining"] = int(headers['X-RateLimit-Remaining'])
+            if 'X-RateLimit-Limit' in headers:
+                state["limit"] = int(headers['X-RateLimit-Limit'])
+            if 'X-RateLimit-Reset' in headers:
+                state["reset"] = int(headers['X-RateLimit-Reset'])
+        self.save_state()
+
+    # Take `token` out of rotation after a 403, until its reset time or `Retry-After`
+    def mark_rate_limited(self, token, headers=None):
+        with self.lock:
+            self.update_rate_limit(token, headers)
+            state = self._get_or_create_state(token)
+            state["updated_at"] = time.time()
+            state["remaining"] = 0
+            if headers is not None and 'Retry-After' in headers:
+                state["reset"] = int(time.time()) + \
+                    int(headers['Retry-After'])
+            elif state.get("reset") is None or state["reset"] <= time.time():
+                state["reset"] = int(time.time()) + DEFAULT_RETRY_AFTER_SECS
+        self.save_state(force=True)
+
+    # Remaining requests of a token, counting a window that has already reset as full
+    def _get_budget(self, token):
+        state = self.token_states.get(_token_key(token))
+        if state is None or state.get("remaining") is None:
+            return DEFAULT_RATE_LIMIT
+        if state.get("reset") is not None and state["reset"] <= time.time():
+            return state.get("limit") or DEFAULT_RATE_LIMIT
+        return state["remaining"]
+
+    def _get_sleep_time_secs(self):
+        now = time.time()
+        reset_times = [self.token_states[_token_key(token)]["reset"] for token in self.pats
+                       if self.token_states.get(_token_key(token), {}).get("reset") is not None]
+        if not reset_times:
+            return DEFAULT_RETRY_AFTER_SECS
+        return max(min(reset_times) - now, 0) + 1
+
+    # Token with the largest remaining budget, minus the requests in flight with it
+    def _pick_token(self):
+        best_token = None
+        best_budget = 0
+        for token in self.pats:
+            budget = self._get_budget(token) - self.leases[token]
+            if budget > best_budget:
+                best_token = token
+                best_budget = budget
+        return best_token
+
     def get_access_token(self):
-        min_sleep_time_secs = None
-        for (_, token) in enumerate(self.pats):
-            gh = Github(token)
-            rate_limit = gh.get_rate_limit()
-            if rate_limit.core.remaining > 0 and self.last_sent_token != token:
-                self.last_sent_token = token
+        with self.lock:
+            token = self._pick_token()
+            if token is not None:
                 return {
                     'token': token
                 }
-            rate_limit_reset_time = rate_limit.core.reset
-            time_delta = abs(rate_limit_reset_time -
-                             datetime.datetime.utcnow())
-            if min_sleep_time_secs is None:
-                min_sleep_time_secs = time_delta.total_seconds()
-                continue
-            if min_sleep_time_secs < time_delta.total_seconds():
-                min_sleep_time_secs = time_delta.total_seconds()
-
+            min_sleep_time_secs = self._get_sleep_time_secs()
         print("All access tokens have been rate limited")
         print("Min sleep time: ", min_sleep_time_secs)
         return {
             'token': None,
             'sleep_time_secs': min_sleep_time_secs
         }
+
+    # Like get_access_token, but the token counts as one request in flight until
+    # `release_access_token` is called, so concurrent workers spread over the tokens
+    def lease_access_token(self):
+        with self.lock:
+            res = self.get_access_token()
+            if res['token'] is not None:
+                self.leases[res['token']] += 1
+            return res
+
+    def release_access_token(self, token, headers=None):
+        with self.lock:
+            self.leases[token] -= 1
+            if self.leases[token] <= 0:
+                del self.leases[token]
+        self.update_rate_limit(token, headers)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+import re
+from collections import Counter
+from aiohttp import ClientError, ClientSession, TCPConnector
+from httpCache import get_http_cache
+
+GITHUB_API_URL = 'https://api.github.com'
+# Retries of a request failing with a 5xx or a connection error, after the first attempt
+MAX_RETRIES = 5
+# Full jitter backoff: a retry waits random(0, min(cap, base * 2 ** retry)) seconds
+RETRY_BASE_SECS = 0.5
+RETRY_MAX_BACKOFF_SECS = 30
+# Idle keep-alive connections are kept open this long between requests
+KEEPALIVE_TIMEOUT_SECS = 60
+
+'''
+Async GitHub REST client shared by dev.py, contr.py, repoDataFetcher.py and orgRepoLister.py.
+
+FLOW
+GithubClient.get -> wait for a free slot (at most `concurrency` requests in flight)
+    -> lease the token with the largest remaining budget -> GET through the HTTP cache
+       on the keep-alive connections of a single ClientSession -> release the token with
+       the X-RateLimit-* headers of the response
+    -> 403/429 rate limit: take the token out of rotation until X-RateLimit-Reset (primary
+       limit) or Retry-After (secondary limit) and retry with another token, sleeping until
+       the first reset when all of them are limited
+    -> 5xx/connection error: retry after a jittered exponential backoff
+    -> any other response is returned to the caller
+
+GithubClient.run_threadsafe -> run a coroutine on the loop of the client from another thread,
+so the sync code of dev.py running in the chain threads of generateReports.py shares the
+keep-alive session of the client opened on the main loop
+
+GithubClient.get_pages -> first page -> the other pages, up to the rel="last" page of its
+`Link` header, concurrently, every page passed to `on_page` as soon as it arrives
+'''
+
+
+# Read the page number of the rel="last" entry of a GitHub `Link` header
+def get_last_page(link_header):
+    if not link_header:
+        return None
+    for link in link_header.split(","):
+        if 'rel="last"' in link:
+            re_match = re.search(r'[?&]page=(\d+)', link)
+            if re_match:
+                return int(re_match.group(1))
+    return None
+
+
+# `org/repo` of a GitHub API repos url, None for other urls
+def get_repo_of_url(url):
+    if '/repos/' not in url:
+        return None
+    return '/'.join(url.split('/repos/', 1)[1].split('?')[0].split('/')[:2])
+
+
+def _get_page_url(url, page):
+    return url + ('&' if '?' in url else '?') + 'page=' + str(page)
+
+
+# A GitHub API request which didn't succeed, `status` is the HTTP status of the response
+class GithubApiError(Exception):
+    def __init__(self, url, status, reason, text=''):
+        super().__init__("Error occured while fetching %s: %d %s %s" % (url, status, reason, text))
+        self.url = url
+        self.status = status
+
+
+class GithubClient:
+
+    # Every request leases a token from `gh_pat_helper`, so concurrent requests are spread over
+    # the tokens by their remaining rate limit budget. Use as `async with GithubClient(...) as client`.
+    # The requests made for every repo are added to `request_counts` if given.
+    def __init__(self, gh_pat_helper, concurrency: int = 8, request_counts: Counter = None):
+        self.gh_pat_helper = gh_pat_helper
+        self.concurrency = concurrency
+        self.session = None
+        self.semaphore = None
+        self.loop = None
+        # `org/repo` -> number of requests made for the repo
+        self.request_counts = request_counts if request_counts is not None else Counter()
+        self.retry_count = 0
+        self.rate_limited_count = 0
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = ClientSession(connector=TCPConnector(
+            limit=self.concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT_SECS))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    # Result of `coroutine` run on the loop of the client, from a thread other than the loop's
+    def run_threadsafe(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    # A 403/429 caused by a rate limit rather than missing permissions
+    def _is_rate_limited(self, r):
+        if r.status == 429 or 'Retry-After' in r.headers:
+            return True
+        if r.headers.get('X-RateLimit-Remaining') == '0':
+            return True
+        return 'rate limit' in r.text.lower()
+
+    async def _backoff(self, retry):
+        self.retry_count += 1
+        await asyncio.sleep(random.uniform(0, min(RETRY_MAX_BACKOFF_SECS, RETRY_BASE_SECS * 2 ** retry)))
+
+    # GET a GitHub API url, an HttpResponse of any status but rate limits and server errors
+    async def get(self, url):
+        retry = 0
+        while True:
+            error = None
+            async with self.semaphore:
+                res = self.gh_pat_helper.lease_access_token()
+                if res["token"] is not None:
+                    pat = res["token"]
+                    headers = None
+                    try:
+                        r = await get_http_cache().get_async(
+                            self.session, url, headers={'Authorization': 'Token ' + pat})
+                        headers = r.headers
+                    except (ClientError, asyncio.TimeoutError) as e:
+                        error = e
+                    finally:
+                        self.gh_pat_helper.release_access_token(pat, headers)
+                    self.request_counts[get_repo_of_url(url)] += 1
+            if res["token"] is None:
+                print('Going to sleep since no token exists with usable rate limit')
+                await asyncio.sleep(res["sleep_time_secs"])
+                continue
+            if error is not None or r.status // 100 == 5:
+                if retry >= MAX_RETRIES:
+                    if error is not None:
+                        raise error
+                    return r
+                print("Retrying %s after %s" % (url, error or r.status))
+                await self._backoff(retry)
+                retry += 1
+                continue
+            if r.status in [403, 429] and self._is_rate_limited(r):
+                print("Token rate limit reached, switching tokens")
+                self.rate_limited_count += 1
+                self.gh_pat_helper.mark_rate_limited(pat, r.headers)
+                continue
+            return r
+
+    async def get_or_raise(self, url):
+        r = await self.get(url)
+        if r.status // 100 != 2:
+            raise GithubApiError(url, r.status, r.reason, r.text)
+        return r
+
+    # GET all the pages of a paginated url and pass each 200 response to `on_page` as it arrives,
+    # first page first. Returns the response of the first page, which callers check for e.g.
+    # a 404, `on_page` is only called if it is a 200. Raises if any other page fails.
+    async def get_pages(self, url, on_page):
+        first_page = await self.get(_get_page_url(url, 1))
+        if first_page.status != 200:
+            return first_page
+        on_page(first_page)
+        last_page = get_last_page(first_page.headers.get("Link"))
+
+        async def get_page(page):
+            on_page(await self.get_or_raise(_get_page_url(url, page)))
+
+        if last_page:
+            await asyncio.gather(*[get_page(page) for page in range(2, last_page + 1)])
+        return first_page
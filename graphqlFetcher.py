@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import json
+import math
+from config import get_github_graphql_url, get_graphql_repos_per_query
+
+WEEKS_PER_YEAR = 52
+# GraphQL quota of an authenticated user per hour, in points
+GRAPHQL_RATE_LIMIT = 5000
+# GitHub rejects queries which could return more nodes than this
+MAX_NODES_PER_QUERY = 500000
+# GitHub errors which mean the query was too big or too slow, retried in two halves
+QUERY_LIMIT_ERROR_TYPES = ['MAX_NODE_LIMIT_EXCEEDED', 'RESOURCE_LIMITS_EXCEEDED', 'TIMEOUT']
+
+'''
+FLOW
+fetch_metadata -> for each batch of `repos_per_query` repos:
+    _fetch_batch -> _build_query -> POST to the GraphQL endpoint -> _parse_repo
+        (batches which are too costly for GitHub are split in two and retried)
+
+One aliased GraphQL v4 query fetches the stars, forks and release count of a batch of repos,
+and the number of commits of every week of the `year_count` years window (commit history
+`totalCount` per window), which the REST API needs 3 requests plus the commit pages per repo for.
+Fields missing from a result (repos not found, empty repos, failed or over budget batches) are
+left out, RepoDataFetcher fetches those from the REST API.
+'''
+
+
+def _quote(value):
+    return json.dumps(value)
+
+
+class GraphqlMetadataFetcher:
+
+    # `endpoint` defaults to the GitHub one of config.ini, and can point to a local fake
+    def __init__(self, gh_pat_helper, year_count: int = 1, endpoint: str = None, repos_per_query: int = None):
+        self.gh_pat_helper = gh_pat_helper
+        self.year_count = year_count
+        self.endpoint = endpoint or get_github_graphql_url()
+        self.repos_per_query = repos_per_query or get_graphql_repos_per_query()
+        # token -> remaining GraphQL points, as last reported by `rateLimit`
+        self.remaining_points = {}
+        self.query_count = 0
+        week_count = WEEKS_PER_YEAR * year_count - 1
+        # (since, until) of every week, oldest first, the same buckets as count_per_bucket
+        date_until = datetime.datetime.utcnow()
+        self.windows = []
+        for week in range(week_count):
+            until = date_until - datetime.timedelta(weeks=week_count - 1 - week)
+            since = until - datetime.timedelta(weeks=1)
+            self.windows.append((since.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                 until.strftime('%Y-%m-%dT%H:%M:%SZ')))
+
+    # {`org/repo`: {"stargazers_count", "forks_count", "releases", "weekly_commits"}}, only with the fields fetched
+    async def fetch_metadata(self, session, org_then_slash_then_repos: list):
+        metadata = {}
+        # A repo takes one node per history window, plus the releases and the repo itself
+        max_repos_per_query = max(
+            1, MAX_NODES_PER_QUERY // (len(self.windows) + 2))
+        batch_size = min(self.repos_per_query, max_repos_per_query)
+        for start in range(0, len(org_then_slash_then_repos), batch_size):
+            metadata.update(await self._fetch_batch(
+                session, org_then_slash_then_repos[start:start + batch_size]))
+        print("GraphQL metadata of %d/%d repos in %d queries" %
+              (len(metadata), len(org_then_slash_then_repos), self.query_count))
+        return metadata
+
+    # Estimate of the rate limit cost of a query: one point per 100 connections
+    def _estimate_cost(self, repo_count):
+        return max(1, math.ceil(repo_count * (len(self.windows) + 1) / 100))
+
+    # Token with the most GraphQL points left, None if none can afford `cost`
+    def _pick_token(self, cost):
+        best_token = None
+        best_remaining = -1
+        for token in self.gh_pat_helper.pats:
+            remaining = self.remaining_points.get(token, GRAPHQL_RATE_LIMIT)
+            if remaining > best_remaining:
+                best_token = token
+                best_remaining = remaining
+        if best_remaining < cost:
+            return None
+        return best_token
+
+    def _build_query(self, org_then_slash_then_repos):
+        history_fields = ' '.join('w%d: history(first: 1, since: %s, until: %s) { totalCount }' %
+                                  (index, _quote(since), _quote(until))
+                                  for index, (since, until) in enumerate(self.windows))
+        repo_fields = []
+        for index, org_then_slash_then_repo in enumerate(org_then_slash_then_repos):
+            owner, name = org_then_slash_then_repo.split('/', 1)
+            repo_fields.append('r%d: repository(owner: %s, name: %s) { stargazerCount forkCount '
+                               'releases(first: 1) { totalCount } '
+                               'defaultBranchRef { target { ... on Commit { %s } } } }' %
+                               (index, _quote(owner), _quote(name), history_fields))
+        return 'query { rateLimit { cost remaining resetAt } %s }' % ' '.join(repo_fields)
+
+    def _parse_repo(self, repo):
+        metadata = {
+            "stargazers_count": repo["stargazerCount"],
+            "forks_count": repo["forkCount"],
+            "releases": repo["releases"]["totalCount"]
+        }
+        # No default branch for empty repos
+        target = (repo.get("defaultBranchRef") or {}).get("target") or {}
+        if all(('w%d' % index) in target for index in range(len(self.windows))):
+            metadata["weekly_commits"] = [target['w%d' % index]["totalCount"]
+                                          for index in range(len(self.windows))]
+        return metadata
+
+    async def _fetch_batch(self, session, org_then_slash_then_repos):
+        token = self._pick_token(
+            self._estimate_cost(len(org_then_slash_then_repos)))
+        if token is None:
+            print("GraphQL rate limit reached, falling back to REST")
+            return {}
+        self.query_count += 1
+        try:
+            async with session.post(self.endpoint, json={"query": self._build_query(org_then_slash_then_repos)},
+                                    headers={'Authorization': 'bearer ' + token}) as r:
+                status = r.status
+                resp = await r.json(content_type=None) if status == 200 else None
+        except Exception as e:
+            print("GraphQL query failed, falling back to REST: %s" % e)
+            return {}
+
+        errors = (resp or {}).get("errors") or []
+        data = (resp or {}).get("data") or {}
+        too_costly = status in [502, 504] or any(
+            error.get("type") in QUERY_LIMIT_ERROR_TYPES for error in errors)
+        if too_costly and len(org_then_slash_then_repos) > 1:
+            # Query too big or too slow for GitHub, try the halves
+            half = len(org_then_slash_then_repos) // 2
+            metadata = await self._fetch_batch(session, org_then_slash_then_repos[:half])
+            metadata.update(await self._fetch_batch(session, org_then_slash_then_repos[half:]))
+            return metadata
+        if status != 200:
+            print("GraphQL query failed with status %d, falling back to REST" % status)
+            return {}
+
+        if data.get("rateLimit"):
+            self.remaining_points[token] = data["rateLimit"]["remaining"]
+        metadata = {}
+        for index, org_then_slash_then_repo in enumerate(org_then_slash_then_repos):
+            # null with a NOT_FOUND error for repos which are gone or private
+            repo = data.get('r%d' % index)
+            if repo:
+                metadata[org_then_slash_then_repo] = self._parse_repo(repo)
+        return metadata
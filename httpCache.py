@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import os
+import threading
+from os import path
+import requests
+from requests.structures import CaseInsensitiveDict
+from config import get_http_cache_dir, get_http_cache_max_size_bytes
+
+dir_path = path.dirname(path.realpath(__file__))
+
+# Response headers kept with a cached body, rate limit headers always come from the live response
+CACHED_HEADERS = ['Link', 'ETag', 'Last-Modified', 'Content-Type']
+# Eviction frees space down to this fraction of the max cache size
+EVICTION_TARGET_RATIO = 0.9
+
+
+# Response of a GET made through HttpCache. Same shape whether the body came
+# from the network (200) or from the cache after a 304 Not Modified.
+class HttpResponse:
+    def __init__(self, status, reason, headers, body, from_cache=False):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# On-disk cache of GET responses, revalidated with ETag/Last-Modified conditional
+# requests. GitHub does not count 304 responses against the rate limit, so unchanged
+# pages cost no quota. Entries are gzipped json files named by the hash of the url,
+# the least recently used ones are evicted once the cache grows over `max_size_bytes`.
+class HttpCache:
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.size_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                              if entry.name.endswith('.json.gz'))
+        self.hits = 0
+        self.misses = 0
+        # Keep-alive connections shared by all the callers of the process
+        self.session = requests.Session()
+
+    def _get_entry_path(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return path.join(self.cache_dir, key + '.json.gz')
+
+    def _load_entry(self, url):
+        entry_path = self._get_entry_path(url)
+        try:
+            with gzip.open(entry_path, 'rt') as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        # Another url with the same hash is as good as a miss
+        if entry["url"] != url:
+            return None
+        return entry
+
+    # Conditional request headers for the cached entry of `url`
+    def _get_conditional_headers(self, entry):
+        if entry is None:
+            return {}
+        conditional_headers = {}
+        if entry["headers"].get("ETag"):
+            conditional_headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            conditional_headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return conditional_headers
+
+    def _store_entry(self, url, headers, body):
+        if not headers.get("ETag") and not headers.get("Last-Modified"):
+            # Can't be revalidated, so not worth the space
+            return
+        entry = {
+            "url": url,
+            "headers": {name: headers[name] for name in CACHED_HEADERS if name in headers},
+            "body": body.decode('utf-8')
+        }
+        entry_path = self._get_entry_path(url)
+        tmp_entry_path = entry_path + '.' + str(os.getpid()) + \
+            '.' + str(threading.get_ident()) + '.tmp'
+        with gzip.open(tmp_entry_path, 'wt') as entry_file:
+            json.dump(entry, entry_file)
+        new_size = path.getsize(tmp_entry_path)
+        old_size = path.getsize(entry_path) if path.exists(entry_path) else 0
+        os.replace(tmp_entry_path, entry_path)
+        with self.lock:
+            self.size_bytes += new_size - old_size
+            if self.size_bytes > self.max_size_bytes:
+                self._evict()
+
+    # Remove least recently used entries, recency being the mtime touched on every hit
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json.gz')),
+                         key=lambda entry: entry.stat().st_mtime)
+        self.size_bytes = sum(entry.stat().st_size for entry in entries)
+        target_size_bytes = self.max_size_bytes * EVICTION_TARGET_RATIO
+        for entry in entries:
+            if self.size_bytes <= target_size_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size_bytes -= size
+            except OSError:
+                # Already evicted by another process
+                continue
+
+    def _get_cached_response(self, url, entry, live_headers):
+        try:
+            os.utime(self._get_entry_path(url))
+        except OSError:
+            pass
+        headers = CaseInsensitiveDict(entry["headers"])
+        headers.update(live_headers)
+        self.hits += 1
+        return HttpResponse(200, 'OK', headers, entry["body"].encode('utf-8'), from_cache=True)
+
+    # GET `url` with requests, revalidating a cached copy if there is one
+    def get(self, url, headers=None):
+        entry = self._load_entry(url)
+        request_headers = dict(headers or {})
+        request_headers.update(self._get_conditional_headers(entry))
+        r = self.session.get(url, headers=request_headers)
+        if r.status_code == 304 and entry is not None:
+            return self._get_cached_response(url, entry, r.headers)
+        self.misses += 1
+        if r.status_code == 200:
+            self._store_entry(url, r.headers, r.content)
+        return HttpResponse(r.status_code, r.reason, r.headers, r.content)
+
+    # Same as `get` with an aiohttp ClientSession
+    async def get_async(self, session, url, headers=None):
+        entry = self._load_entry(url)
+        request_headers = dict(headers or {})
+        request_headers.update(self._get_conditional_headers(entry))
+        async with session.get(url, headers=request_headers) as r:
+            body = await r.read()
+            live_headers = CaseInsensitiveDict(r.headers)
+            status = r.status
+            reason = r.reason
+        if status == 304 and entry is not None:
+            return self._get_cached_response(url, entry, live_headers)
+        self.misses += 1
+        if status == 200:
+            self._store_entry(url, live_headers, body)
+        return HttpResponse(status, reason, live_headers, body)
+
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+
+# Cache shared by all the callers of a process, configured in the [http_cache] section of config.ini
+def get_http_cache():
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache(path.join(dir_path, get_http_cache_dir()),
+                                    get_http_cache_max_size_bytes())
+    return _http_cache
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+from os import makedirs, path
+import numpy as np
+
+dir_path = path.dirname(path.realpath(__file__))
+
+DEFAULT_DB_PATH = path.join(dir_path, 'output', 'logins.db')
+# Max number of host parameters of a single SQLite statement
+SQL_CHUNK_SIZE = 500
+
+'''
+Dense integer ids of contributor logins (or git author identities), stored in a single
+SQLite table so that the ids are the same in every run and every process. Contributor sets
+are then held and written as ids (see contributorSketch.py) instead of login strings.
+Ids are handed out in order of first appearance, starting at 1, and never change.
+'''
+
+
+class LoginDictionary:
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        makedirs(path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=60, check_same_thread=False)
+        # Several contr.py/worker.py processes can share the dictionary
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS logins (
+                id INTEGER PRIMARY KEY,
+                login TEXT NOT NULL UNIQUE
+            )''')
+        # Entries read by this process
+        self.ids = {}
+        self.logins = {}
+
+    def _cache_rows(self, rows):
+        for login_id, login in rows:
+            self.ids[login] = login_id
+            self.logins[login_id] = login
+
+    # uint32 array of the ids of `logins`, new logins are added to the dictionary
+    def get_ids(self, logins):
+        logins = list(logins)
+        missing_logins = [login for login in set(logins) if login not in self.ids]
+        if missing_logins:
+            with self.lock, self.connection:
+                self.connection.executemany('INSERT OR IGNORE INTO logins (login) VALUES (?)',
+                                            [(login,) for login in missing_logins])
+                for start in range(0, len(missing_logins), SQL_CHUNK_SIZE):
+                    chunk = missing_logins[start:start + SQL_CHUNK_SIZE]
+                    self._cache_rows(self.connection.execute(
+                        'SELECT id, login FROM logins WHERE login IN (%s)' % ','.join('?' * len(chunk)),
+                        chunk).fetchall())
+        return np.array([self.ids[login] for login in logins], dtype=np.uint32)
+
+    # Logins of `login_ids`, in the same order
+    def get_logins(self, login_ids):
+        login_ids = [int(login_id) for login_id in login_ids]
+        missing_ids = [login_id for login_id in set(login_ids) if login_id not in self.logins]
+        if missing_ids:
+            with self.lock:
+                for start in range(0, len(missing_ids), SQL_CHUNK_SIZE):
+                    chunk = missing_ids[start:start + SQL_CHUNK_SIZE]
+                    self._cache_rows(self.connection.execute(
+                        'SELECT id, login FROM logins WHERE id IN (%s)' % ','.join('?' * len(chunk)),
+                        chunk).fetchall())
+        return [self.logins[login_id] for login_id in login_ids]
+
+
+_login_dictionary = None
+_login_dictionary_lock = threading.Lock()
+
+
+# Dictionary shared by all the callers of a process
+def get_login_dictionary():
+    global _login_dictionary
+    with _login_dictionary_lock:
+        if _login_dictionary is None:
+            _login_dictionary = LoginDictionary()
+    return _login_dictionary
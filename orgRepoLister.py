@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+from githubClient import GITHUB_API_URL, GithubApiError, GithubClient
+
+REPOS_PER_PAGE = 100
+# Max in-flight page requests of a listing made with its own GithubClient
+LISTING_CONCURRENCY = 8
+
+'''
+FLOW
+get_unforked_org_repos(_async) -> listed by this process already? return it
+    -> _list_repos: GithubClient.get_pages of /orgs/<org>/repos (/users/<org>/repos if not an org),
+       the other pages, up to the rel="last" page of the first `Link` header, concurrently
+    -> drop the repos whose `fork` flag is set
+
+One pass over the repo listing of an org, shared by dev.py and contr.py, instead of a
+PyGithub walk plus a walk of the `type=forks` listing to subtract. Listings are kept for
+the rest of the run, so an org shared by several chains is only listed once per process;
+across processes the HTTP cache turns the same pages into 304s.
+'''
+
+# org (lowercase) -> `org/repo` full names of its repos which aren't forks
+_org_repos = {}
+_org_repos_lock = threading.Lock()
+
+
+# Repos of the org, or of the user if `org_name` isn't an org. Raises if neither exists.
+async def _list_repos(client, org_name):
+    repos = []
+
+    def on_page(page):
+        repos.extend(page.json())
+
+    url = f"{GITHUB_API_URL}/orgs/{org_name}/repos?per_page={REPOS_PER_PAGE}"
+    first_page = await client.get_pages(url, on_page)
+    if first_page.status == 404:
+        # Core org is not org but a user
+        url = f"{GITHUB_API_URL}/users/{org_name}/repos?per_page={REPOS_PER_PAGE}"
+        first_page = await client.get_pages(url, on_page)
+    if first_page.status != 200:
+        raise GithubApiError(url, first_page.status, first_page.reason, first_page.text)
+    return repos
+
+
+# `org/repo` full names of the repos of an org/user which aren't forks
+# `client` is a GithubClient, a new one is opened if None
+async def get_unforked_org_repos_async(gh_pat_helper, org_name: str, client: GithubClient = None):
+    with _org_repos_lock:
+        if org_name.lower() in _org_repos:
+            return list(_org_repos[org_name.lower()])
+    if client is None:
+        async with GithubClient(gh_pat_helper, LISTING_CONCURRENCY) as client:
+            repos = await _list_repos(client, org_name)
+    else:
+        repos = await _list_repos(client, org_name)
+    unforked_repos = [repo["full_name"] for repo in repos if not repo["fork"]]
+    with _org_repos_lock:
+        _org_repos[org_name.lower()] = unforked_repos
+    return list(unforked_repos)
+
+
+# Same as get_unforked_org_repos_async, outside of an event loop
+def get_unforked_org_repos(gh_pat_helper, org_name: str):
+    with _org_repos_lock:
+        if org_name.lower() in _org_repos:
+            return list(_org_repos[org_name.lower()])
+    return asyncio.run(get_unforked_org_repos_async(gh_pat_helper, org_name))
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+import glob
+import hashlib
+import os
+import pickle
+import threading
+from os import makedirs, path
+import toml
+from logger import sys
+
+dir_path = path.dirname(path.realpath(__file__))
+
+PROTOCOLS_DIR = path.join(dir_path, 'protocols')
+DEFAULT_INDEX_PATH = path.join(dir_path, 'output', 'protocol_index.pickle')
+# Bump when the layout of the index changes, the index is then rebuilt from scratch
+INDEX_VERSION = 1
+
+'''
+Index of all the protocols/*.toml files, compiled once into a single pickle file so that
+every tool loads the protocols with one read instead of parsing the toml files again.
+
+FLOW
+get_protocol_index -> ProtocolIndex.load -> read the pickle
+    -> _refresh: stat every toml file, re-hash the ones whose mtime or size changed,
+       re-parse the ones whose hash changed, drop the removed ones -> save if anything changed
+
+The index holds, per chain (toml file name): its title, GitHub orgs, explicit repos and
+sub ecosystems (titles of other toml files), plus the reverse maps title -> chain and
+repo -> chains.
+
+get_expanded_orgs / get_expanded_repos -> _expand: depth first walk of the sub ecosystems.
+The (orgs, repos) of every chain are memoized, so subtrees shared by several chains (or
+reached through several paths) are resolved once. Back edges of cycles are ignored.
+'''
+
+
+# `org/repo` (lowercase) of a GitHub repo url, the url itself for other hosts
+def get_repo_key(repo_url):
+    if repo_url.lower().startswith("https://github.com/"):
+        return repo_url[len("https://github.com/"):].strip('/').lower()
+    return repo_url
+
+
+def _hash_file(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _parse_protocol(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            data = toml.loads(f.read())
+    except Exception as e:
+        print('Could not parse %s - check formatting: %s' % (file_path, e))
+        return None
+    return {
+        "title": data.get('title'),
+        "orgs": data.get('github_organizations', []),
+        "repos": [repo['url'] for repo in data.get('repo', []) if 'url' in repo],
+        "sub_ecosystems": data.get('sub_ecosystems', [])
+    }
+
+
+class ProtocolIndex:
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, protocols_dir: str = PROTOCOLS_DIR):
+        self.index_path = index_path
+        self.protocols_dir = protocols_dir
+        # chain -> (mtime_ns, size, sha256) of its toml file when it was parsed
+        self.files = {}
+        # chain -> {"title", "orgs", "repos", "sub_ecosystems"}, None if the toml file is broken
+        self.chains = {}
+        self.title_chains = {}
+        self.repo_chains = {}
+        # chain -> (frozenset of org urls, frozenset of repo keys) of the chain and its sub ecosystems
+        self.expanded = {}
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = pickle.load(f)
+            if index["version"] == INDEX_VERSION and index["protocols_dir"] == self.protocols_dir:
+                self.files = index["files"]
+                self.chains = index["chains"]
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            pass
+        if self._refresh():
+            self.save()
+        self._build_reverse_maps()
+        return self
+
+    # Re-parse the toml files which changed since the index was built, True if any did
+    def _refresh(self):
+        changed = False
+        seen_chains = set()
+        for file_path in glob.glob(path.join(self.protocols_dir, '*.toml')):
+            chain = path.basename(file_path)[:-len('.toml')]
+            seen_chains.add(chain)
+            stat = os.stat(file_path)
+            known = self.files.get(chain)
+            if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                continue
+            file_hash = _hash_file(file_path)
+            if known is None or known[2] != file_hash:
+                self.chains[chain] = _parse_protocol(file_path)
+            # Touched but same content, only the mtime is updated
+            self.files[chain] = (stat.st_mtime_ns, stat.st_size, file_hash)
+            changed = True
+        for chain in set(self.files) - seen_chains:
+            del self.files[chain]
+            del self.chains[chain]
+            changed = True
+        return changed
+
+    def _build_reverse_maps(self):
+        self.title_chains = {}
+        self.repo_chains = {}
+        self.expanded = {}
+        for chain, protocol in self.chains.items():
+            if protocol is None:
+                continue
+            if protocol["title"]:
+                self.title_chains[protocol["title"]] = chain
+            for repo_url in protocol["repos"]:
+                self.repo_chains.setdefault(get_repo_key(repo_url), []).append(chain)
+
+    def save(self):
+        makedirs(path.dirname(self.index_path), exist_ok=True)
+        tmp_index_path = self.index_path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_index_path, 'wb') as f:
+            pickle.dump({
+                "version": INDEX_VERSION,
+                "protocols_dir": self.protocols_dir,
+                "files": self.files,
+                "chains": self.chains
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_index_path, self.index_path)
+
+    # Parsed toml file of `chain`, exits like the toml readers did if it is missing or broken
+    def get_protocol(self, chain):
+        if chain not in self.chains:
+            print(".toml file not found for %s in /protocols folder" % chain)
+            sys.exit(1)
+        if self.chains[chain] is None:
+            print('Could not open toml file - check formatting.')
+            sys.exit(1)
+        return self.chains[chain]
+
+    # GitHub organization urls of a chain
+    def get_orgs(self, chain):
+        return self.get_protocol(chain)["orgs"]
+
+    # Urls of the repos listed one by one in the toml file of a chain
+    def get_repos(self, chain):
+        return self.get_protocol(chain)["repos"]
+
+    # Titles of the sub ecosystems of a chain, see get_chain_of_title
+    def get_sub_ecosystems(self, chain):
+        return self.get_protocol(chain)["sub_ecosystems"]
+
+    # Chain (toml file name) of an ecosystem title, None if no toml file has it
+    def get_chain_of_title(self, title):
+        return self.title_chains.get(title)
+
+    # Chains whose toml file lists `repo_url` explicitly
+    def get_chains_of_repo(self, repo_url):
+        return self.repo_chains.get(get_repo_key(repo_url), [])
+
+    # GitHub organization urls of a chain and of all its sub ecosystems, recursively
+    def get_expanded_orgs(self, chain):
+        self.get_protocol(chain)
+        return sorted(self._expand(chain, [])[0])
+
+    # Repos listed one by one in the toml files of a chain and of all its sub ecosystems, as
+    # `org/repo` (lowercase), without the ones of the orgs of get_expanded_orgs nor other hosts
+    def get_expanded_repos(self, chain):
+        self.get_protocol(chain)
+        orgs, repos, _ = self._expand(chain, [])
+        org_names = set(get_repo_key(org_url) for org_url in orgs)
+        return sorted(repo for repo in repos
+                      if '://' not in repo and repo.split('/')[0] not in org_names)
+
+    # (orgs, repos, chains of `chain_path` reached through a cycle) of `chain` and its sub ecosystems.
+    # The result of a chain is only memoized when complete, i.e. when no cycle went through a
+    # chain above it in `chain_path`, which is still being expanded.
+    def _expand(self, chain, chain_path):
+        if chain in self.expanded:
+            return self.expanded[chain] + (frozenset(),)
+        protocol = self.chains.get(chain)
+        if protocol is None:
+            return frozenset(), frozenset(), frozenset()
+        chain_path.append(chain)
+        orgs = set(org_url.rstrip('/') for org_url in protocol["orgs"])
+        repos = set(get_repo_key(repo_url) for repo_url in protocol["repos"])
+        cycle_chains = set()
+        for title in protocol["sub_ecosystems"]:
+            sub_chain = self.get_chain_of_title(title)
+            if sub_chain is None:
+                # Sub ecosystem without a toml file in protocols/
+                continue
+            if sub_chain in chain_path:
+                print("Ignoring sub ecosystem cycle %s" %
+                      ' -> '.join(chain_path[chain_path.index(sub_chain):] + [sub_chain]))
+                cycle_chains.add(sub_chain)
+                continue
+            sub_orgs, sub_repos, sub_cycle_chains = self._expand(sub_chain, chain_path)
+            orgs.update(sub_orgs)
+            repos.update(sub_repos)
+            cycle_chains.update(sub_cycle_chains)
+        chain_path.pop()
+        cycle_chains.discard(chain)
+        result = (frozenset(orgs), frozenset(repos))
+        if not cycle_chains:
+            self.expanded[chain] = result
+        return result + (frozenset(cycle_chains),)
+
+
+_protocol_index = None
+_protocol_index_lock = threading.Lock()
+
+
+# Index shared by all the callers of a process, loaded (and rebuilt if needed) on first use
+def get_protocol_index():
+    global _protocol_index
+    with _protocol_index_lock:
+        if _protocol_index is None:
+            _protocol_index = ProtocolIndex().load()
+    return _protocol_index
+
+
+if __name__ == '__main__':
+    # Build step, e.g. after updateProtocols.py: the tools would rebuild it on first use otherwise
+    index = get_protocol_index()
+    print("Indexed %d protocols, %d explicit repos, %d sub ecosystem edges" % (
+        len(index.chains), len(index.repo_chains),
+        sum(len(protocol["sub_ecosystems"]) for protocol in index.chains.values() if protocol)))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from os import makedirs, path
+from config import get_repo_data_cache_max_size_bytes, get_repo_data_cache_ttl_secs
+
+dir_path = path.dirname(path.realpath(__file__))
+
+DEFAULT_DB_PATH = path.join(dir_path, 'output', 'repo_data.db')
+# Bump when the shape of the `repo_data` dicts changes, older entries are then ignored
+SCHEMA_VERSION = 2
+# Eviction frees space down to this fraction of the max cache size
+EVICTION_TARGET_RATIO = 0.9
+
+# Sources of `repo_data`: the GitHub API (async and sync engines of dev.py) or local git clones
+# (git engine, whose contributors include emails and churn only covers the analysis window)
+SOURCES = ['api', 'git']
+
+'''
+Cache of the `repo_data` dicts of DevOracle, keyed by (`org/repo`, year_count, source, schema
+version), so the data of one engine is never read by another.
+Entries are zlib compressed json in a single SQLite table, expire `ttl_secs` after they were
+fetched, and the least recently read ones are evicted once the cache grows over `max_size_bytes`.
+'''
+
+
+class RepoDataCache:
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_secs: float = None, max_size_bytes: int = None):
+        makedirs(path.dirname(db_path), exist_ok=True)
+        self.ttl_secs = ttl_secs if ttl_secs is not None else get_repo_data_cache_ttl_secs()
+        self.max_size_bytes = max_size_bytes if max_size_bytes is not None else get_repo_data_cache_max_size_bytes()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(repo_data)')]
+            if columns and 'source' not in columns:
+                # Written before the source was part of the key, the source of its entries is unknown
+                self.connection.execute('DROP TABLE repo_data')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS repo_data (
+                repo TEXT NOT NULL,
+                year_count INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                schema_version INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (repo, year_count, source, schema_version)
+            )''')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS repo_data_accessed_at ON repo_data (accessed_at)')
+
+    # `repo_data` of `org/repo` fetched from `source` (one of SOURCES), None if not cached or expired
+    def get(self, org_then_slash_then_repo: str, year_count: int = 1, source: str = 'api'):
+        now = time.time()
+        key = (org_then_slash_then_repo, year_count, source, SCHEMA_VERSION)
+        with self.lock:
+            row = self.connection.execute('''SELECT data, fetched_at FROM repo_data
+                WHERE repo = ? AND year_count = ? AND source = ? AND schema_version = ?''', key).fetchone()
+            if row is None or now - row[1] > self.ttl_secs:
+                return None
+            with self.connection:
+                self.connection.execute('''UPDATE repo_data SET accessed_at = ?
+                    WHERE repo = ? AND year_count = ? AND source = ? AND schema_version = ?''', (now,) + key)
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, org_then_slash_then_repo: str, year_count: int, repo_data: dict, source: str = 'api'):
+        if source not in SOURCES:
+            raise Exception("Unknown repo data source %s" % source)
+        now = time.time()
+        data = zlib.compress(json.dumps(repo_data).encode('utf-8'))
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO repo_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (org_then_slash_then_repo, year_count, source, SCHEMA_VERSION,
+                                     data, len(data), now, now))
+            size_bytes = self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM repo_data').fetchone()[0]
+            if size_bytes > self.max_size_bytes:
+                self._evict(size_bytes)
+
+    # Remove expired and entries of other schema versions, then least recently read ones
+    def _evict(self, size_bytes):
+        self.connection.execute('DELETE FROM repo_data WHERE fetched_at < ? OR schema_version != ?',
+                                (time.time() - self.ttl_secs, SCHEMA_VERSION))
+        size_bytes = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM repo_data').fetchone()[0]
+        target_size_bytes = self.max_size_bytes * EVICTION_TARGET_RATIO
+        evicted_keys = []
+        for repo, year_count, source, schema_version, size in self.connection.execute(
+                'SELECT repo, year_count, source, schema_version, size FROM repo_data ORDER BY accessed_at'):
+            if size_bytes <= target_size_bytes:
+                break
+            evicted_keys.append((repo, year_count, source, schema_version))
+            size_bytes -= size
+        self.connection.executemany('''DELETE FROM repo_data
+            WHERE repo = ? AND year_count = ? AND source = ? AND schema_version = ?''', evicted_keys)
+
+
+_repo_data_cache = None
+_repo_data_cache_lock = threading.Lock()
+
+
+# Cache shared by all the callers of a process, configured in the [repo_data_cache] section of config.ini
+def get_repo_data_cache():
+    global _repo_data_cache
+    with _repo_data_cache_lock:
+        if _repo_data_cache is None:
+            _repo_data_cache = RepoDataCache()
+    return _repo_data_cache
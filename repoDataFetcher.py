@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime
+from collections import Counter
+from contextlib import asynccontextmanager
+from githubClient import GITHUB_API_URL, GithubApiError, GithubClient, get_last_page
+from commitBuckets import count_per_bucket, parse_dates
+from commitStore import get_commit_store
+from graphqlFetcher import GraphqlMetadataFetcher
+from weeklySeries import get_epoch_week
+
+COMMITS_PER_PAGE = 100
+WEEKS_PER_YEAR = 52
+# GitHub answers 202 while it computes repo statistics in the background, the pending
+# statistics are polled in rounds with an exponential backoff between the rounds
+STATS_MAX_ROUNDS = 8
+STATS_INITIAL_BACKOFF_SECS = 1
+STATS_MAX_BACKOFF_SECS = 30
+# Repo statistics endpoints warmed up for every repo before they are read
+STATS_ENDPOINTS = ['code_frequency', 'contributors']
+# Statuses of the repos which are gone since they were listed (404) or empty (409 on the commits)
+SKIPPED_REPO_STATUSES = [404, 409]
+
+
+# `since` query parameter for `date_since`, moved back to the start of its week so that
+# the url stays the same, and cacheable, for a whole week. The commits between the two
+# dates are fetched too, callers drop them when bucketing.
+def get_cacheable_date_since(date_since):
+    date_since = date_since - datetime.timedelta(days=date_since.weekday())
+    return date_since.strftime('%Y-%m-%dT00:00:00Z')
+
+
+'''
+FLOW
+fetch_repo_data_list -> _warm_up_stats in the background
+    -> GraphqlMetadataFetcher.fetch_metadata (metadata_source 'graphql' only)
+    -> for each repo (bounded by `concurrency` in-flight requests):
+    _fetch_single_repo_data -> concurrently:
+        _fetch_repo, _fetch_code_frequency, _fetch_weekly_commits,
+        _fetch_contributors, _fetch_releases_count
+        (skipping the ones whose fields came from GraphQL)
+    (repos which are gone or empty are left out, the other repos go on)
+
+_warm_up_stats -> trigger the statistics of all repos -> poll the pending ones in rounds
+GitHub computes statistics in the background after a first request, so triggering all of
+them first overlaps their computation across repos instead of waiting on one repo at a time.
+'''
+
+
+class RepoDataFetcher:
+
+    # Requests go through a GithubClient of at most `concurrency` requests in flight, `client`
+    # if given (its requests are then counted in its own `request_counts`)
+    # `metadata_source` 'graphql' fetches the stars, forks, releases and weekly commits of
+    # all the repos with batched GraphQL queries, 'rest' with REST requests per repo
+    def __init__(self, gh_pat_helper, concurrency: int = 8, year_count: int = 1, metadata_source: str = 'rest',
+                 client: GithubClient = None):
+        self.gh_pat_helper = gh_pat_helper
+        self.concurrency = concurrency
+        self.client = client
+        self.year_count = year_count
+        self.metadata_source = metadata_source
+        # `org/repo` -> fields fetched with GraphQL
+        self.metadata = {}
+        # statistics url -> data, for the statistics ready at the end of the warm up
+        self.stats = {}
+        # statistics url -> exception raised while warming it up
+        self.stats_errors = {}
+        self.stats_warm_up = None
+        # `org/repo` -> number of GitHub API requests made for the repo
+        self.request_counts = Counter()
+
+    # The shared client if given, else a new one for the duration of the block
+    @asynccontextmanager
+    async def open_client(self):
+        if self.client is not None:
+            yield self.client
+            return
+        async with GithubClient(self.gh_pat_helper, self.concurrency, self.request_counts) as client:
+            yield client
+
+    # Fetch the `repo_data` dicts of DevOracle for all `org/repo` names, in the same order,
+    # without the repos which are gone or empty
+    async def fetch_repo_data_list(self, org_then_slash_then_repos):
+        async with self.open_client() as client:
+            self.stats_warm_up = asyncio.ensure_future(
+                self._warm_up_stats(client, org_then_slash_then_repos))
+            try:
+                if self.metadata_source == 'graphql':
+                    self.metadata = await GraphqlMetadataFetcher(self.gh_pat_helper, self.year_count).fetch_metadata(
+                        client.session, org_then_slash_then_repos)
+                tasks = [self._fetch_unless_gone(self._fetch_single_repo_data, client, repo)
+                         for repo in org_then_slash_then_repos]
+                return [repo_data for repo_data in await asyncio.gather(*tasks) if repo_data is not None]
+            finally:
+                self.stats_warm_up.cancel()
+
+    # Only the "repo" (stars, forks) and "releases" fields of the `repo_data` dicts, for the
+    # git backend which computes the others from a local clone. None for the repos which are gone.
+    async def fetch_repo_metadata_list(self, org_then_slash_then_repos):
+        async with self.open_client() as client:
+            if self.metadata_source == 'graphql':
+                self.metadata = await GraphqlMetadataFetcher(self.gh_pat_helper, self.year_count).fetch_metadata(
+                    client.session, org_then_slash_then_repos)
+            tasks = [self._fetch_unless_gone(self._fetch_single_repo_metadata, client, repo)
+                     for repo in org_then_slash_then_repos]
+            return await asyncio.gather(*tasks)
+
+    # Weekly commits of a single repo, see _fetch_weekly_commits
+    async def fetch_weekly_commits(self, org_then_slash_then_repo):
+        async with self.open_client() as client:
+            return await self._fetch_weekly_commits(client, org_then_slash_then_repo)
+
+    # `fetch` of a repo, None if the repo was deleted, renamed or made private since it was
+    # listed, or is empty, so that one such repo doesn't fail all the others
+    async def _fetch_unless_gone(self, fetch, client, org_then_slash_then_repo):
+        try:
+            return await fetch(client, org_then_slash_then_repo)
+        except GithubApiError as e:
+            if e.status not in SKIPPED_REPO_STATUSES:
+                raise
+            print("Skipping %s: %s" % (org_then_slash_then_repo, e))
+            return None
+
+    async def _fetch_single_repo_metadata(self, client, org_then_slash_then_repo):
+        metadata = self.metadata.get(org_then_slash_then_repo, {})
+        repo, releases = await asyncio.gather(
+            self._fetch_unless_in_metadata(metadata, ["stargazers_count", "forks_count"],
+                                           self._fetch_repo, client, org_then_slash_then_repo),
+            self._fetch_unless_in_metadata(metadata, "releases",
+                                           self._fetch_releases_count, client, org_then_slash_then_repo)
+        )
+        return {
+            "repo": {
+                "stargazers_count": repo["stargazers_count"],
+                "forks_count": repo["forks_count"]
+            },
+            "releases": releases
+        }
+
+    async def _fetch_single_repo_data(self, client, org_then_slash_then_repo):
+        print('Fetching repo data for ', org_then_slash_then_repo)
+        metadata = self.metadata.get(org_then_slash_then_repo, {})
+        repo, weekly_add_del, weekly_commits, contributors, releases = await asyncio.gather(
+            self._fetch_unless_in_metadata(metadata, ["stargazers_count", "forks_count"],
+                                           self._fetch_repo, client, org_then_slash_then_repo),
+            self._fetch_code_frequency(client, org_then_slash_then_repo),
+            self._fetch_unless_in_metadata(metadata, "weekly_commits",
+                                           self._fetch_weekly_commits, client, org_then_slash_then_repo),
+            self._fetch_contributors(client, org_then_slash_then_repo),
+            self._fetch_unless_in_metadata(metadata, "releases",
+                                           self._fetch_releases_count, client, org_then_slash_then_repo)
+        )
+        return {
+            "name": org_then_slash_then_repo,
+            "repo": {
+                "stargazers_count": repo["stargazers_count"],
+                "forks_count": repo["forks_count"]
+            },
+            "weekly_add_del": weekly_add_del,
+            "weekly_commits": weekly_commits,
+            "contributors": contributors,
+            "releases": releases,
+            # Epoch week of the last weekly value, see weeklySeries.py
+            "end_week": get_epoch_week()
+        }
+
+    # The GraphQL value of `keys` (a key or a list of keys, returned as a dict) if there is
+    # one, else the REST `fetch`
+    async def _fetch_unless_in_metadata(self, metadata, keys, fetch, client, org_then_slash_then_repo):
+        if isinstance(keys, list):
+            if all(key in metadata for key in keys):
+                return {key: metadata[key] for key in keys}
+        elif keys in metadata:
+            return metadata[keys]
+        return await fetch(client, org_then_slash_then_repo)
+
+    # Store the statistics of `url` if ready, returns False on 202
+    async def _poll_stats(self, client, url):
+        try:
+            resp = await client.get_or_raise(url)
+        except Exception as e:
+            # Raised when the repo reads its statistics
+            self.stats_errors[url] = e
+            return True
+        if resp.status == 200:
+            self.stats[url] = resp.json() or []
+            return True
+        if resp.status == 204:
+            # Empty repo, there is nothing to compute
+            self.stats[url] = []
+            return True
+        return False
+
+    # Statistics endpoints return 202 until GitHub has computed them: trigger them all,
+    # then poll the pending ones, all at once, in rounds with a growing backoff
+    async def _warm_up_stats(self, client, org_then_slash_then_repos):
+        pending_urls = [f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/stats/{endpoint}"
+                        for org_then_slash_then_repo in org_then_slash_then_repos
+                        for endpoint in STATS_ENDPOINTS]
+        backoff_secs = STATS_INITIAL_BACKOFF_SECS
+        for stats_round in range(STATS_MAX_ROUNDS):
+            if stats_round > 0:
+                print("Waiting %ds for %d repo statistics computed by GitHub" %
+                      (backoff_secs, len(pending_urls)))
+                await asyncio.sleep(backoff_secs)
+                backoff_secs = min(backoff_secs * 2, STATS_MAX_BACKOFF_SECS)
+            ready = await asyncio.gather(*[self._poll_stats(client, url) for url in pending_urls])
+            pending_urls = [url for url, is_ready in zip(pending_urls, ready) if not is_ready]
+            if not pending_urls:
+                return
+        print("Statistics not ready after %d rounds, skipping %d of them" %
+              (STATS_MAX_ROUNDS, len(pending_urls)))
+
+    async def _get_stats(self, client, url):
+        await asyncio.shield(self.stats_warm_up)
+        if url in self.stats_errors:
+            raise self.stats_errors[url]
+        return self.stats.get(url, [])
+
+    async def _fetch_repo(self, client, org_then_slash_then_repo):
+        resp = await client.get_or_raise(f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}")
+        return resp.json()
+
+    async def _fetch_code_frequency(self, client, org_then_slash_then_repo):
+        code_frequency = await self._get_stats(
+            client, f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/stats/code_frequency")
+        # [<Week In UNIX Timestamp>, <additions>, <deletions with neg symbol>]
+        return [{"additions": week[1], "deletions": week[2]} for week in code_frequency]
+
+    async def _fetch_contributors(self, client, org_then_slash_then_repo):
+        contributors = await self._get_stats(
+            client, f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/stats/contributors")
+        # Author can be null for deleted accounts
+        return [contributor["author"]["login"] for contributor in contributors if contributor["author"]]
+
+    async def _fetch_releases_count(self, client, org_then_slash_then_repo):
+        # With one release per page the last page number is the release count
+        resp = await client.get_or_raise(
+            f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/releases?per_page=1&page=1")
+        last_page = get_last_page(resp.headers.get("Link"))
+        if last_page is not None:
+            return last_page
+        return len(resp.json())
+
+    # Same weekly series as DevOracle._get_weekly_commits_in_range, with the pages
+    # after the first one fetched concurrently
+    async def _fetch_weekly_commits(self, client, org_then_slash_then_repo):
+        week_count = WEEKS_PER_YEAR * self.year_count - 1
+
+        # GitHub returns commit dates in UTC
+        date_until = datetime.datetime.utcnow()
+        window_start = date_until - datetime.timedelta(weeks=week_count)
+        # Only the commits missing from the commit store are fetched. The sync covers the 365 days
+        # window of contr.py, a few days more than the weeks, so that either tool reuses the other's.
+        commit_store = get_commit_store()
+        date_since = commit_store.get_fetch_since(
+            org_then_slash_then_repo,
+            get_cacheable_date_since(date_until - datetime.timedelta(days=365 * self.year_count)))
+        # `until` defaults to now, leaving it out keeps the url cacheable
+        url = f"{GITHUB_API_URL}/repos/{org_then_slash_then_repo}/commits" + \
+            f"?per_page={COMMITS_PER_PAGE}&since={date_since}"
+
+        first_page = await client.get_pages(
+            url, lambda resp: commit_store.add_commits(org_then_slash_then_repo, resp.json()))
+        if first_page.status != 200:
+            raise GithubApiError(url, first_page.status, first_page.reason, first_page.text)
+        commit_store.mark_synced(org_then_slash_then_repo, date_since)
+
+        # `since` and `until` filter on the committer date
+        commit_dates = commit_store.get_committer_dates(
+            org_then_slash_then_repo, window_start.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        return count_per_bucket(parse_dates(commit_dates), date_until, 7, week_count)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import optparse
+from collections import Counter
+from logger import sys
+from config import get_chain_names
+from contr import Contributors
+from dev import DevOracle
+from githubClient import GithubApiError
+from gitRepoDataFetcher import GitRepoError
+
+'''
+FLOW
+__main__ -> GlobalScheduler.run -> for all the chains of config.ini:
+    _run_dev -> list the repos of every unique org once
+        -> DevOracle._get_repo_data_list_async for the unique repos
+        -> DevOracle._save_stats_and_history for each chain, with the repos which have data
+    _run_contr -> list the repos of every chain
+        -> Contributors.get_monthly_contributors_of_repo_in_last_n_years for the unique repos
+        -> Contributors._save_contributors for each chain, with the repos which have contributors
+    _print_report
+
+The protocol toml files overlap (e.g. DeFi protocols are also part of ethereum), so every
+repo is fetched once and its result is fanned out to all the chains which include it.
+Repos which are empty or gone since they were listed are skipped, the chains go on without them.
+'''
+
+
+class GlobalScheduler:
+
+    # `gh_pat_helper` is shared by the DevOracle and the Contributors, a new one if None
+    def __init__(self, save_path: str, frequency: int = 4, year_count: int = 1, concurrency: int = 8,
+                 expand_sub_ecosystems: bool = False, gh_pat_helper=None):
+        self.save_path = save_path
+        self.year_count = year_count
+        self.dev_oracle = DevOracle(
+            save_path, frequency, engine='async', concurrency=concurrency, gh_pat_helper=gh_pat_helper,
+            expand_sub_ecosystems=expand_sub_ecosystems)
+        self.contributors = Contributors(
+            save_path, self.dev_oracle.gh_pat_helper, expand_sub_ecosystems=expand_sub_ecosystems,
+            concurrency=concurrency)
+        # chain -> (number of repo references, number of unique repos)
+        self.dev_repo_counts = {}
+        self.contr_repo_counts = {}
+        self.saved_dev_requests = 0
+        self.saved_contr_requests = 0
+
+    def run(self, chain_names: list):
+        self._run_dev(chain_names)
+        asyncio.run(self._run_contr(chain_names))
+        self._print_report()
+
+    def _run_dev(self, chain_names: list):
+        chain_orgs = {}
+        org_repos = {}
+        # Repos listed one by one in the toml files (with expand_sub_ecosystems only)
+        chain_explicit_repos = {}
+        for chain_name in chain_names:
+            chain_explicit_repos[chain_name] = self.dev_oracle._get_explicit_repos_for_chain(
+                chain_name)
+            chain_orgs[chain_name] = self.dev_oracle._get_github_orgs_for_chain(
+                chain_name)
+            for org in chain_orgs[chain_name]:
+                if org not in org_repos:
+                    print("Listing repos of", org)
+                    org_repos[org] = self.dev_oracle._get_unforked_repos_for_org(
+                        org)
+
+        # Number of chains each repo is part of
+        repo_chain_counts = Counter()
+        for chain_name in chain_names:
+            chain_repos = set(chain_explicit_repos[chain_name])
+            for org in chain_orgs[chain_name]:
+                chain_repos.update(org_repos[org])
+            repo_chain_counts.update(chain_repos)
+        unique_repos = list(repo_chain_counts.keys())
+        self.dev_repo_counts = (
+            sum(repo_chain_counts.values()), len(unique_repos))
+        print("Fetching repo data of %d unique repos for %d chains ..." %
+              (len(unique_repos), len(chain_names)))
+
+        # Without the repos which are empty or gone
+        repo_data_list = self.dev_oracle._get_repo_data_list_async(
+            unique_repos, self.year_count)
+        repo_data_by_name = {repo_data["name"]: repo_data for repo_data in repo_data_list}
+        for repo, chain_count in repo_chain_counts.items():
+            self.saved_dev_requests += (chain_count - 1) * \
+                self.dev_oracle.request_counts[repo]
+
+        for chain_name in chain_names:
+            print("Saving stats and history of", chain_name)
+            org_repo_data_lists = [[repo_data_by_name[repo] for repo in org_repos[org] if repo in repo_data_by_name]
+                                   for org in chain_orgs[chain_name]]
+            if chain_explicit_repos[chain_name]:
+                org_repo_data_lists.append([repo_data_by_name[repo] for repo in chain_explicit_repos[chain_name]
+                                            if repo in repo_data_by_name])
+            if not self.dev_oracle._save_stats_and_history(chain_name, org_repo_data_lists):
+                print('No data found for organisation in toml file of', chain_name)
+
+    async def _run_contr(self, chain_names: list):
+        # One keep-alive client for all the repos
+        async with self.contributors.open_client():
+            chain_repos = {}
+            repo_chain_counts = Counter()
+            for chain_name in chain_names:
+                chain_repos[chain_name] = await self.contributors.get_repos_for_protocol_from_toml(chain_name)
+                repo_chain_counts.update(set(chain_repos[chain_name]))
+            unique_repos = list(repo_chain_counts.keys())
+            self.contr_repo_counts = (
+                sum(repo_chain_counts.values()), len(unique_repos))
+            print("Fetching contributors of %d unique repos for %d chains ..." %
+                  (len(unique_repos), len(chain_names)))
+
+            repo_contributors = {}
+            # Don't thread this - API limit
+            for repo in unique_repos:
+                print("Analysing repo: ", repo)
+                try:
+                    repo_contributors[repo] = await self.contributors.get_monthly_contributors_of_repo_in_last_n_years(
+                        repo, n_years=self.year_count)
+                except (GithubApiError, GitRepoError) as e:
+                    # e.g. empty, deleted, renamed or private since it was listed, as in Contributors.get_contr_from_toml
+                    print("Skipping %s: %s" % (repo, e))
+        for repo, chain_count in repo_chain_counts.items():
+            self.saved_contr_requests += (chain_count - 1) * \
+                self.contributors.request_counts[repo]
+
+        for chain_name in chain_names:
+            print("Saving contributors of", chain_name)
+            out_file_name_with_path = self.save_path + '/' + chain_name + '_contributors.json'
+            self.contributors._save_contributors(
+                out_file_name_with_path,
+                (repo_contributors[repo] for repo in set(chain_repos[chain_name]) if repo in repo_contributors),
+                years_count=self.year_count)
+
+    def _print_report(self):
+        print("Repo data: %d repo references, %d unique repos, %d requests saved" %
+              (self.dev_repo_counts[0], self.dev_repo_counts[1], self.saved_dev_requests))
+        print("Contributors: %d repo references, %d unique repos, %d requests saved" %
+              (self.contr_repo_counts[0], self.contr_repo_counts[1], self.saved_contr_requests))
+        print("Total requests saved by de-duplication: %d" %
+              (self.saved_dev_requests + self.saved_contr_requests))
+
+
+if __name__ == '__main__':
+    p = optparse.OptionParser(
+        usage='python3 scheduler.py [YEARS_COUNT]')
+    p.add_option('--frequency', type='int', dest='frequency', default=4,
+                 help='Enter churn, commit frequency')
+    p.add_option('--concurrency', type='int', dest='concurrency', default=8,
+                 help='Max in-flight GitHub API requests')
+    p.add_option('--expand-sub-ecosystems', action='store_true', dest='expand_sub_ecosystems', default=False,
+                 help='Also crawl the orgs and repos of the sub ecosystems of the chains, recursively')
+
+    options, arguments = p.parse_args()
+    years_count = int(arguments[0]) if len(arguments) > 0 else 1
+
+    scheduler = GlobalScheduler(
+        './output', options.frequency, years_count, options.concurrency, options.expand_sub_ecosystems)
+    scheduler.run(get_chain_names().split())
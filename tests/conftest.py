@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import json
+import sys
+import time
+from os import path
+import pytest
+
+# The modules of the repo are top level modules of its root
+sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+
+import commitStore  # noqa: E402
+import contr  # noqa: E402
+import dev  # noqa: E402
+import fakeGithub  # noqa: E402
+import httpCache  # noqa: E402
+import orgRepoLister  # noqa: E402
+import protocolIndex  # noqa: E402
+import repoDataCache  # noqa: E402
+import repoDataFetcher  # noqa: E402
+from github import Github  # noqa: E402
+from gitTokenHelper import GithubPersonalAccessTokenHelper, _token_key  # noqa: E402
+
+
+# Token helper of a single token, with the stores of the test in `tmp_path` instead of output/
+@pytest.fixture
+def gh_pat_helper(tmp_path, monkeypatch):
+    # A token already known to the pool isn't probed against api.github.com
+    state_file_path = str(tmp_path / 'pat_pool.json')
+    with open(state_file_path, 'w') as state_file:
+        json.dump({_token_key('tok'): {"valid": True, "checked_at": time.time(), "updated_at": time.time(),
+                                       "remaining": None, "limit": 5000, "reset": None}}, state_file)
+    monkeypatch.setattr(httpCache, '_http_cache', httpCache.HttpCache(str(tmp_path / 'http_cache'), 10 ** 8))
+    monkeypatch.setattr(commitStore, '_commit_store', commitStore.CommitStore(str(tmp_path / 'commits.db')))
+    monkeypatch.setattr(repoDataCache, '_repo_data_cache', repoDataCache.RepoDataCache(str(tmp_path / 'repo_data.db')))
+    return GithubPersonalAccessTokenHelper(['tok'], state_file_path)
+
+
+PROTOCOLS = {
+    'alpha': 'title = "Alpha"\ngithub_organizations = ["https://github.com/Org"]\nsub_ecosystems = []\n',
+    'beta': 'title = "Beta"\ngithub_organizations = ["https://github.com/Org", "https://github.com/Other"]\n'
+            'sub_ecosystems = []\n'
+}
+
+
+# The fake GitHub API of fakeGithub.py for all the API clients, with the toml files of PROTOCOLS
+@pytest.fixture
+def fake_github(tmp_path, monkeypatch):
+    protocols_dir = tmp_path / 'protocols'
+    protocols_dir.mkdir()
+    for chain_name, toml in PROTOCOLS.items():
+        (protocols_dir / (chain_name + '.toml')).write_text(toml)
+    monkeypatch.setattr(protocolIndex, '_protocol_index', protocolIndex.ProtocolIndex(
+        str(tmp_path / 'protocol_index.pickle'), str(protocols_dir)).load())
+    monkeypatch.setattr(orgRepoLister, '_org_repos', {})
+    with fakeGithub.serve() as api_url:
+        for module in [contr, dev, orgRepoLister, repoDataFetcher]:
+            monkeypatch.setattr(module, 'GITHUB_API_URL', api_url)
+        monkeypatch.setattr(dev, 'Github', lambda pat: Github(pat, base_url=api_url))
+        yield api_url
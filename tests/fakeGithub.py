@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+from aiohttp import web
+
+'''
+Fake GitHub REST API of the tests, serving the endpoints RepoDataFetcher and Contributors read.
+Orgs list the repos of FAKE_ORG_REPOS. Repos are matched case insensitively like on GitHub:
+    FAKE_GONE_REPOS answer 404 everywhere (deleted, renamed or private since they were listed)
+    FAKE_EMPTY_REPOS answer 204 on the statistics and 409 on the commits
+    every other repo has the commits of FAKE_COMMIT_DAYS_AGO
+Use as `with serve() as api_url:`, the fake runs on the event loop of a thread of its own so
+that the code under test can run its own loops.
+'''
+
+FAKE_ORG_REPOS = {
+    'org': ['Org/One', 'Org/Empty', 'Org/Gone'],
+    'other': ['Other/Two']
+}
+FAKE_GONE_REPOS = ['org/gone']
+FAKE_EMPTY_REPOS = ['org/empty']
+# (days ago, author login) of the commits of every repo
+FAKE_COMMIT_DAYS_AGO = [(3, 'alice'), (10, 'bob'), (17, 'alice')]
+
+# Path and query of every request the fake received
+requests = []
+
+
+def _get_repo(request):
+    return (request.match_info['org'] + '/' + request.match_info['repo']).lower()
+
+
+def _gone_or_empty(request, empty_status):
+    requests.append(request.path_qs)
+    repo = _get_repo(request)
+    if repo in FAKE_GONE_REPOS:
+        return web.json_response({"message": "Not Found"}, status=404)
+    if repo in FAKE_EMPTY_REPOS and empty_status is not None:
+        return web.Response(status=empty_status)
+    return None
+
+
+# PyGithub reads the rate limit of its token from the headers, the other responses have none
+async def _rate_limit(request):
+    reset = int(time.time()) + 3600
+    core = {"limit": 5000, "remaining": 4999, "reset": reset, "used": 1}
+    return web.json_response({"resources": {"core": core}, "rate": core}, headers={
+        'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': str(reset)})
+
+
+async def _org_repos(request):
+    requests.append(request.path_qs)
+    org = request.match_info['org'].lower()
+    if org not in FAKE_ORG_REPOS:
+        return web.json_response({"message": "Not Found"}, status=404)
+    return web.json_response([{"full_name": repo, "fork": False} for repo in FAKE_ORG_REPOS[org]])
+
+
+async def _repo(request):
+    return _gone_or_empty(request, None) or web.json_response({"stargazers_count": 3, "forks_count": 1})
+
+
+async def _releases(request):
+    return _gone_or_empty(request, None) or web.json_response([{"id": 1}])
+
+
+async def _stats(request):
+    response = _gone_or_empty(request, 204)
+    if response is not None:
+        return response
+    if request.match_info['endpoint'] == 'code_frequency':
+        return web.json_response([[0, 10, -2]] * 3)
+    return web.json_response([{"author": {"login": login}} for login in sorted({login for _, login in FAKE_COMMIT_DAYS_AGO})])
+
+
+async def _commits(request):
+    response = _gone_or_empty(request, 409)
+    if response is not None:
+        return response
+    now = datetime.datetime.utcnow()
+    commits = []
+    for days_ago, login in FAKE_COMMIT_DAYS_AGO:
+        date = (now - datetime.timedelta(days=days_ago)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        # `since` is inclusive
+        if date >= request.query.get('since', ''):
+            commits.append({"sha": '%s-%d' % (login, days_ago), "author": {"login": login},
+                            "commit": {"author": {"date": date}, "committer": {"date": date}}})
+    return web.json_response(commits)
+
+
+@contextmanager
+def serve():
+    requests.clear()
+    app = web.Application()
+    app.router.add_get('/rate_limit', _rate_limit)
+    app.router.add_get('/orgs/{org}/repos', _org_repos)
+    app.router.add_get('/repos/{org}/{repo}', _repo)
+    app.router.add_get('/repos/{org}/{repo}/releases', _releases)
+    app.router.add_get('/repos/{org}/{repo}/stats/{endpoint}', _stats)
+    app.router.add_get('/repos/{org}/{repo}/commits', _commits)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, 'localhost', 0)
+    loop.run_until_complete(site.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://localhost:%d' % site._server.sockets[0].getsockname()[1]
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+import contr
+import fakeGithub
+import repoDataFetcher
+from commitStore import CommitStore, get_commit_store
+from contr import Contributors
+from repoDataFetcher import RepoDataFetcher
+
+
+def _get_commits_requests():
+    return [request for request in fakeGithub.requests if '/commits' in request]
+
+
+# dev.py keeps the case of the org listing and contr.py lower-cases the repos
+def test_dev_and_contr_syncs_share_the_commits(gh_pat_helper, monkeypatch):
+    with fakeGithub.serve() as api_url:
+        monkeypatch.setattr(repoDataFetcher, 'GITHUB_API_URL', api_url)
+        monkeypatch.setattr(contr, 'GITHUB_API_URL', api_url)
+        weekly_commits = asyncio.run(RepoDataFetcher(gh_pat_helper).fetch_weekly_commits('Org/One'))
+        window_requests = _get_commits_requests()
+        monthly_contributors = asyncio.run(Contributors(
+            'output', gh_pat_helper).get_monthly_contributors_of_repo_in_last_n_years('org/one'))
+
+    assert sum(weekly_commits) == 3
+    assert monthly_contributors[-1].count() == 2
+    # The contributors only asked for the commits since the newest one of the first sync
+    newest_commit_date = get_commit_store().connection.execute('SELECT MAX(committer_date) FROM commits').fetchone()[0]
+    assert len(window_requests) == 1
+    assert _get_commits_requests() == window_requests + [
+        '/repos/org/one/commits?per_page=100&since=%s&page=1' % newest_commit_date]
+
+
+def test_repos_stored_with_their_case_are_migrated(tmp_path):
+    db_path = str(tmp_path / 'commits.db')
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('''CREATE TABLE commits (repo TEXT NOT NULL, sha TEXT NOT NULL, author_login TEXT,
+            author_date TEXT NOT NULL, committer_date TEXT NOT NULL, additions INTEGER, deletions INTEGER,
+            PRIMARY KEY (repo, sha))''')
+        connection.execute('CREATE TABLE synced_repos (repo TEXT PRIMARY KEY, oldest_synced TEXT NOT NULL, '
+                           'synced_at REAL NOT NULL)')
+        for repo, sha in [('Org/One', 'a'), ('org/one', 'a'), ('Org/One', 'b')]:
+            connection.execute("INSERT INTO commits VALUES (?, ?, 'alice', '2020-01-01T00:00:00Z', "
+                               "'2020-01-01T00:00:00Z', NULL, NULL)", (repo, sha))
+        connection.execute("INSERT INTO synced_repos VALUES ('Org/One', '2019-01-01T00:00:00Z', 0)")
+    connection.close()
+
+    commit_store = CommitStore(db_path)
+    assert commit_store.connection.execute('SELECT repo, sha FROM commits ORDER BY sha').fetchall() == [
+        ('org/one', 'a'), ('org/one', 'b')]
+    # Synced again, once
+    assert commit_store.get_fetch_since('Org/One', '2019-01-01T00:00:00Z') == '2019-01-01T00:00:00Z'
+    assert commit_store.get_committer_dates('ORG/one', '2019-01-01T00:00:00Z') == ['2020-01-01T00:00:00Z'] * 2
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+from dev import DevOracle
+
+
+def _repo_data(name, weekly_commits, contributors):
+    return {
+        "name": name,
+        "repo": {"stargazers_count": 3, "forks_count": 1},
+        "weekly_add_del": [{"additions": 10, "deletions": -2}] * len(weekly_commits),
+        "weekly_commits": weekly_commits,
+        "contributors": contributors,
+        "releases": 1
+    }
+
+
+# The token helper holds a lock, which can't be sent to worker processes
+def test_org_stats_with_several_cpus(gh_pat_helper, monkeypatch):
+    monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: 4)
+    dev_oracle = DevOracle.__new__(DevOracle)
+    dev_oracle.gh_pat_helper = gh_pat_helper
+    dev_oracle.frequency = 4
+    stats = dev_oracle._get_stats_for_org_from_repo_data([
+        _repo_data('org/a', [1, 2, 3, 4, 5], ['alice', 'bob']),
+        _repo_data('org/b', [0, 1], ['bob'])
+    ])
+    assert stats == {
+        'churn_4w': 4 * 12 + 2 * 12,
+        'commits_4w': 14 + 1,
+        'contributors': 2,
+        'stars': 6,
+        'forks': 2,
+        'num_releases': 2
+    }
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import subprocess
+import pytest
+from gitRepoDataFetcher import GitRepoDataFetcher, GitRepoError, get_daily_authors, get_git_repo_data
+
+NOW = datetime.datetime.utcnow()
+
+
+def _git(repo_path, *args, date=None, email='dev@example.com'):
+    env = dict(os.environ, GIT_AUTHOR_NAME='Dev', GIT_AUTHOR_EMAIL=email,
+               GIT_COMMITTER_NAME='Dev', GIT_COMMITTER_EMAIL=email)
+    if date is not None:
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date.strftime('%Y-%m-%dT%H:%M:%S+0000')
+    subprocess.run(['git', '-C', str(repo_path)] + list(args), check=True, env=env, stdout=subprocess.DEVNULL)
+
+
+def _commit(repo_path, file_name, lines, days_ago, email):
+    (repo_path / file_name).write_text(''.join(line + '\n' for line in lines))
+    _git(repo_path, 'add', file_name)
+    _git(repo_path, 'commit', '--quiet', '-m', file_name, date=NOW - datetime.timedelta(days=days_ago), email=email)
+
+
+# fixtures/org/fixture: one commit before the window, two 9 days ago and one 2 days ago
+@pytest.fixture
+def fixture_repos(tmp_path):
+    repo_path = tmp_path / 'fixtures' / 'org' / 'fixture'
+    repo_path.mkdir(parents=True)
+    _git(repo_path, 'init', '--quiet', '--initial-branch=main')
+    _commit(repo_path, 'old.txt', ['old'], 400, 'carol@example.com')
+    _commit(repo_path, 'b.txt', ['1', '2', '3', '4', '5'], 9, '12345+bob@users.noreply.github.com')
+    _commit(repo_path, 'old.txt', ['new'], 9, 'Alice@Example.com')
+    _commit(repo_path, 'a.txt', ['1', '2', '3'], 2, 'alice@example.com')
+    return {
+        "repo_path": repo_path,
+        "mirror_dir": str(tmp_path / 'mirrors'),
+        "clone_url": 'file://' + str(tmp_path / 'fixtures') + '/{repo}'
+    }
+
+
+def test_weekly_commits_churn_and_contributors(fixture_repos):
+    repo_data = get_git_repo_data('org/fixture', 1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+    # 51 weeks oldest first, the commit of 400 days ago is outside of them
+    assert len(repo_data["weekly_commits"]) == 51
+    assert repo_data["weekly_commits"][-1] == 1
+    assert repo_data["weekly_commits"][-2] == 2
+    assert sum(repo_data["weekly_commits"]) == 3
+    assert repo_data["weekly_add_del"][-1] == {"additions": 3, "deletions": 0}
+    assert repo_data["weekly_add_del"][-2] == {"additions": 6, "deletions": -1}
+    # noreply emails are logins, other emails are lowercased
+    assert repo_data["contributors"] == ['alice@example.com', 'bob']
+
+
+def test_daily_authors(fixture_repos):
+    daily_authors = get_daily_authors('org/fixture', 1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+
+    def day(days_ago):
+        return (NOW - datetime.timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+    assert daily_authors == {day(9): {'bob', 'alice@example.com'}, day(2): {'alice@example.com'}}
+
+
+def test_mirror_is_fetched_again(fixture_repos):
+    get_git_repo_data('org/fixture', 1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+    _commit(fixture_repos["repo_path"], 'c.txt', ['1'], 1, 'dave@example.com')
+    repo_data = get_git_repo_data('org/fixture', 1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+    assert repo_data["weekly_commits"][-1] == 2
+    assert 'dave@example.com' in repo_data["contributors"]
+
+
+def test_missing_repo_raises_git_repo_error(fixture_repos):
+    with pytest.raises(GitRepoError):
+        get_git_repo_data('org/missing', 1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+
+
+def test_dev_oracle_skips_repos_that_fail(fixture_repos):
+    from dev import DevOracle
+
+    class MetadataFetcher:
+        async def fetch_repo_metadata_list(self, org_then_slash_then_repos):
+            return [{"repo": {"stargazers_count": 1, "forks_count": 0}, "releases": 0}
+                    for _ in org_then_slash_then_repos]
+
+    # Only the attributes of the git engine, no PATs needed
+    dev_oracle = DevOracle.__new__(DevOracle)
+    dev_oracle.client = None
+    dev_oracle.git_fetcher = GitRepoDataFetcher(1, fixture_repos["mirror_dir"], fixture_repos["clone_url"])
+    repo_data_list = dev_oracle._fetch_repo_data_list_git(MetadataFetcher(), ['org/missing', 'org/fixture'], 1)
+    assert [repo_data["name"] for repo_data in repo_data_list] == ['org/fixture']
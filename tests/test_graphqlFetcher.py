@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import re
+from aiohttp import ClientSession, web
+import graphqlFetcher
+import repoDataFetcher
+from graphqlFetcher import GraphqlMetadataFetcher
+from repoDataFetcher import RepoDataFetcher
+
+# Fake GitHub: queries of more repos than this fail with MAX_NODE_LIMIT_EXCEEDED
+FAKE_MAX_REPOS_PER_QUERY = 2
+# Repos answered null with a NOT_FOUND error
+FAKE_MISSING_REPOS = ['org/gone']
+# Repos without a default branch
+FAKE_EMPTY_REPOS = ['org/empty']
+
+REPO_PATTERN = re.compile(r'(r\d+): repository\(owner: ("[^"]*"), name: ("[^"]*")\)')
+WINDOW_PATTERN = re.compile(r'(w\d+): history\(')
+
+# Repos of every GraphQL query and paths of every REST request the fake received
+_fake_queries = []
+_fake_rest_paths = []
+
+
+def _fake_repo(org_then_slash_then_repo, window_aliases):
+    repo = {
+        "stargazerCount": len(org_then_slash_then_repo),
+        "forkCount": 1,
+        "releases": {"totalCount": 2},
+        "defaultBranchRef": None
+    }
+    if org_then_slash_then_repo not in FAKE_EMPTY_REPOS:
+        # The commit count of a week is its index modulo 3, to check the order of the windows
+        repo["defaultBranchRef"] = {"target": {alias: {"totalCount": index % 3}
+                                               for index, alias in enumerate(window_aliases)}}
+    return repo
+
+
+# Fake GraphQL endpoint: the aliased repository fields of graphqlFetcher._build_query
+async def _fake_graphql(request):
+    query = (await request.json())["query"]
+    repos = ['%s/%s' % (json.loads(owner), json.loads(name))
+             for _, owner, name in REPO_PATTERN.findall(query)]
+    _fake_queries.append(repos)
+    if len(repos) > FAKE_MAX_REPOS_PER_QUERY:
+        return web.json_response({"data": None, "errors": [{"type": "MAX_NODE_LIMIT_EXCEEDED"}]})
+    # The same windows in every repo of a query
+    window_aliases = WINDOW_PATTERN.findall(query)
+    window_aliases = window_aliases[:len(window_aliases) // len(repos)]
+    data = {"rateLimit": {"cost": 1, "remaining": 4000, "resetAt": "2030-01-01T00:00:00Z"}}
+    errors = []
+    for index, repo in enumerate(repos):
+        if repo in FAKE_MISSING_REPOS:
+            data['r%d' % index] = None
+            errors.append({"type": "NOT_FOUND", "path": ['r%d' % index]})
+        else:
+            data['r%d' % index] = _fake_repo(repo, window_aliases)
+    return web.json_response({"data": data, "errors": errors})
+
+
+# Fake REST endpoints of the metadata RepoDataFetcher falls back to
+async def _fake_rest_repo(request):
+    _fake_rest_paths.append(request.path)
+    return web.json_response({"stargazers_count": 100, "forks_count": 10})
+
+
+async def _fake_rest_releases(request):
+    _fake_rest_paths.append(request.path)
+    return web.json_response([{"id": 1}])
+
+
+async def _serve(run):
+    _fake_queries.clear()
+    _fake_rest_paths.clear()
+    app = web.Application()
+    app.router.add_post('/graphql', _fake_graphql)
+    app.router.add_get('/repos/{org}/{repo}', _fake_rest_repo)
+    app.router.add_get('/repos/{org}/{repo}/releases', _fake_rest_releases)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, 'localhost', 0)
+    await site.start()
+    try:
+        return await run('http://localhost:%d' % site._server.sockets[0].getsockname()[1])
+    finally:
+        await runner.cleanup()
+
+
+
+def _fetch_metadata(gh_pat_helper, repos, repos_per_query):
+    async def run(api_url):
+        fetcher = GraphqlMetadataFetcher(gh_pat_helper, 1, api_url + '/graphql', repos_per_query)
+        async with ClientSession() as session:
+            return fetcher, await fetcher.fetch_metadata(session, repos)
+    return asyncio.run(_serve(run))
+
+
+def test_fields_per_repo(gh_pat_helper):
+    fetcher, metadata = _fetch_metadata(gh_pat_helper, ['org/one', 'org/empty'], 2)
+    assert len(fetcher.windows) == 51
+    assert metadata['org/one'] == {
+        "stargazers_count": len('org/one'),
+        "forks_count": 1,
+        "releases": 2,
+        "weekly_commits": [index % 3 for index in range(51)]
+    }
+    # No weekly commits without a default branch, RepoDataFetcher fetches them from REST
+    assert metadata['org/empty'] == {"stargazers_count": len('org/empty'), "forks_count": 1, "releases": 2}
+    assert fetcher.remaining_points == {'tok': 4000}
+
+
+def test_costly_batches_are_split(gh_pat_helper):
+    repos = ['org/a', 'org/b', 'org/c', 'org/d', 'org/e']
+    fetcher, metadata = _fetch_metadata(gh_pat_helper, repos, 5)
+    assert _fake_queries == [repos, ['org/a', 'org/b'], ['org/c', 'org/d', 'org/e'], ['org/c'], ['org/d', 'org/e']]
+    assert fetcher.query_count == 5
+    assert sorted(metadata) == repos
+
+
+def test_not_found_aliases_are_left_out(gh_pat_helper):
+    _, metadata = _fetch_metadata(gh_pat_helper, ['org/one', 'org/gone'], 2)
+    assert sorted(metadata) == ['org/one']
+
+
+def test_rest_fallback(gh_pat_helper, monkeypatch):
+    async def run(api_url):
+        monkeypatch.setattr(graphqlFetcher, 'get_github_graphql_url', lambda: api_url + '/graphql')
+        monkeypatch.setattr(graphqlFetcher, 'get_graphql_repos_per_query', lambda: 2)
+        monkeypatch.setattr(repoDataFetcher, 'GITHUB_API_URL', api_url)
+        fetcher = RepoDataFetcher(gh_pat_helper, metadata_source='graphql')
+        return await fetcher.fetch_repo_metadata_list(['org/one', 'org/gone'])
+    repo_data_list = asyncio.run(_serve(run))
+    assert repo_data_list == [
+        {"repo": {"stargazers_count": len('org/one'), "forks_count": 1}, "releases": 2},
+        {"repo": {"stargazers_count": 100, "forks_count": 10}, "releases": 1}
+    ]
+    # Only the repo GraphQL didn't find went through REST
+    assert sorted(_fake_rest_paths) == ['/repos/org/gone', '/repos/org/gone/releases']
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import fakeGithub
+import repoDataFetcher
+from repoDataFetcher import RepoDataFetcher
+
+
+def _fetch(gh_pat_helper, monkeypatch, fetch_list, repos):
+    with fakeGithub.serve() as api_url:
+        monkeypatch.setattr(repoDataFetcher, 'GITHUB_API_URL', api_url)
+        return asyncio.run(fetch_list(RepoDataFetcher(gh_pat_helper), repos))
+
+
+def test_repos_gone_or_empty_are_left_out(gh_pat_helper, monkeypatch):
+    repo_data_list = _fetch(gh_pat_helper, monkeypatch, RepoDataFetcher.fetch_repo_data_list,
+                            ['org/one', 'org/gone', 'org/empty', 'org/two'])
+    assert [repo_data["name"] for repo_data in repo_data_list] == ['org/one', 'org/two']
+    repo_data = repo_data_list[0]
+    assert repo_data["repo"] == {"stargazers_count": 3, "forks_count": 1}
+    assert repo_data["weekly_add_del"] == [{"additions": 10, "deletions": -2}] * 3
+    assert repo_data["weekly_commits"][-3:] == [1, 1, 1]
+    assert sum(repo_data["weekly_commits"]) == 3
+    assert repo_data["contributors"] == ['alice', 'bob']
+    assert repo_data["releases"] == 1
+
+
+def test_metadata_of_repos_gone_is_none(gh_pat_helper, monkeypatch):
+    metadata_list = _fetch(gh_pat_helper, monkeypatch, RepoDataFetcher.fetch_repo_metadata_list,
+                           ['org/gone', 'org/one'])
+    assert metadata_list == [None, {"repo": {"stargazers_count": 3, "forks_count": 1}, "releases": 1}]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import json
+from scheduler import GlobalScheduler
+
+
+# Org/Empty and Org/Gone are part of both chains, they are left out of both
+def test_repos_gone_or_empty_are_skipped(tmp_path, gh_pat_helper, fake_github):
+    GlobalScheduler(str(tmp_path), gh_pat_helper=gh_pat_helper).run(['alpha', 'beta'])
+    alpha_stats = json.loads((tmp_path / 'alpha_stats.json').read_text())
+    beta_stats = json.loads((tmp_path / 'beta_stats.json').read_text())
+    assert (alpha_stats['stars'], alpha_stats['num_releases'], alpha_stats['commits_4w']) == (3, 1, 3)
+    assert (beta_stats['stars'], beta_stats['num_releases'], beta_stats['commits_4w']) == (6, 2, 6)
+    assert (tmp_path / 'alpha_history.json').exists()
+    for chain_name in ['alpha', 'beta']:
+        monthly_contributors = json.loads((tmp_path / (chain_name + '_contributors.json')).read_text())
+        assert len(monthly_contributors) == 12
+        assert sorted(monthly_contributors[-1]) == ['alice', 'bob']
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import json
+from worker import Worker, merge
+from workQueue import WorkQueue
+
+
+# The jobs of Org/Empty and Org/Gone are done without a result and don't hold back the chain
+def test_repos_gone_or_empty_are_done_without_result(tmp_path, gh_pat_helper, fake_github, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'output').mkdir()
+    work_queue = WorkQueue(str(tmp_path / 'work_queue.db'))
+    repos = ['Org/One', 'Org/Empty', 'Org/Gone']
+    work_queue.add_jobs('alpha', 'dev', [('Org', repo) for repo in repos], 1)
+    work_queue.add_jobs('alpha', 'contr', [('', repo.lower()) for repo in repos], 1)
+
+    Worker(work_queue, 'worker', gh_pat_helper=gh_pat_helper).run()
+    assert work_queue.get_status_counts() == {'done': 6}
+    assert [result for _, _, _, result in work_queue.get_chain_results('alpha', 'dev', 1)
+            if result is not None] != []
+    merge(work_queue, ['alpha'], 1, gh_pat_helper=gh_pat_helper)
+
+    stats = json.loads((tmp_path / 'output' / 'alpha_stats.json').read_text())
+    assert (stats['stars'], stats['num_releases'], stats['commits_4w']) == (3, 1, 3)
+    monthly_contributors = json.loads((tmp_path / 'output' / 'alpha_contributors.json').read_text())
+    assert sorted(monthly_contributors[-1]) == ['alice', 'bob']
@@ -2,7 +2,8 @@
 
 from os import path
 from config import get_chain_names
-import requests
+from httpCache import get_http_cache
+from protocolIndex import get_protocol_index
 from logger import sys
 
 # WARNING: Make sure that the coin names are the same as .toml file names of Electric Capital
@@ -17,8 +18,8 @@ def update_toml_data(coin_name):
 
     file_url = ELECTRIC_CAPITAL_RAW_CONTENT_BASE_URL + \
         '/' + coin_name[0] + '/' + coin_name + '.toml'
-    r = requests.get(file_url)
-    if r.status_code != 200:
+    r = get_http_cache().get(file_url)
+    if r.status != 200:
         raise Exception("Failed to get the toml file for: ", coin_name)
 
     file_content = r.text
@@ -37,3 +38,5 @@ if __name__ == "__main__":
             update_toml_data(coin_name)
         except:
             pass
+    # Re-parses the updated toml files only
+    get_protocol_index()
@@ -1,7 +1,15 @@
+import matplotlib
+# Figures are only saved to files, never shown
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import json
+import optparse
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from os import path
@@ -11,10 +19,74 @@ from config import get_chain_names, get_chain_targets
 
 dir_path = path.dirname(path.realpath(__file__))
 
+# Keyword turning off the confidence intervals of seaborn estimators, `errorbar` since seaborn 0.12
+NO_CI = {'errorbar': None} if tuple(int(part) for part in sns.__version__.split('.')[:2]) >= (0, 12) else {'ci': None}
+
+'''
+FLOW
+Visualize.run -> prep_code (commits, churn), prep_devs: one wide DataFrame per chart, a column per protocol
+    -> render_figures: _render_figure for each of the six figures, in a process pool
+    -> print the render time of every figure
+
+The default mode melts the wide frames into long format for seaborn, which bootstraps a
+confidence interval for every point of every line and bar. With a single value per point
+there is nothing to estimate, so the fast mode (--fast) draws the lines straight from the
+wide frames with matplotlib and the bars without confidence intervals.
+'''
+
+
+def _set_style():
+    sns.set(style="darkgrid")
+    sns.set(rc={'figure.figsize': (24, 14)})
+
+
+# Colors of the lines, the same as seaborn picks for a `hue` of `color_count` levels
+def _get_colors(palette, color_count):
+    if palette is None and color_count > len(sns.color_palette()):
+        return sns.husl_palette(color_count)
+    return sns.color_palette(palette, color_count)
+
+
+# Line per protocol of `wide`, a DataFrame with an `x` column and a column per protocol
+def _draw_lines(ax, fast: bool, wide: pd.DataFrame, x: str, y: str, palette: str = None,
+                log_scale: bool = False, sort: bool = True):
+    if fast:
+        protocols = [column for column in wide.columns if column != x]
+        for protocol, color in zip(protocols, _get_colors(palette, len(protocols))):
+            ax.plot(wide[x], wide[protocol], label=protocol, color=color)
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.legend(title='Protocol')
+    else:
+        sns.lineplot(x=x, y=y, hue='Protocol', data=wide.melt(x, var_name='Protocol', value_name=y),
+                     sort=sort, palette=palette, ax=ax)
+    if log_scale:
+        ax.set_yscale("log")
+
+
+def _draw_changes(ax, fast: bool, percentage_changes: pd.DataFrame, x: str):
+    sns.barplot(y="Protocol", x=x, data=percentage_changes, palette="RdYlGn", ax=ax,
+                **(NO_CI if fast else {}))
+
+
+# Draw a figure and save it to `file_name`, returns the seconds it took. Runs in the pool processes.
+def _render_figure(fast: bool, file_name: str, draw, kwargs: dict):
+    start = time.perf_counter()
+    _set_style()
+    fig, ax = plt.subplots()
+    draw(ax, fast, **kwargs)
+    fig.savefig(file_name)
+    plt.close(fig)
+    return time.perf_counter() - start
+
 
 class Visualize:
 
-    def __init__(self):
+    # `processes` renders the figures in a pool of that many processes, one per figure by default,
+    # 1 renders them in this process
+    def __init__(self, fast: bool = False, processes: int = None):
+        self.fast = fast
+        self.processes = processes
         self.chains = get_chain_names().split(" ")
         self.target_names = get_chain_targets().split(", ")
         self.xaxis = ['Jan 2020', 'Feb 2020', 'Mar 2020', 'Apr 2020', 'May 2020',
@@ -37,9 +109,8 @@ class Visualize:
             except:
                 print('Not found history output for ' + chain +
                       ', please remove from config and rerun')
-        sns.set(style="darkgrid")
-        sns.set(rc={'figure.figsize': (24, 14)})
 
+    # Weekly commits or churn with a column per protocol, and the percentage change of every protocol
     def prep_code(self, commits_or_churn: str = 'commits'):
         if commits_or_churn == 'commits':
             commits_or_churn_df = self.commits
@@ -74,10 +145,9 @@ class Visualize:
                            commits_or_churn] = change_list
         percentage_changes = percentage_changes.sort_values(
             'Percentage change in ' + commits_or_churn)
-        code = commits_or_churn_df.melt(
-            'Date', var_name='Protocol',  value_name=commits_or_churn)
-        return code, percentage_changes
+        return commits_or_churn_df, percentage_changes
 
+    # Monthly active devs with a column per protocol, and the percentage change of every protocol
     def prep_devs(self):
         protocols_comparison = pd.DataFrame({'Month': self.xaxis})
         percentage_changes = pd.DataFrame({'Protocol': self.chains})
@@ -89,7 +159,8 @@ class Visualize:
             with open(output_path) as json_file:
                 data = json.load(json_file)
             for month in data:
-                monthly_active_dev_count.append(len(month))
+                # Only the counts are written with hll contributor sketches
+                monthly_active_dev_count.append(month if isinstance(month, int) else len(month))
             protocols_comparison[chain] = monthly_active_dev_count
             try:
                 percentage_change = round((((monthly_active_dev_count[-2] + monthly_active_dev_count[-1]) / (
@@ -102,52 +173,61 @@ class Visualize:
         percentage_changes['Percentage change in active devs'] = change_list
         percentage_changes = percentage_changes.sort_values(
             'Percentage change in active devs')
-        protocols_comparison = protocols_comparison.melt(
-            'Month', var_name='Protocol', value_name='Monthly Active Devs')
         return protocols_comparison, percentage_changes
 
-    # Each of the below is separate as seaborn requires plots to have different figure variable names and clearing memory completely is not possible.
-
-    def plot_commits(self, code: pd.DataFrame, percentage_changes: pd.DataFrame):
-        code.to_csv('commits.csv')
-        fig1 = sns.lineplot(x="Date", y='commits', hue='Protocol', data=code)
-        fig1.get_figure().savefig('commits.png')
-        fig1.clear()
-        fig2 = sns.barplot(y="Protocol", x="Percentage change in commits",
-                           data=percentage_changes, palette="RdYlGn")
-        fig2.get_figure().savefig('commits_change.png')
-        fig2.clear()
-
-    def plot_churn(self, code: pd.DataFrame, percentage_changes: pd.DataFrame):
-        code.to_csv('churn.csv')
-        fig3 = sns.lineplot(x="Date", y='churn', hue='Protocol', data=code)
-        fig3.set_yscale("log")
-        fig3.get_figure().savefig('churn.png')
-        fig3.clear()
-        fig4 = sns.barplot(y="Protocol", x="Percentage change in churn",
-                           data=percentage_changes, palette="RdYlGn")
-        fig4.get_figure().savefig('churn_change.png')
-        fig4.clear()
-
-    def plot_devs(self, protocols_comparison: pd.DataFrame, percentage_changes: pd.DataFrame):
-        protocols_comparison.to_csv('devs.csv')
-        # Disable Seaborn sorting or months appear out of order
-        fig5 = sns.lineplot(x="Month", y="Monthly Active Devs", hue='Protocol',
-                            data=protocols_comparison, sort=False, palette="Dark2_r")
-        fig5.get_figure().savefig('devs.png')
-        fig5.clear()
-        fig6 = sns.barplot(y="Protocol", x="Percentage change in active devs",
-                           data=percentage_changes, palette="RdYlGn")
-        fig6.get_figure().savefig('devs_change.png')
-        fig6.clear()
+    # Figures of the commits chart, as (file name, draw function, its keyword arguments)
+    def get_commits_figures(self, code: pd.DataFrame, percentage_changes: pd.DataFrame):
+        code.melt('Date', var_name='Protocol', value_name='commits').to_csv('commits.csv')
+        return [
+            ('commits.png', _draw_lines, {"wide": code, "x": "Date", "y": 'commits'}),
+            ('commits_change.png', _draw_changes,
+             {"percentage_changes": percentage_changes, "x": "Percentage change in commits"})
+        ]
+
+    def get_churn_figures(self, code: pd.DataFrame, percentage_changes: pd.DataFrame):
+        code.melt('Date', var_name='Protocol', value_name='churn').to_csv('churn.csv')
+        return [
+            ('churn.png', _draw_lines, {"wide": code, "x": "Date", "y": 'churn', "log_scale": True}),
+            ('churn_change.png', _draw_changes,
+             {"percentage_changes": percentage_changes, "x": "Percentage change in churn"})
+        ]
+
+    def get_devs_figures(self, protocols_comparison: pd.DataFrame, percentage_changes: pd.DataFrame):
+        protocols_comparison.melt('Month', var_name='Protocol',
+                                  value_name='Monthly Active Devs').to_csv('devs.csv')
+        return [
+            # Disable Seaborn sorting or months appear out of order
+            ('devs.png', _draw_lines, {"wide": protocols_comparison, "x": "Month", "y": "Monthly Active Devs",
+                                       "palette": "Dark2_r", "sort": False}),
+            ('devs_change.png', _draw_changes,
+             {"percentage_changes": percentage_changes, "x": "Percentage change in active devs"})
+        ]
+
+    # Render the figures, each on a figure of its own so they are independent, and print their timings
+    def render_figures(self, figures: list):
+        start = time.perf_counter()
+        processes = self.processes or min(len(figures), os.cpu_count() or 1)
+        if processes == 1:
+            timings = [_render_figure(self.fast, *figure) for figure in figures]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(_render_figure, self.fast, *figure) for figure in figures]
+                timings = [future.result() for future in futures]
+        print("Rendered %d figures (%s mode, %d processes) in %.2fs:" %
+              (len(figures), 'fast' if self.fast else 'default', processes, time.perf_counter() - start))
+        for (file_name, _, _), secs in zip(figures, timings):
+            print("%-20s %8.2fs" % (file_name, secs))
+        return timings
 
     def run(self):
+        figures = []
         code, percentage_changes = self.prep_code('commits')
-        self.plot_commits(code, percentage_changes)
+        figures += self.get_commits_figures(code, percentage_changes)
         code, percentage_changes = self.prep_code('churn')
-        self.plot_churn(code, percentage_changes)
+        figures += self.get_churn_figures(code, percentage_changes)
         protocols_comparison, percentage_changes = self.prep_devs()
-        self.plot_devs(protocols_comparison, percentage_changes)
+        figures += self.get_devs_figures(protocols_comparison, percentage_changes)
+        self.render_figures(figures)
         for file in glob.glob('./*.png'):
             shutil.move(file, './res')
         for file in glob.glob('./*.csv'):
@@ -155,5 +235,12 @@ class Visualize:
 
 
 if __name__ == '__main__':
-    v = Visualize()
+    p = optparse.OptionParser(usage='python3 vis.py [--fast] [--processes N]')
+    p.add_option('--fast', action='store_true', dest='fast', default=False,
+                 help='Skip the confidence intervals of seaborn and draw the lines straight from the wide frames')
+    p.add_option('--processes', type='int', dest='processes', default=None,
+                 help='Number of processes rendering the figures, one per figure by default')
+    options, arguments = p.parse_args()
+
+    v = Visualize(options.fast, options.processes)
     v.run()
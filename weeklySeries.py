@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import datetime
+import numpy as np
+
+'''
+Weekly series (commits, churn) as int64 NumPy arrays keyed by absolute epoch week, the
+number of 7 day periods since 1970-01-01. A series is a (start_week, values) tuple, values[i]
+being the count of week start_week + i. Series of different lengths or fetched in different
+weeks (e.g. read from the single repo stats cache) line up on their epoch weeks, and are summed
+over a 2D array of (series, weeks) in one vectorized call.
+
+The json outputs keep plain lists, oldest week first.
+'''
+
+SECS_PER_WEEK = 7 * 24 * 60 * 60
+
+
+def get_epoch_week(date: datetime.datetime = None):
+    if date is None:
+        date = datetime.datetime.utcnow()
+    return int(date.replace(tzinfo=datetime.timezone.utc).timestamp()) // SECS_PER_WEEK
+
+
+# Series of `values` (oldest first) whose last value is the count of `end_week`
+def make_weekly_series(values, end_week: int):
+    values = np.asarray(values, dtype=np.int64)
+    return end_week - len(values) + 1, values
+
+
+# Element wise sum of the series, aligned on their epoch weeks. Weeks missing from a series count as 0.
+def sum_weekly_series(series_list):
+    series_list = [series for series in series_list if len(series[1]) > 0]
+    if not series_list:
+        return 0, np.zeros(0, dtype=np.int64)
+    start_week = min(series_start_week for series_start_week, _ in series_list)
+    end_week = max(series_start_week + len(values) for series_start_week, values in series_list)
+    matrix = np.zeros((len(series_list), end_week - start_week), dtype=np.int64)
+    for row, (series_start_week, values) in enumerate(series_list):
+        offset = series_start_week - start_week
+        matrix[row, offset:offset + len(values)] = values
+    return start_week, matrix.sum(axis=0)
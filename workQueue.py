@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from os import makedirs, path
+
+dir_path = path.dirname(path.realpath(__file__))
+
+DEFAULT_DB_PATH = path.join(dir_path, 'output', 'work_queue.db')
+# A job claimed this many times without completing is given up on
+MAX_ATTEMPTS = 3
+
+'''
+Repo level jobs shared by worker.py processes, on one machine or several (sharing the
+file over a network file system), each with its own PATs.
+
+FLOW (for every job)
+add_jobs (coordinator) -> claim (worker) -> heartbeat while the job runs
+    -> complete with the json result, or fail -> get_chain_results (coordinator)
+
+A claim is a lease of `lease_secs`, renewed by heartbeats. The job of a worker which
+crashed or lost its connection stops being renewed and is claimed again by another
+worker once its lease expired. Jobs are keyed by (kind, repo, year_count), so a repo
+shared by several chains is only processed once; `chain_jobs` keeps which chain (and
+org, for the 'dev' jobs) every repo belongs to for the merge.
+'''
+
+
+class WorkQueue:
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        makedirs(path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                kind TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                year_count INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker_id TEXT,
+                claim_id TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (kind, repo, year_count)
+            )''')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS chain_jobs (
+                chain TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                org TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                year_count INTEGER NOT NULL,
+                PRIMARY KEY (chain, kind, org, repo, year_count)
+            )''')
+
+    # `org_repos` is a list of (org, repo), org being '' for jobs not grouped per org
+    def add_jobs(self, chain: str, kind: str, org_repos: list, year_count: int):
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO jobs (kind, repo, year_count) VALUES (?, ?, ?)',
+                                        [(kind, repo, year_count) for _, repo in org_repos])
+            self.connection.executemany('INSERT OR IGNORE INTO chain_jobs VALUES (?, ?, ?, ?, ?)',
+                                        [(chain, kind, org, repo, year_count) for org, repo in org_repos])
+
+    # Lease a pending job, or one whose lease expired. Returns (kind, repo, year_count, claim_id) or None
+    def claim(self, worker_id: str, lease_secs: float):
+        while True:
+            claim_id = uuid.uuid4().hex
+            now = time.time()
+            with self.lock, self.connection:
+                # A single UPDATE, so two workers can't claim the same job
+                self.connection.execute('''UPDATE jobs SET status = 'leased', worker_id = ?, claim_id = ?,
+                        lease_expires = ?, attempts = attempts + 1
+                    WHERE rowid = (SELECT rowid FROM jobs
+                        WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                        ORDER BY attempts, rowid LIMIT 1)''', (worker_id, claim_id, now + lease_secs, now))
+                job = self.connection.execute('SELECT kind, repo, year_count, attempts FROM jobs WHERE claim_id = ?',
+                                              (claim_id,)).fetchone()
+                if job is None:
+                    return None
+                if job[3] <= MAX_ATTEMPTS:
+                    return job[0], job[1], job[2], claim_id
+                # Its workers crashed too many times, e.g. running out of memory on it
+                self.connection.execute('''UPDATE jobs SET status = 'failed', error = 'too many attempts'
+                    WHERE claim_id = ?''', (claim_id,))
+
+    # Extend the lease, returns False if the job was reclaimed by another worker
+    def heartbeat(self, claim_id: str, lease_secs: float):
+        with self.lock, self.connection:
+            cursor = self.connection.execute('''UPDATE jobs SET lease_expires = ?
+                WHERE claim_id = ? AND status = 'leased' ''', (time.time() + lease_secs, claim_id))
+        return cursor.rowcount == 1
+
+    def complete(self, claim_id: str, result):
+        with self.lock, self.connection:
+            cursor = self.connection.execute('''UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL
+                WHERE claim_id = ? AND status = 'leased' ''', (json.dumps(result), claim_id))
+        return cursor.rowcount == 1
+
+    # The job is given back to the queue, unless it already failed MAX_ATTEMPTS times
+    def fail(self, claim_id: str, error: str):
+        with self.lock, self.connection:
+            self.connection.execute('''UPDATE jobs SET
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, lease_expires = NULL
+                WHERE claim_id = ? AND status = 'leased' ''', (MAX_ATTEMPTS, error, claim_id))
+
+    # {status: number of jobs}
+    def get_status_counts(self):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    # [(org, repo, status, result)] of the jobs of a chain, results decoded from json
+    def get_chain_results(self, chain: str, kind: str, year_count: int):
+        with self.lock:
+            rows = self.connection.execute('''SELECT chain_jobs.org, jobs.repo, jobs.status, jobs.result
+                FROM chain_jobs JOIN jobs USING (kind, repo, year_count)
+                WHERE chain_jobs.chain = ? AND chain_jobs.kind = ? AND chain_jobs.year_count = ?
+                ORDER BY chain_jobs.rowid''', (chain, kind, year_count)).fetchall()
+        return [(org, repo, status, json.loads(result) if result is not None else None)
+                for org, repo, status, result in rows]
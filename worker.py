@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import optparse
+import os
+import socket
+import threading
+import time
+from logger import sys
+from config import get_chain_names
+from contr import Contributors
+from contributorSketch import ContributorSketch
+from dev import DevOracle
+from repoDataFetcher import SKIPPED_REPO_STATUSES
+from workQueue import WorkQueue
+
+'''
+FLOW
+enqueue (coordinator) -> for all the chains: list the repos of dev.py (per org, plus the explicit
+    repos of the sub ecosystems with --expand-sub-ecosystems) and contr.py -> WorkQueue.add_jobs
+work (any number of processes/machines, each with its own PATs in config.ini) -> until the queue is empty:
+    WorkQueue.claim -> _run_job with a heartbeat thread -> WorkQueue.complete / WorkQueue.fail
+merge (coordinator) -> for all the chains:
+    DevOracle._save_stats_and_history -> `_stats.json` and `_history.json`
+    Contributors._save_contributors -> `_contributors.json`
+
+enqueue and merge must be given the same --expand-sub-ecosystems and YEARS_COUNT, merge only
+saves the chains whose jobs are all done. The jobs of repos which are empty or gone since they
+were listed are done without a result, merge leaves them out.
+'''
+
+# dev.py jobs of the repos listed one by one in the toml files rather than through an org
+EXPLICIT_REPOS_ORG = ''
+# Seconds a claimed job stays leased without a heartbeat
+DEFAULT_LEASE_SECS = 300
+# Seconds between two claims when all the remaining jobs are leased by other workers
+IDLE_POLL_SECS = 10
+
+
+def enqueue(work_queue: WorkQueue, chain_names: list, year_count: int, frequency: int = 4,
+            expand_sub_ecosystems: bool = False):
+    dev_oracle = DevOracle('./output', frequency, expand_sub_ecosystems=expand_sub_ecosystems)
+    contributors = Contributors('./output', expand_sub_ecosystems=expand_sub_ecosystems)
+    for chain_name in chain_names:
+        print("Enqueueing the repos of", chain_name)
+        org_repos = []
+        for org in dev_oracle._get_github_orgs_for_chain(chain_name):
+            org_repos.extend((org, repo)
+                             for repo in dev_oracle._get_unforked_repos_for_org(org))
+        org_repos.extend((EXPLICIT_REPOS_ORG, repo)
+                         for repo in dev_oracle._get_explicit_repos_for_chain(chain_name))
+        work_queue.add_jobs(chain_name, 'dev', org_repos, year_count)
+        repos = asyncio.run(
+            contributors.get_repos_for_protocol_from_toml(chain_name))
+        work_queue.add_jobs(chain_name, 'contr', [('', repo) for repo in repos], year_count)
+    print("Jobs:", work_queue.get_status_counts())
+
+
+class Worker:
+
+    # `gh_pat_helper` is shared by the DevOracle and the Contributors, a new one if None
+    def __init__(self, work_queue: WorkQueue, worker_id: str, lease_secs: float = DEFAULT_LEASE_SECS,
+                 frequency: int = 4, gh_pat_helper=None):
+        self.work_queue = work_queue
+        self.worker_id = worker_id
+        self.lease_secs = lease_secs
+        self.dev_oracle = DevOracle('./output', frequency, engine='sync', gh_pat_helper=gh_pat_helper)
+        self.contributors = Contributors('./output', self.dev_oracle.gh_pat_helper)
+
+    def run(self):
+        while True:
+            job = self.work_queue.claim(self.worker_id, self.lease_secs)
+            if job is None:
+                status_counts = self.work_queue.get_status_counts()
+                if status_counts.get('leased', 0) == 0 and status_counts.get('pending', 0) == 0:
+                    print("No jobs left, exiting")
+                    return
+                # Other workers hold the remaining jobs, theirs get reclaimed if they crash
+                time.sleep(IDLE_POLL_SECS)
+                continue
+            kind, repo, year_count, claim_id = job
+            print("Running %s job of %s" % (kind, repo))
+            stop_heartbeat = threading.Event()
+            heartbeat_thread = threading.Thread(
+                target=self._heartbeat, args=(claim_id, stop_heartbeat), daemon=True)
+            heartbeat_thread.start()
+            try:
+                result = self._run_job(kind, repo, year_count)
+            # dev.py sys.exits on some errors, that only fails this job
+            except BaseException as e:
+                if isinstance(e, KeyboardInterrupt):
+                    raise
+                print("Error while running %s job of %s: %r" % (kind, repo, e))
+                self.work_queue.fail(claim_id, repr(e))
+                continue
+            finally:
+                stop_heartbeat.set()
+                heartbeat_thread.join()
+            if not self.work_queue.complete(claim_id, result):
+                print("Lease of %s job of %s was lost, result dropped" % (kind, repo))
+
+    def _heartbeat(self, claim_id: str, stop_heartbeat: threading.Event):
+        while not stop_heartbeat.wait(self.lease_secs / 3):
+            if not self.work_queue.heartbeat(claim_id, self.lease_secs):
+                return
+
+    # None for the repos which are empty or gone since they were listed, they would fail every attempt
+    def _run_job(self, kind: str, repo: str, year_count: int):
+        try:
+            if kind == 'dev':
+                return self.dev_oracle._get_single_repo_data_from_api(repo, year_count)
+            monthly_sketches = asyncio.run(
+                self.contributors.get_monthly_contributors_of_repo_in_last_n_years(repo, n_years=year_count))
+        except Exception as e:
+            # GithubApiError, or GithubException of PyGithub
+            if getattr(e, 'status', None) not in SKIPPED_REPO_STATUSES:
+                raise
+            print("Skipping %s: %s" % (repo, e))
+            return None
+        # Login ids are local to the login dictionary of a machine, results travel as logins
+        return [sketch.get_logins() for sketch in monthly_sketches]
+
+
+def merge(work_queue: WorkQueue, chain_names: list, year_count: int, frequency: int = 4,
+          expand_sub_ecosystems: bool = False, gh_pat_helper=None):
+    dev_oracle = DevOracle('./output', frequency, expand_sub_ecosystems=expand_sub_ecosystems,
+                           gh_pat_helper=gh_pat_helper)
+    contributors = Contributors('./output', dev_oracle.gh_pat_helper)
+    for chain_name in chain_names:
+        dev_results = work_queue.get_chain_results(chain_name, 'dev', year_count)
+        contr_results = work_queue.get_chain_results(chain_name, 'contr', year_count)
+        unfinished = [repo for _, repo, status, _ in dev_results + contr_results if status != 'done']
+        if unfinished:
+            print("Skipping %s, %d jobs not done, e.g. %s" %
+                  (chain_name, len(unfinished), unfinished[0]))
+            continue
+
+        print("Saving stats and history of", chain_name)
+        # One repo data list per org, orgs in toml file order, then the explicit repos
+        org_repo_data_lists = {org: [] for org in dev_oracle._get_github_orgs_for_chain(chain_name)}
+        for org, _, _, repo_data in dev_results:
+            # None for the repos which are empty or gone
+            if repo_data is not None:
+                org_repo_data_lists.setdefault(org, []).append(repo_data)
+        if not dev_oracle._save_stats_and_history(chain_name, list(org_repo_data_lists.values())):
+            print('No data found for organisation in toml file of', chain_name)
+
+        print("Saving contributors of", chain_name)
+        contributors._save_contributors(
+            './output/' + chain_name + '_contributors.json',
+            ([ContributorSketch('exact').update(month_of_contributors) for month_of_contributors in repo_contributors]
+             for _, _, _, repo_contributors in contr_results if repo_contributors is not None),
+            years_count=year_count)
+
+
+if __name__ == '__main__':
+    p = optparse.OptionParser(
+        usage='python3 worker.py enqueue|work|merge [YEARS_COUNT]')
+    p.add_option('--queue', dest='queue_path', default=None,
+                 help='Path of the shared work queue database (default output/work_queue.db)')
+    p.add_option('--worker-id', dest='worker_id', default=socket.gethostname() + '-' + str(os.getpid()),
+                 help='Name of this worker in the queue')
+    p.add_option('--lease-secs', type='float', dest='lease_secs', default=DEFAULT_LEASE_SECS,
+                 help='Seconds a job stays claimed without a heartbeat')
+    p.add_option('--frequency', type='int', dest='frequency', default=4,
+                 help='Enter churn, commit frequency')
+    p.add_option('--expand-sub-ecosystems', action='store_true', dest='expand_sub_ecosystems', default=False,
+                 help='Also crawl the orgs and repos of the sub ecosystems of the chains, recursively '
+                      '(same value for enqueue and merge)')
+
+    options, arguments = p.parse_args()
+    if len(arguments) == 0 or arguments[0] not in ['enqueue', 'work', 'merge']:
+        p.print_usage()
+        sys.exit(1)
+    years_count = int(arguments[1]) if len(arguments) > 1 else 1
+    work_queue = WorkQueue(options.queue_path) if options.queue_path else WorkQueue()
+
+    if arguments[0] == 'enqueue':
+        enqueue(work_queue, get_chain_names().split(), years_count, options.frequency,
+                options.expand_sub_ecosystems)
+    elif arguments[0] == 'work':
+        Worker(work_queue, options.worker_id, options.lease_secs, options.frequency).run()
+    else:
+        merge(work_queue, get_chain_names().split(), years_count, options.frequency,
+              options.expand_sub_ecosystems)